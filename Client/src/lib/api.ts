@@ -109,9 +109,14 @@ export const useStore = create<Store>((set) => ({
     },
 }));
 
+// Every tab works on its own scenario on the server, kept across reloads of the tab
+const scenarioId = sessionStorage.getItem("scenario-id") ?? crypto.randomUUID();
+sessionStorage.setItem("scenario-id", scenarioId);
+
 // Create axios instance
 export const axiosInstance = axios.create({
     baseURL: "http://localhost:8000",
+    headers: { "X-Scenario-Id": scenarioId },
 });
 
 export const getParcels = async () => {
@@ -1,12 +1,20 @@
-from typing import Dict, List
+import multiprocessing
+import os
+import queue
+import time
+from collections import OrderedDict
+from hashlib import blake2b
+from typing import Any, Dict, List, Tuple
 from typing_extensions import Self
-from common import DeliveryAgentInfo, Parcel, Route, Id
-from node import Node
+from common import AgentFleet, DeliveryAgentInfo, Parcel, Progress, Route, Id
+from distances import DistanceMatrix
+from node import Graph, Node
 
 import numpy as np
 
 from Simulator import Simulator
-
+from Algos.local_search import NUM_MOVES, LocalSearch
+from Algos.seeding import SEEDERS
 
 NUM_GENERATIONS = 400
 POPULATION_SIZE = 200
@@ -21,10 +29,34 @@ MUTATION_ADD = 0.45
 MUTATION_CHANGE = 0.35
 MUTATION_REMOVE = 0.2
 
+FITNESS_CACHE_SIZE = 10000
+
+# Stopping policies, None disables the policy
+TIME_LIMIT = None
+MAX_EVALUATIONS = None
+STAGNATION_LIMIT = None
+
+# Fraction of the initial population built by the seeders instead of at random
+SEED_FRACTION = 0.1
+SEEDING = ("nearest_neighbour", "sweep", "bin_packing")
+
+# Number of individuals improved by local search each generation, taken from the elites
+# or sampled from the children. Local search is off by default
+LOCAL_SEARCH_SIZE = 0
+LOCAL_SEARCH_TARGET = "elites"
+
+SELECTION = "roulette"
+TOURNAMENT_SIZE = 3
+
+NUM_ISLANDS = os.cpu_count() or 1
+MIGRATION_INTERVAL = 20
+NUM_MIGRANTS = 2
+
 TEXT_CENTER = 25
 
 
-# Helper function to ensure that the string representation of a float has a certain width
+# Helper function to ensure that the string representation of a float has a certain
+# width
 def float_ensure_width(value: float, width: int) -> str:
     value_part = str(int(value))
     width -= len(value_part) + 1
@@ -33,114 +65,376 @@ def float_ensure_width(value: float, width: int) -> str:
     return f"{value:.{width}f}"
 
 
-class AgentDNA:
-    def __init__(
-        self,
+class PopulationDNA:
+    def __init__(self, genes: np.ndarray, lengths: np.ndarray):
+        # genes[i, a, :lengths[i, a]] are the genes of agent a of individual i. The
+        # genes represent the parcels that the agent will deliver, -1 is used to
+        # represent the warehouse location. Genes past the length of an agent are
+        # padding and are always -1.
+        self.genes = genes
+        self.lengths = lengths
+
+    @staticmethod
+    def random(
+        rng: np.random.Generator,
+        population_size: int,
+        max_starting_genes: np.ndarray,
         highest_parcel_id: int,
-        max_starting_genes: int,
-        initialize=True,
+    ) -> "PopulationDNA":
+        # Each agent starts with a random number of genes below its max_starting_genes
+        num_agents = len(max_starting_genes)
+        lengths = rng.integers(
+            1, max_starting_genes, size=(population_size, num_agents)
+        )
+
+        width = int(lengths.max()) if lengths.size else 1
+        genes = random_genomes(
+            rng, highest_parcel_id, (population_size, num_agents, width)
+        )
+        dna = PopulationDNA(genes, lengths)
+        dna.normalize()
+        return dna
+
+    def __len__(self) -> int:
+        return len(self.genes)
+
+    def take(self, indices: np.ndarray) -> "PopulationDNA":
+        # Create a copy of the DNA of the given individuals
+        return PopulationDNA(self.genes[indices], self.lengths[indices])
+
+    def replace(self, indices: np.ndarray, other: Self):
+        # Replace the DNA of the given individuals with the DNA of other
+        width = max(self.genes.shape[2], other.genes.shape[2])
+        self.genes = pad_genes(self.genes, width)
+        self.genes[indices] = pad_genes(other.genes, width)
+        self.lengths[indices] = other.lengths
+        self.normalize()
+
+    def concatenate(self, other: Self) -> "PopulationDNA":
+        width = max(self.genes.shape[2], other.genes.shape[2])
+        return PopulationDNA(
+            np.concatenate(
+                [pad_genes(self.genes, width), pad_genes(other.genes, width)]
+            ),
+            np.concatenate([self.lengths, other.lengths]),
+        )
+
+    @staticmethod
+    def from_genes(individuals: List[List[List[Id]]]) -> "PopulationDNA":
+        # Create the DNA from the genes of every agent of every individual
+        lengths = np.array(
+            [[len(genes) for genes in individual] for individual in individuals]
+        ).reshape(len(individuals), -1)
+        width = max(int(lengths.max()), 1) if lengths.size else 1
+        dna = np.full((*lengths.shape, width), -1, dtype=np.int32)
+        for i, individual in enumerate(individuals):
+            for a, genes in enumerate(individual):
+                dna[i, a, : len(genes)] = genes
+        return PopulationDNA(dna, lengths)
+
+    def get_genes(self, individual: int, agent: int) -> List[Id]:
+        return self.genes[individual, agent, : self.lengths[individual, agent]].tolist()
+
+    def pack(self) -> Tuple[np.ndarray, np.ndarray]:
+        # Pack the genes of every agent of every individual into the layout expected by
+        # Simulator.simulate_array
+        valid = np.arange(self.genes.shape[2]) < self.lengths[..., None]
+        genes = np.ascontiguousarray(self.genes[valid], dtype=np.int32)
+
+        offsets = np.zeros(self.lengths.size + 1, dtype=np.int32)
+        np.cumsum(self.lengths, out=offsets[1:])
+        return genes, offsets
+
+    def keys(self) -> List[bytes]:
+        # A hash of the per agent gene sequences of each individual, padding is not
+        # included
+        genes, offsets = self.pack()
+        starts = offsets[:: self.lengths.shape[1]]
+        return [
+            blake2b(
+                lengths.tobytes() + genes[start:end].tobytes(), digest_size=16
+            ).digest()
+            for lengths, start, end in zip(self.lengths, starts[:-1], starts[1:])
+        ]
+
+    def crossover(self, other: Self, crossover_rate: float, rng: np.random.Generator):
+        # Crossover the genes of each individual with the individual at the same index
+        # in other. Each gene is swapped with a certain probability, only where both
+        # agents have a gene
+        min_length = np.minimum(self.lengths, other.lengths)
+        swap = (np.arange(self.genes.shape[2]) < min_length[..., None]) & (
+            rng.random(self.genes.shape) < crossover_rate
+        )
+        self.genes = np.where(swap, other.genes, self.genes)
+        self.normalize()
+
+    def mutate(
+        self, mutation_rate: float, highest_parcel_id: int, rng: np.random.Generator
     ):
-        # The highest parcel id is used to determine the maximum value of the genes.
-        # The genes are a list of integers that represent the parcels that the agent will deliver.
-        # -1 is used to represent the warehouse location.
-        self.highest_parcel_id: Id = highest_parcel_id
-
-        # If initialize is True, the DNA will be initialized with a random number of genes
-        if initialize:
-            num_genes = np.random.randint(1, max_starting_genes)
-            self.genes: List[Id] = [self.get_random_genome() for _ in range(num_genes)]
-            self.genes[0] = -1
-        else:
-            self.genes: List[Id] = []
-
-    def get_random_genome(self):
-        # -1 is used to represent the warehouse location.
-        # highest_parcel_id is the biggest parcel id + 1
-        if np.random.rand() < WAREHOUSE_CHANCE:
-            return -1
-        return np.random.randint(-1, self.highest_parcel_id)
-
-    def crossover(self, other: Self, crossover_rate):
-        # Crossover the genes of the two agents with a certain probability
-        # min length is used to ensure that the crossover is done so that there is no out of bounds errors
-        min_length = min(len(self.genes), len(other.genes))
-        for i in range(min_length):
-            # If the random number is less than the crossover rate, the gene is swapped
-            if np.random.rand() < crossover_rate:
-                self.genes[i] = other.genes[i]
-
-    def mutate(self, mutation_rate: float):
-        # Keep track of the number of genes that are to be removed
-        removals = 0
-        for i in range(len(self.genes)):
-            # Mutate the genes of the agent with a certain probability
-            if np.random.rand() < mutation_rate:
-                choice = np.random.choice(
-                    [0, 1, 2],
-                    p=[
-                        MUTATION_CHANGE,
-                        MUTATION_REMOVE,
-                        MUTATION_ADD,
-                    ],
-                )
-                if choice == 0:
-                    # Randomly change the value of the gene
-                    self.genes[i] = self.get_random_genome()
-                if choice == 1:
-                    # Remove a gene
-                    removals += 1
-                if choice == 2:
-                    # Add a gene
-                    choice = np.random.randint(0, len(self.genes))
-                    self.genes.insert(choice, self.get_random_genome())
-
-        # Remove the genes that were marked for removal
-        for _ in range(removals):
-            choice = np.random.randint(0, len(self.genes))
-            self.genes.pop(choice)
+        num_individuals, num_agents, width = self.genes.shape
+        # Every agent of every individual is mutated independently, so they are handled
+        # as rows
+        rows = self.genes.reshape(-1, width)
+        lengths = self.lengths.reshape(-1)
+
+        # Mutate the genes with a certain probability and choose the kind of each
+        # mutation
+        valid = np.arange(width) < lengths[:, None]
+        mutating = valid & (rng.random(rows.shape) < mutation_rate)
+        kinds = np.full(rows.shape, -1)
+        kinds[mutating] = rng.choice(
+            3,
+            size=np.count_nonzero(mutating),
+            p=[MUTATION_CHANGE, MUTATION_REMOVE, MUTATION_ADD],
+        )
+
+        # Randomly change the value of the genes
+        change = kinds == 0
+        rows[change] = random_genomes(rng, highest_parcel_id, np.count_nonzero(change))
+
+        # Add genes at random positions
+        additions = np.count_nonzero(kinds == 2, axis=1)
+        if additions.any():
+            rows, lengths = insert_genes(
+                rows, lengths, additions, highest_parcel_id, rng
+            )
+
+        # Remove genes from random positions
+        removals = np.count_nonzero(kinds == 1, axis=1)
+        if removals.any():
+            rows, lengths = remove_genes(rows, lengths, removals, rng)
 
         # If the agent has no genes, add a random gene
-        if len(self.genes) == 0:
-            self.genes.append(self.get_random_genome())
+        empty = lengths == 0
+        rows[empty, 0] = random_genomes(rng, highest_parcel_id, np.count_nonzero(empty))
+        lengths[empty] = 1
 
-    def copy(self):
-        # Create a copy of the agent's DNA
-        other = AgentDNA(self.highest_parcel_id, 0, False)
-        other.genes = self.genes.copy()
-        return other
+        self.genes = rows.reshape(num_individuals, num_agents, -1)
+        self.lengths = lengths.reshape(num_individuals, num_agents)
+        self.normalize()
 
+    def normalize(self):
+        # Enforce that the starting location is always the first gene and that each
+        # individual has every parcel at most once, reset the padding and trim the
+        # padding that no agent uses
+        self.genes[:, :, 0] = -1
+        self.remove_duplicates()
+        width = max(int(self.lengths.max()), 1) if self.lengths.size else 1
+        self.genes = self.genes[:, :, :width]
+        self.genes[np.arange(width) >= self.lengths[..., None]] = -1
+
+    def remove_duplicates(self):
+        # The simulator rejects an agent given a parcel that another gene of the
+        # individual already has, so only the first occurrence of each parcel is kept,
+        # in agent order
+        num_individuals, num_agents, width = self.genes.shape
+        valid = np.arange(width) < self.lengths[..., None]
+        flat = self.genes.reshape(num_individuals, -1)
+        rows, columns = np.nonzero(valid.reshape(num_individuals, -1) & (flat >= 0))
+        values = flat[rows, columns]
+        order = np.lexsort((columns, values, rows))
+        rows, columns, values = rows[order], columns[order], values[order]
+        repeated = (rows[1:] == rows[:-1]) & (values[1:] == values[:-1])
+        if not repeated.any():
+            return
+
+        keep = valid.reshape(num_individuals, -1)
+        keep[rows[1:][repeated], columns[1:][repeated]] = False
+        keep = keep.reshape(-1, width)
+        # Move the kept genes to the front of each agent
+        order = np.argsort(~keep, axis=1, kind="stable")
+        self.genes = np.take_along_axis(
+            self.genes.reshape(-1, width), order, axis=1
+        ).reshape(num_individuals, num_agents, width)
+        self.lengths = np.count_nonzero(keep, axis=1).reshape(
+            num_individuals, num_agents
+        )
 
-class DNA:
-    def __init__(
-        self,
-        highest_parcel_id: int,
-        delivery_agents: List[DeliveryAgentInfo],
-        initialize: bool = True,
-    ):
-        # If initialize is True, the DNA will be initialized with Agents and their genes
-        if initialize:
-            self.dna: List[AgentDNA] = [
-                AgentDNA(highest_parcel_id, 2 * agent.max_capacity)
-                for agent in delivery_agents
-            ]
-        else:
-            self.dna: List[AgentDNA] = []
 
-    def copy(self):
-        # Create a copy of the DNA
-        other = DNA(0, [], False)
-        for i in range(len(self.dna)):
-            other.dna.append(self.dna[i].copy())
-        return other
+def random_genomes(
+    rng: np.random.Generator, highest_parcel_id: int, size
+) -> np.ndarray:
+    # -1 is used to represent the warehouse location.
+    # highest_parcel_id is the biggest parcel id + 1
+    return np.where(
+        rng.random(size) < WAREHOUSE_CHANCE,
+        -1,
+        rng.integers(-1, highest_parcel_id, size),
+    )
 
-    def reproduce(self, other: Self, crossover_rate, mutation_rate):
-        # Do the crossover and mutation of the DNA for each agent
-        for i in range(len(self.dna)):
-            self.dna[i].crossover(other.dna[i], crossover_rate)
-            self.dna[i].mutate(mutation_rate)
-            # Enforce that the stariing location is always the first gene
-            self.dna[i].genes[0] = -1
-        return self
+
+def pad_genes(genes: np.ndarray, width: int) -> np.ndarray:
+    padding = width - genes.shape[-1]
+    if padding == 0:
+        return genes
+    return np.pad(
+        genes, [(0, 0)] * (genes.ndim - 1) + [(0, padding)], constant_values=-1
+    )
+
+
+def insert_genes(
+    rows: np.ndarray,
+    lengths: np.ndarray,
+    additions: np.ndarray,
+    highest_parcel_id: int,
+    rng: np.random.Generator,
+) -> Tuple[np.ndarray, np.ndarray]:
+    # Each new gene is inserted before a random existing gene of its row. The existing
+    # genes are keyed by their position and the new genes by their insert position -
+    # 0.5, so sorting by the keys puts every gene in its place and the padding at the
+    # end
+    width = rows.shape[1]
+    max_additions = int(additions.max())
+
+    keys = np.where(np.arange(width) < lengths[:, None], np.arange(width), np.inf)
+    insert_keys = np.where(
+        np.arange(max_additions) < additions[:, None],
+        rng.integers(0, lengths[:, None], size=(len(rows), max_additions)) - 0.5,
+        np.inf,
+    )
+    new_genes = random_genomes(rng, highest_parcel_id, (len(rows), max_additions))
+
+    order = np.argsort(
+        np.concatenate([keys, insert_keys], axis=1), axis=1, kind="stable"
+    )
+    rows = np.take_along_axis(np.concatenate([rows, new_genes], axis=1), order, axis=1)
+    return rows, lengths + additions
+
+
+def remove_genes(
+    rows: np.ndarray,
+    lengths: np.ndarray,
+    removals: np.ndarray,
+    rng: np.random.Generator,
+) -> Tuple[np.ndarray, np.ndarray]:
+    # Rank the genes of each row in a random order and remove the lowest ranked ones
+    valid = np.arange(rows.shape[1]) < lengths[:, None]
+    priority = np.where(valid, rng.random(rows.shape), np.inf)
+    rank = np.argsort(np.argsort(priority, axis=1), axis=1)
+    keep = valid & (rank >= removals[:, None])
+
+    # Move the kept genes to the front of each row
+    order = np.argsort(~keep, axis=1, kind="stable")
+    return np.take_along_axis(rows, order, axis=1), np.count_nonzero(keep, axis=1)
+
+
+class FitnessCache:
+    def __init__(self, max_size: int = FITNESS_CACHE_SIZE):
+        # Least recently used cache of the simulation results (parcels delivered,
+        # distance travelled) of chromosomes
+        self.max_size = max_size
+        self.entries: OrderedDict[bytes, Tuple[float, float]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: bytes) -> Tuple[float, float] | None:
+        result = self.entries.get(key)
+        if result is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return result
+
+    def put(self, key: bytes, result: Tuple[float, float]):
+        if self.max_size <= 0:
+            return
+
+        self.entries[key] = result
+        self.entries.move_to_end(key)
+        # Evict the least recently used entries
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+
+def get_agent_table(delivery_agents: List[DeliveryAgentInfo]) -> np.ndarray:
+    # Agent information in the layout expected by Simulator.simulate_array
+    if isinstance(delivery_agents, AgentFleet):
+        return delivery_agents.table()
+    return np.array(
+        [[agent.id, agent.max_capacity, agent.max_dist] for agent in delivery_agents],
+        dtype=np.float64,
+    ).reshape(-1, 3)
+
+
+def get_solution(
+    population: PopulationDNA,
+    winner: int,
+    delivery_parcels: List[Parcel],
+    delivery_agents: List[DeliveryAgentInfo],
+) -> Dict[DeliveryAgentInfo, Route]:
+    # Create a dictionary of the solution
+    solution = {}
+    # Create a mapping of the parcel id to the parcel
+    parcel_map = {parcel.id: parcel for parcel in delivery_parcels}
+
+    # Create a dictionary of agents and their routes
+    for agent, agent_info in enumerate(delivery_agents):
+        # Create a route from the allocation
+        route: Route = Route([])
+        for gene in population.get_genes(winner, agent):
+            if gene == -1:
+                route.route.append(None)
+            else:
+                route.route.append(parcel_map[gene])
+
+        # Add the route to the solution for the agent
+        solution[agent_info] = route
+
+    # Return the solution
+    return solution
+
+
+# Selection strategies. Each one draws num_parents positions into the fitness array in
+# one batched call
+def roulette_selection(
+    rng: np.random.Generator, fitness: np.ndarray, num_parents: int
+) -> np.ndarray:
+    # Each individual is selected with a probability proportional to its fitness
+    cumulative = np.cumsum(fitness)
+    # If the sum of the fitness is 0, the selection is uniform
+    if cumulative[-1] <= 0:
+        return rng.integers(0, len(fitness), num_parents)
+
+    positions = np.searchsorted(
+        cumulative, rng.random(num_parents) * cumulative[-1], side="right"
+    )
+    return np.minimum(positions, len(fitness) - 1)
+
+
+def tournament_selection(
+    rng: np.random.Generator, fitness: np.ndarray, num_parents: int
+) -> np.ndarray:
+    # Each parent is the fittest of TOURNAMENT_SIZE randomly chosen individuals
+    candidates = rng.integers(0, len(fitness), (num_parents, TOURNAMENT_SIZE))
+    winners = np.argmax(fitness[candidates], axis=1)
+    return candidates[np.arange(num_parents), winners]
+
+
+def stochastic_universal_selection(
+    rng: np.random.Generator, fitness: np.ndarray, num_parents: int
+) -> np.ndarray:
+    # Like roulette selection but with evenly spaced pointers, so the number of times
+    # an individual is selected stays close to its expected value
+    cumulative = np.cumsum(fitness)
+    if cumulative[-1] <= 0:
+        return rng.integers(0, len(fitness), num_parents)
+
+    step = cumulative[-1] / num_parents
+    pointers = rng.random() * step + step * np.arange(num_parents)
+    positions = np.minimum(
+        np.searchsorted(cumulative, pointers, side="right"), len(fitness) - 1
+    )
+    # The pointers are ordered, so the positions are shuffled to pair parents randomly
+    return rng.permutation(positions)
+
+
+SELECTION_STRATEGIES = {
+    "roulette": roulette_selection,
+    "tournament": tournament_selection,
+    "sus": stochastic_universal_selection,
+}
 
 
 class Population:
@@ -148,18 +442,65 @@ class Population:
         self,
         delivery_parcels: List[Parcel],
         delivery_agents: List[DeliveryAgentInfo],
-        starting_location: Node,
+        starting_location: Node | Graph,
         populations_size: int = POPULATION_SIZE,
         num_generations: int = NUM_GENERATIONS,
         population_cutoff: int = POPULATION_CUTOFF,
         crossover_rate: float = CROSSOVER_RATE,
         mutation_rate: float = MUTATION_RATE,
         debug=False,
+        seed: int | np.random.SeedSequence | None = None,
+        selection: str = SELECTION,
+        fitness_cache_size: int = FITNESS_CACHE_SIZE,
+        num_threads: int = 0,
+        seed_fraction: float = SEED_FRACTION,
+        seeding: List[str] | Tuple[str, ...] = SEEDING,
+        local_search_size: int = LOCAL_SEARCH_SIZE,
+        local_search_target: str = LOCAL_SEARCH_TARGET,
+        local_search_moves: int = NUM_MOVES,
+        time_limit: float | None = TIME_LIMIT,
+        max_evaluations: int | None = MAX_EVALUATIONS,
+        stagnation_limit: int | None = STAGNATION_LIMIT,
+        progress: Progress | None = None,
+        distances: DistanceMatrix | None = None,
     ):
+        # The genetic algorithm stops after num_generations, after time_limit seconds,
+        # after max_evaluations simulations, after stagnation_limit generations without
+        # improvement or when progress returns True. distances can be shared with the
+        # caller, it is only read. The simulator is not shared since it is busy for the
+        # whole solve
+        self.progress = progress
+        self.stopped = False
+        self.deadline = None if time_limit is None else time.monotonic() + time_limit
+        self.max_evaluations = max_evaluations
+        self.stagnation_limit = stagnation_limit
+        self.evaluations = 0
+        self.stagnant_generations = 0
+
+        # Best individual found so far, and its (parcels delivered, -distance travelled)
+        self.best: PopulationDNA | None = None
+        self.best_score = (-np.inf, -np.inf)
+
+        # Simulation results of chromosomes that have already been evaluated
+        self.fitness_cache = FitnessCache(fitness_cache_size)
+        if selection not in SELECTION_STRATEGIES:
+            raise ValueError(
+                f"Unknown selection strategy {selection!r}, "
+                f"expected one of {list(SELECTION_STRATEGIES)}"
+            )
+        self.select = SELECTION_STRATEGIES[selection]
+
+        # All the randomness of the genetic algorithm comes from this generator
+        self.rng = np.random.default_rng(seed)
+        self.highest_parcel_id = len(delivery_parcels)
+
         # Create a population of DNA
-        self.population = [
-            DNA(len(delivery_parcels), delivery_agents) for _ in range(populations_size)
-        ]
+        self.population = PopulationDNA.random(
+            self.rng,
+            populations_size,
+            np.array([2 * agent.max_capacity for agent in delivery_agents]),
+            self.highest_parcel_id,
+        )
 
         # Set the parameters of the genetic algorithm
         self.population_cutoff = population_cutoff
@@ -167,10 +508,69 @@ class Population:
         self.mutation_rate = mutation_rate
         self.crossover_rate = crossover_rate
         self.debug = debug
-        self.simulator = Simulator(starting_location, delivery_parcels)
+        self.generation_num = 0
+        self.simulator = Simulator(starting_location, delivery_parcels, num_threads)
+        self.agent_table = get_agent_table(delivery_agents)
         self.delivery_agents = delivery_agents
         self.delivery_parcels = delivery_parcels
         self.starting_location = starting_location
+        self.graph = (
+            starting_location.to_graph()
+            if isinstance(starting_location, Node)
+            else starting_location
+        )
+        self.distances = distances
+
+        if local_search_target not in ("elites", "children"):
+            raise ValueError(
+                f"Unknown local search target {local_search_target!r}, "
+                "expected 'elites' or 'children'"
+            )
+        self.local_search_size = local_search_size
+        self.local_search_target = local_search_target
+        self.local_search_moves = local_search_moves
+        self.local_search: LocalSearch | None = None
+        if local_search_size > 0 and len(delivery_parcels) > 0:
+            self.local_search = LocalSearch(
+                delivery_parcels, delivery_agents, self.get_distances(), self.rng
+            )
+
+        # Replace part of the random population with feasible individuals from the
+        # seeders
+        num_seeded = min(int(round(seed_fraction * populations_size)), populations_size)
+        if num_seeded > 0 and len(seeding) > 0 and len(delivery_parcels) > 0:
+            self.seed_population(list(seeding), num_seeded)
+
+    def get_distances(self) -> DistanceMatrix:
+        # Shortest path distances between the parcel locations, computed once when first
+        # needed
+        if self.distances is None:
+            self.distances = DistanceMatrix(
+                self.graph, self.delivery_parcels, self.simulator
+            )
+        return self.distances
+
+    def seed_population(self, seeding: List[str], num_seeded: int):
+        for name in seeding:
+            if name not in SEEDERS:
+                raise ValueError(
+                    f"Unknown seeder {name!r}, expected one of {list(SEEDERS)}"
+                )
+
+        # The seeders take turns to build the seeded individuals
+        individuals = [
+            SEEDERS[seeding[i % len(seeding)]](
+                self.rng,
+                self.delivery_parcels,
+                self.delivery_agents,
+                self.get_distances(),
+                self.graph,
+            )
+            for i in range(num_seeded)
+        ]
+        self.population.replace(
+            np.arange(num_seeded), PopulationDNA.from_genes(individuals)
+        )
 
     def solution(self) -> Dict[DeliveryAgentInfo, Route]:
         if self.debug:
@@ -188,51 +588,146 @@ class Population:
             )
             print("-" * 79)
 
-        # Run the genetic algorithm for a certain number of generations
-        for self.generation_num in range(self.num_generations):
+        # Run the genetic algorithm until one of the stopping policies is met
+        self.evolve(self.num_generations)
+
+        if self.debug:
+            print()
+            print(
+                f" Fitness cache: {self.fitness_cache.hits} hits, "
+                f"{self.fitness_cache.misses} misses"
+            )
+
+        return self.best_solution()
+
+    def evolve(self, num_generations: int) -> bool:
+        # Evolves the population for up to num_generations, returns True if a stopping
+        # policy was met
+        for _ in range(num_generations):
+            if self.should_stop():
+                return True
+
             # Calculate the fitness of the population
             fitness = self.__calculate_fitness()
             # Evolve the population according to the fitness
             self.__evolution(fitness)
+            self.generation_num += 1
+            if self.progress is not None:
+                self.report(fitness)
 
-        if self.debug:
-            print()
+        return self.should_stop()
+
+    def report(self, fitness: np.ndarray):
+        # Pass the statistics of the generation to the progress callback, it can stop
+        # the genetic algorithm
+        parcels, distance = self.best_score
+        stats = {
+            "iteration": self.generation_num,
+            "evaluations": self.evaluations,
+            "best_parcels": int(parcels),
+            "best_distance": float(-distance),
+            "improved": self.stagnant_generations == 0,
+            "best_fitness": float(fitness[0, 1]),
+            "average_fitness": float(fitness[len(fitness) // 2, 1]),
+        }
+        if self.progress(stats, self.best_solution):  # type: ignore
+            self.stopped = True
 
-        # Get the best solution from the population. Population top population_cutoffs is sorted by fitness
-        winner = self.population[0]
+    def should_stop(self) -> bool:
+        if self.stopped:
+            return True
+        if self.generation_num >= self.num_generations:
+            return True
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            return True
+        if (
+            self.max_evaluations is not None
+            and self.evaluations >= self.max_evaluations
+        ):
+            return True
+        if (
+            self.stagnation_limit is not None
+            and self.stagnant_generations >= self.stagnation_limit
+        ):
+            return True
+        return False
 
-        # Create a dictionary of the solution
-        solution = {}
-        # Create a mapping of the parcel id to the parcel
-        parcel_map = {parcel.id: parcel for parcel in self.delivery_parcels}
+    def best_solution(self) -> Dict[DeliveryAgentInfo, Route]:
+        # The best solution found so far, available at any time
+        if self.best is None:
+            # Nothing has been evaluated yet, the first individual is as good as any
+            return self.get_solution(0)
+        return get_solution(self.best, 0, self.delivery_parcels, self.delivery_agents)
 
-        # Create a dictionary of agents and their routes
-        for agent_info, allocation in zip(self.delivery_agents, winner.dna):
-            # Create a route from the allocation
-            route: Route = Route([])
-            for gene in allocation.genes:
-                if gene == -1:
-                    route.route.append(None)
-                else:
-                    route.route.append(parcel_map[gene])
+    def get_elites(self, count: int) -> PopulationDNA:
+        # After evolving, the first population_cutoff individuals are sorted by fitness
+        return self.population.take(np.arange(min(count, self.population_cutoff)))
 
-            # Add the route to the solution for the agent
-            solution[agent_info] = route
+    def add_immigrants(self, immigrants: PopulationDNA):
+        # Immigrants replace the last children so the elites are kept
+        count = min(len(immigrants), len(self.population) - self.population_cutoff)
+        self.population.replace(
+            np.arange(len(self.population) - count, len(self.population)),
+            immigrants.take(np.arange(count)),
+        )
 
-        # Return the solution
-        return solution
+    def get_solution(self, winner: int) -> Dict[DeliveryAgentInfo, Route]:
+        return get_solution(
+            self.population, winner, self.delivery_parcels, self.delivery_agents
+        )
 
     def __calculate_fitness(self):
         # Calculate the fitness of the population
         # Get the population size
         pop_size = len(self.population)
 
-        allocations = [
-            {agent: gene.genes for agent, gene in zip(self.delivery_agents, p.dna)}
-            for p in self.population
-        ]
+        # infos[i] is the individual index, the number of parcels delivered and the
+        # distance travelled
+        infos = np.zeros((pop_size, 3))
+        infos[:, 0] = np.arange(pop_size)
+
+        # Look up the individuals that have already been simulated.
+        # Identical novel individuals are grouped so each chromosome is simulated once
+        novel: Dict[bytes, List[int]] = {}
+        for i, key in enumerate(self.population.keys()):
+            if key in novel:
+                novel[key].append(i)
+                continue
 
-        infos = np.array(self.simulator.simulate(allocations))
+            result = self.fitness_cache.get(key)
+            if result is None:
+                novel[key] = [i]
+            else:
+                infos[i, 1:] = result
+
+        # Only simulate the novel chromosomes
+        if len(novel) > 0:
+            keys = list(novel)
+            # Pack the genes of every agent of every novel individual into one array for
+            # the simulator
+            packed_genes, offsets = self.population.take(
+                np.array([novel[key][0] for key in keys])
+            ).pack()
+            results = np.array(
+                self.simulator.simulate_array(packed_genes, offsets, self.agent_table)
+            )
+
+            for index, parcels, distance in results:
+                key = keys[int(index)]
+                infos[novel[key], 1:] = parcels, distance
+                self.fitness_cache.put(key, (parcels, distance))
+            self.evaluations += len(keys)
+
+        # Keep track of the best individual found so far.
+        # Delivering more parcels is better, then travelling less distance
+        best = int(np.lexsort((infos[:, 2], -infos[:, 1]))[0])
+        score = (float(infos[best, 1]), -float(infos[best, 2]))
+        if score > self.best_score:
+            self.best = self.population.take(np.array([best]))
+            self.best_score = score
+            self.stagnant_generations = 0
+        else:
+            self.stagnant_generations += 1
 
         # Calculate the maximum distance that the agents travelled
         max_distance = np.max(infos[:, 2]) * 1.1
@@ -241,41 +736,30 @@ class Population:
         if max_distance != 0:
             infos[:, 2] = infos[:, 2] / max_distance
 
-        # Calculate the fitness of the population
+        # Calculate the fitness of the population The fitness is calculated as the sum
+        # of the number of parcels delivered and the distance travelled No of parcels is
+        # prioritized over distance therefore it is important that the distance cannot
+        # be equal to 1 This is achieved by multiplying the max_distance by 1.1 before
+        # normalizing A small value is added to make sure that no instance is equal to 0
         fitness = np.zeros((pop_size, 2))
-        for i in range(pop_size):
-            # The fitness is calculated as the sum of the number of parcels delivered and the distance travelled
-            # No of parcels is prioritized over distance therefore it is important that the distance cannot be equal to 1
-            # This is achieved by multiplying the max_distance by 1.1 before normalizing
-            # A small value is added to make sure that no instance is equal to 0
-            fitness[i] = [infos[i, 0], infos[i, 1] + infos[i, 2] + 0.001]
+        fitness[:, 0] = infos[:pop_size, 0]
+        fitness[:, 1] = infos[:pop_size, 1] + infos[:pop_size, 2] + 0.001
 
         # Return the sorted fitness
         return fitness[fitness[:, 1].argsort()][::-1]
 
     def __evolution(self, fitness: np.ndarray):
-        new_population = []
-
-        # Calculate the probability of each DNA being selected
-        sum_fitness = np.sum(fitness[:, 1])
-        # If the sum of the fitness is 0, the probability is set to uniform
-        probability = None
-        if sum_fitness != 0:
-            probability = fitness[:, 1] / sum_fitness
-
         # Get the indices of the population from the fitness
         indices = fitness[:, 0]
 
         if self.debug:
             generation_string = f"{self.generation_num:03}".center(TEXT_CENTER)
-            highest_fitness_string = (
-                f"{float_ensure_width(fitness[0, 1], TEXT_CENTER - 6)}".center(
-                    TEXT_CENTER
-                )
-            )
-            average_fitness_string = f"{float_ensure_width(fitness[len(self.population)//2, 1], TEXT_CENTER - 6)}".center(
-                TEXT_CENTER
-            )
+            highest_fitness_string = float_ensure_width(
+                fitness[0, 1], TEXT_CENTER - 6
+            ).center(TEXT_CENTER)
+            average_fitness_string = float_ensure_width(
+                fitness[len(self.population) // 2, 1], TEXT_CENTER - 6
+            ).center(TEXT_CENTER)
             print(
                 "\r|"
                 + generation_string
@@ -287,31 +771,51 @@ class Population:
                 end="",
             )
 
-        for i in range(len(self.population)):
-            # The top population_cutoff DNAs are kept in the new population
-            if i < self.population_cutoff:
-                new_population.append(self.population[int(indices[i])])
-                continue
+        # The top population_cutoff DNAs are kept in the new population
+        elites = self.population.take(indices[: self.population_cutoff].astype(np.intp))
+
+        # Select two parents for every child based on the fitness
+        num_children = len(self.population) - len(elites)
+        positions = self.select(self.rng, fitness[:, 1], 2 * num_children)
+        parents = indices[positions].astype(np.intp).reshape(num_children, 2)
+
+        # Reproduce the parents. The first parents are copied by take since they will be
+        # mutated
+        children = self.population.take(parents[:, 0])
+        children.crossover(
+            self.population.take(parents[:, 1]), self.crossover_rate, self.rng
+        )
+        children.mutate(self.mutation_rate, self.highest_parcel_id, self.rng)
 
-            # Select two parents based on the probability
-            parent1_index = np.random.choice(indices, p=probability)
-            parent2_index = np.random.choice(indices, p=probability)
-
-            # First parent is copied since it will be mutated
-            # Second parent is not copied since it will not be mutated
-            parent1 = self.population[int(parent1_index)].copy()
-            parent2 = self.population[int(parent2_index)]
-
-            # Reproduce the parents and add the child to the new population
-            new_population.append(
-                parent1.reproduce(
-                    parent2,
-                    self.crossover_rate,
-                    self.mutation_rate,
-                )
-            )
         # Set the population to the new population
-        self.population = new_population
+        self.population = elites.concatenate(children)
+
+        if self.local_search is not None:
+            self.improve(len(elites))
+
+    def improve(self, num_elites: int):
+        # Apply local search to the best elites or to a sample of the children
+        if self.local_search_target == "elites":
+            indices = np.arange(min(self.local_search_size, num_elites))
+        else:
+            num_children = len(self.population) - num_elites
+            indices = num_elites + self.rng.choice(
+                num_children, min(self.local_search_size, num_children), replace=False
+            )
+        if len(indices) == 0:
+            return
+
+        individuals = [
+            self.local_search.improve(
+                [
+                    self.population.get_genes(int(i), agent)
+                    for agent in range(len(self.delivery_agents))
+                ],
+                self.local_search_moves,
+            )
+            for i in indices
+        ]
+        self.population.replace(indices, PopulationDNA.from_genes(individuals))
 
 
 def model(
@@ -319,8 +823,223 @@ def model(
     delivery_parcels: List[Parcel],
     delivery_agents: List[DeliveryAgentInfo],
     debug: bool = False,
+    islands: int = 1,
+    **options,
 ) -> Dict[DeliveryAgentInfo, Route]:
-    # Create a population of DNA and gets the solution
+    # Create a population of DNA and gets the solution. With more than one island, the
+    # populations evolve in parallel processes, see island_model
+    if islands > 1:
+        return island_model(
+            root_node,
+            delivery_parcels,
+            delivery_agents,
+            debug=debug,
+            num_islands=islands,
+            **options,
+        )
     return Population(
-        delivery_parcels, delivery_agents, root_node, debug=debug
+        delivery_parcels, delivery_agents, root_node, debug=debug, **options
     ).solution()
+
+
+def run_island(
+    index: int,
+    graph: Graph,
+    delivery_parcels: List[Parcel],
+    delivery_agents: List[DeliveryAgentInfo],
+    seed: np.random.SeedSequence,
+    num_generations: int,
+    migration_interval: int,
+    num_migrants: int,
+    inbox: Any,
+    outbox: Any,
+    results: Any,
+    stop: Any,
+    options: Dict[str, Any],
+):
+    # Runs in a worker process. Each island has its own simulator and random generator.
+    # The islands form a ring, the best individuals migrate to the next island every
+    # migration_interval generations. The statistics and the best individual of the
+    # island are reported at every migration, and the island stops at its next
+    # generation once stop is set
+    stats: Dict[str, Any] = {}
+
+    def record(generation_stats: Dict[str, Any], solution: Any) -> bool:
+        stats.update(generation_stats)
+        return stop.is_set()
+
+    population = Population(
+        delivery_parcels,
+        delivery_agents,
+        graph,
+        num_generations=num_generations,
+        seed=seed,
+        num_threads=1,
+        progress=record,
+        **options,
+    )
+
+    # Migration is in lock step: each island takes in the migrants its neighbour sent
+    # after the same generation, so that a fixed seed always gives the same result.
+    # An island that stops sends None instead, and is not waited for after that
+    neighbour_running = num_migrants > 0
+    while not population.evolve(migration_interval):
+        if population.best is not None:
+            results.put(("progress", index, dict(stats), population.best))
+        if num_migrants > 0:
+            outbox.put(population.get_elites(num_migrants))
+        if neighbour_running:
+            immigrants = inbox.get()
+            if immigrants is None:
+                neighbour_running = False
+            else:
+                population.add_immigrants(immigrants)
+    if num_migrants > 0:
+        outbox.put(None)
+
+    # Send back the best individual of the island
+    best = population.best
+    if best is None:
+        best = population.population.take(np.array([0]))
+    results.put(("done", index, best, dict(stats)))
+
+
+def island_model(
+    root_node: Node | Graph,
+    delivery_parcels: List[Parcel],
+    delivery_agents: List[DeliveryAgentInfo],
+    debug: bool = False,
+    num_islands: int = NUM_ISLANDS,
+    num_generations: int = NUM_GENERATIONS,
+    migration_interval: int = MIGRATION_INTERVAL,
+    num_migrants: int = NUM_MIGRANTS,
+    seed: int | np.random.SeedSequence | None = None,
+    **options,
+) -> Dict[DeliveryAgentInfo, Route]:
+    # Runs a population on each island in its own process and returns the best solution
+    # of all the islands. The island seeds are spawned from seed, which can itself be spawned
+    # by a caller such as the decomposition
+    if num_islands < 1:
+        raise ValueError("num_islands should be at least 1")
+    if migration_interval < 1:
+        raise ValueError("migration_interval should be at least 1")
+
+    graph = root_node.to_graph() if isinstance(root_node, Node) else root_node
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    seeds = seed.spawn(num_islands)
+    # The progress callback cannot be sent to the islands. It is called with the best
+    # island so far whenever an island migrates, and once more with the winner. Stopping
+    # it stops every island
+    progress: Progress | None = options.pop("progress", None)
+    # Every island simulates on one thread
+    options.pop("num_threads", None)
+
+    # Processes are spawned so that no simulator threads or locks are inherited from
+    # this process
+    context = multiprocessing.get_context("spawn")
+    inboxes = [context.Queue() for _ in range(num_islands)]
+    results = context.Queue()
+    stop = context.Event()
+    islands = [
+        context.Process(
+            target=run_island,
+            args=(
+                i,
+                graph,
+                delivery_parcels,
+                delivery_agents,
+                seeds[i],
+                num_generations,
+                migration_interval,
+                num_migrants,
+                inboxes[i],
+                inboxes[(i + 1) % num_islands],
+                results,
+                stop,
+                options,
+            ),
+            daemon=True,
+        )
+        for i in range(num_islands)
+    ]
+    for island in islands:
+        island.start()
+
+    # Results are collected before joining so that no island blocks on a full queue
+    winners: List[PopulationDNA | None] = [None] * num_islands
+    best_score = (-np.inf, -np.inf)
+    best_island: PopulationDNA | None = None
+    generations = 0
+    try:
+        while any(winner is None for winner in winners):
+            try:
+                kind, index, *message = results.get(timeout=1)
+            except queue.Empty:
+                if any(island.exitcode not in (None, 0) for island in islands):
+                    raise RuntimeError("An island of the genetic algorithm failed")
+                continue
+            if kind == "done":
+                winners[index] = message[0]
+                generations = max(generations, message[1].get("iteration", 0))
+                continue
+
+            island_stats, island_best = message
+            generations = max(generations, island_stats["iteration"])
+            score = (island_stats["best_parcels"], -island_stats["best_distance"])
+            improved = score > best_score
+            if improved:
+                best_score, best_island = score, island_best
+            if progress is not None and progress(
+                {
+                    "iteration": generations,
+                    "best_parcels": int(best_score[0]),
+                    "best_distance": float(-best_score[1]),
+                    "improved": improved,
+                    "island": index,
+                },
+                lambda best=best_island: get_solution(
+                    best, 0, delivery_parcels, delivery_agents
+                ),
+            ):
+                stop.set()
+    finally:
+        for island in islands:
+            if island.is_alive():
+                island.terminate()
+            island.join()
+
+    # Simulate the best individual of every island and pick the one that delivers the
+    # most parcels in the least distance
+    best = winners[0]
+    for winner in winners[1:]:
+        best = best.concatenate(winner)
+    packed_genes, offsets = best.pack()
+    infos = Simulator(graph, delivery_parcels).simulate_array(
+        packed_genes, offsets, get_agent_table(delivery_agents)
+    )
+    index, parcels, distance = max(infos, key=lambda info: (info[1], -info[2]))
+
+    if debug:
+        print("=" * 79)
+        print(" GA Islands:")
+        print("-" * 79)
+        for i, island_parcels, island_distance in infos:
+            print(
+                f" Island {i:03}: {island_parcels} parcels delivered, "
+                f"{island_distance:.2f} distance travelled"
+            )
+        print(f" Winner: island {index:03}")
+
+    solution = get_solution(best, int(index), delivery_parcels, delivery_agents)
+    if progress is not None:
+        progress(
+            {
+                "iteration": generations,
+                "best_parcels": int(parcels),
+                "best_distance": float(distance),
+                "improved": (parcels, -distance) > best_score,
+            },
+            lambda: solution,
+        )
+    return solution
@@ -0,0 +1,644 @@
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+import numpy as np
+
+from common import DeliveryAgentInfo, Parcel, Progress, Route
+from distances import DistanceMatrix
+from node import Graph, Node
+from Simulator import Simulator
+from Algos.savings import Trip, assign_trips, savings_trips
+
+TIME_LIMIT = 5.0
+NUM_ITERATIONS = 10000
+
+# Fraction of the parcels removed by each destroy operator, between these bounds
+MIN_DESTROY = 0.05
+MAX_DESTROY = 0.25
+# Randomness of the worst cost and related removals, higher is more deterministic
+REMOVAL_DETERMINISM = 3
+REGRET_K = 3
+
+# Adaptive weights. Operators are rewarded for finding a new best, improving or being accepted,
+# and the weights are updated every SEGMENT_LENGTH iterations
+SCORE_BEST = 33
+SCORE_BETTER = 9
+SCORE_ACCEPTED = 13
+REACTION = 0.1
+SEGMENT_LENGTH = 100
+
+# Simulated annealing acceptance. The start temperature accepts a solution START_WORSE worse with probability 1/2
+START_WORSE = 0.05
+COOLING = 0.9995
+
+TEXT_CENTER = 25
+
+
+class Solution:
+    # The trips of every agent. Every trip respects the agent's capacity and every agent stays
+    # within its distance budget, with each trip returning to the warehouse.
+    # Every agent always has an empty trip that parcels can be inserted into to start a new trip.
+    # trip_of[parcel] is the trip delivering the parcel or -1, agent_costs is the distance travelled
+    # by each agent and distance the total, they are kept up to date by the ALNS moves
+    def __init__(
+        self,
+        trips: List[Trip],
+        agents: List[int],
+        unassigned: List[int],
+        trip_of: np.ndarray,
+        agent_costs: np.ndarray,
+    ):
+        self.trips = trips
+        self.agents = agents
+        self.unassigned = unassigned
+        self.trip_of = trip_of
+        self.agent_costs = agent_costs
+        self.distance = float(agent_costs.sum())
+
+    def copy(self) -> "Solution":
+        return Solution(
+            [Trip(list(trip.parcels), trip.load, trip.cost) for trip in self.trips],
+            list(self.agents),
+            list(self.unassigned),
+            self.trip_of.copy(),
+            self.agent_costs.copy(),
+        )
+
+
+class ALNS:
+    def __init__(
+        self,
+        delivery_parcels: List[Parcel],
+        delivery_agents: List[DeliveryAgentInfo],
+        starting_location: Node | Graph,
+        time_limit: float | None = TIME_LIMIT,
+        num_iterations: int = NUM_ITERATIONS,
+        debug: bool = False,
+        seed: int | np.random.SeedSequence | None = None,
+        progress: Progress | None = None,
+    ):
+        self.rng = np.random.default_rng(seed)
+        self.progress = progress
+        self.time_limit = time_limit
+        self.num_iterations = num_iterations
+        self.debug = debug
+        self.delivery_parcels = delivery_parcels
+        self.delivery_agents = delivery_agents
+
+        graph = (
+            starting_location.to_graph()
+            if isinstance(starting_location, Node)
+            else starting_location
+        )
+        distances = DistanceMatrix(
+            graph, delivery_parcels, Simulator(graph, delivery_parcels)
+        )
+
+        # Distances between the stops of the trips: the warehouse is stop 0 and parcel i is stop i + 1
+        indices = np.concatenate(
+            [[0], distances.indices(parcel.location for parcel in delivery_parcels)]
+        )
+        self.legs = distances.distances[np.ix_(indices, indices)].astype(np.float64)
+        # to_parcels[p, s] is the leg from stop s to parcel p and from_parcels[p, s] the leg from parcel p to stop s
+        self.to_parcels = np.ascontiguousarray(self.legs[:, 1:].T)
+        self.from_parcels = self.legs[1:, :]
+        self.capacities = np.array([agent.max_capacity for agent in delivery_agents])
+        self.budgets = np.array([agent.max_dist for agent in delivery_agents])
+
+        # An undelivered parcel costs more than any route, so delivering parcels always comes first
+        self.penalty = float(self.budgets.sum()) + 1.0
+
+        self.destroy_operators: List[Callable[[Solution, int], List[int]]] = [
+            self.random_removal,
+            self.worst_removal,
+            self.related_removal,
+        ]
+        self.repair_operators: List[Callable[[Solution, List[int]], None]] = [
+            self.greedy_insertion,
+            self.regret_insertion,
+        ]
+
+        # Caches of the trips of the current solution. Column t of insertion_deltas and insertion_positions
+        # holds the insertion costs of the parcels into trip t, NaN when they are not known. gains[t] holds
+        # the removal gains of the parcels of trip t, None when not known. Both are cleared when trip t changes
+        self.insertion_deltas = np.empty((len(delivery_parcels), 0))
+        self.insertion_positions = np.empty((len(delivery_parcels), 0), dtype=np.intp)
+        self.gains: List[np.ndarray | None] = []
+        # Changes made to the current solution since the last accepted candidate, undone in reverse
+        self.undo_log: List[Tuple[Any, ...]] = []
+
+    # Costs
+
+    def trip_cost(self, parcels: List[int]) -> float:
+        stops = np.array([0] + [parcel + 1 for parcel in parcels] + [0])
+        return float(self.legs[stops[:-1], stops[1:]].sum())
+
+    def objective(self, solution: Solution) -> float:
+        return solution.distance + self.penalty * len(solution.unassigned)
+
+    def insertion_costs(
+        self, trip: Trip, parcels: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        # Cheapest increase in distance of inserting each parcel into the trip, and where to insert it
+        stops = np.array([0] + [parcel + 1 for parcel in trip.parcels] + [0])
+        before, after = stops[:-1], stops[1:]
+        deltas = (
+            self.to_parcels[parcels[:, None], before]
+            + self.from_parcels[parcels[:, None], after]
+            - self.legs[before, after][None, :]
+        )
+        positions = np.argmin(deltas, axis=1)
+        return deltas[np.arange(len(parcels)), positions], positions
+
+    def cached_insertion_costs(
+        self, solution: Solution, parcels: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        # Insertion costs of the parcels into every trip. Only the trips that changed since their
+        # costs were cached are computed again
+        num_trips = len(solution.trips)
+        deltas = self.insertion_deltas[parcels, :num_trips]
+        positions = self.insertion_positions[parcels, :num_trips]
+        for t in np.flatnonzero(np.isnan(deltas).any(axis=0)).tolist():
+            deltas[:, t], positions[:, t] = self.insertion_costs(
+                solution.trips[t], parcels
+            )
+            self.insertion_deltas[parcels, t] = deltas[:, t]
+            self.insertion_positions[parcels, t] = positions[:, t]
+        return deltas, positions
+
+    def removal_gains(self, t: int, trip: Trip) -> np.ndarray:
+        # Decrease in distance of removing each parcel of the trip
+        gains = self.gains[t]
+        if gains is None:
+            stops = np.array([0] + [parcel + 1 for parcel in trip.parcels] + [0])
+            gains = self.gains[t] = (
+                self.legs[stops[:-2], stops[1:-1]]
+                + self.legs[stops[1:-1], stops[2:]]
+                - self.legs[stops[:-2], stops[2:]]
+            )
+        return gains
+
+    # Changes to the current solution. Each one is logged so that a rejected candidate can be undone
+
+    def change_cost(self, solution: Solution, t: int, cost: float):
+        trip = solution.trips[t]
+        solution.agent_costs[solution.agents[t]] += cost - trip.cost
+        solution.distance += cost - trip.cost
+        trip.cost = cost
+
+    def clear_cache(self, t: int):
+        self.insertion_deltas[:, t] = np.nan
+        self.gains[t] = None
+
+    def insert_parcel(
+        self, solution: Solution, t: int, position: int, parcel: int, delta: float
+    ):
+        trip = solution.trips[t]
+        self.undo_log.append(("insert", t, position, parcel, trip.cost))
+        trip.parcels.insert(position, parcel)
+        trip.load += 1
+        self.change_cost(solution, t, trip.cost + delta)
+        solution.trip_of[parcel] = t
+        self.clear_cache(t)
+
+        if trip.load == 1:
+            # The empty trip was used, so the agent gets a new empty trip
+            self.undo_log.append(("append",))
+            solution.trips.append(Trip([], 0, 0.0))
+            solution.agents.append(solution.agents[t])
+            self.gains.append(None)
+            if self.insertion_deltas.shape[1] < len(solution.trips):
+                self.grow_cache(2 * len(solution.trips))
+
+    def remove_parcel(self, solution: Solution, parcel: int):
+        t = int(solution.trip_of[parcel])
+        trip = solution.trips[t]
+        position = trip.parcels.index(parcel)
+        gain = float(self.removal_gains(t, trip)[position])
+        self.undo_log.append(("remove", t, position, parcel, trip.cost))
+        trip.parcels.pop(position)
+        trip.load -= 1
+        self.change_cost(solution, t, trip.cost - gain)
+        solution.trip_of[parcel] = -1
+        self.clear_cache(t)
+
+    def undo(self, solution: Solution):
+        # Reverts the logged changes. The caches of the changed trips are cleared rather than restored
+        while self.undo_log:
+            change = self.undo_log.pop()
+            if change[0] == "append":
+                solution.trips.pop()
+                solution.agents.pop()
+                self.gains.pop()
+                self.insertion_deltas[:, len(solution.trips)] = np.nan
+                continue
+
+            kind, t, position, parcel, cost = change
+            trip = solution.trips[t]
+            if kind == "insert":
+                trip.parcels.pop(position)
+                trip.load -= 1
+                solution.trip_of[parcel] = -1
+            else:
+                trip.parcels.insert(position, parcel)
+                trip.load += 1
+                solution.trip_of[parcel] = t
+            self.change_cost(solution, t, cost)
+            self.clear_cache(t)
+
+    def grow_cache(self, num_columns: int):
+        # Room for the insertion costs of more trips, the new columns are unknown
+        extra = num_columns - self.insertion_deltas.shape[1]
+        self.insertion_deltas = np.pad(
+            self.insertion_deltas, ((0, 0), (0, extra)), constant_values=np.nan
+        )
+        self.insertion_positions = np.pad(
+            self.insertion_positions, ((0, 0), (0, extra))
+        )
+
+    # Initial solution
+
+    def initial_solution(self) -> Solution:
+        # Start from the savings solution
+        n = len(self.delivery_parcels)
+        outbound, inbound = self.legs[0, 1:], self.legs[1:, 0]
+        legs = self.legs[1:, 1:]
+        savings = savings_trips(
+            outbound,
+            inbound,
+            legs,
+            int(self.capacities.max()),
+            float(self.budgets.max()),
+        )
+        assigned = assign_trips(savings, self.delivery_agents, outbound, inbound, legs)
+
+        trips: List[Trip] = []
+        agents: List[int] = []
+        for agent, agent_trips in enumerate(assigned):
+            for trip in agent_trips:
+                trips.append(
+                    Trip(trip.parcels, len(trip.parcels), self.trip_cost(trip.parcels))
+                )
+                agents.append(agent)
+        delivered = {parcel for trip in trips for parcel in trip.parcels}
+        unassigned = [i for i in range(n) if i not in delivered]
+
+        self.gains = [None] * len(trips)
+        self.insertion_deltas = np.full((n, len(trips)), np.nan)
+        self.insertion_positions = np.zeros((n, len(trips)), dtype=np.intp)
+        return self.compact(trips, agents, unassigned)
+
+    def compact(
+        self, trips: List[Trip], agents: List[int], unassigned: List[int]
+    ) -> Solution:
+        # Drop the empty trips, which removals leave behind, and give every agent one empty trip at the end.
+        # The caches follow their trips. The costs are summed again, which clears any rounding errors
+        num_agents = len(self.delivery_agents)
+        kept = [t for t, trip in enumerate(trips) if trip.load > 0]
+        trips = [trips[t] for t in kept] + [Trip([], 0, 0.0) for _ in range(num_agents)]
+        agents = [agents[t] for t in kept] + list(range(num_agents))
+
+        self.gains = [self.gains[t] for t in kept] + [None] * num_agents
+        columns = np.array(kept, dtype=np.intp)
+        self.insertion_deltas = self.insertion_deltas[:, columns]
+        self.insertion_positions = self.insertion_positions[:, columns]
+        self.grow_cache(2 * len(trips))
+
+        trip_of = np.full(len(self.delivery_parcels), -1, dtype=np.intp)
+        for t in range(len(kept)):
+            trip_of[trips[t].parcels] = t
+        agent_costs = np.zeros(num_agents)
+        np.add.at(agent_costs, agents, [trip.cost for trip in trips])
+        return Solution(trips, agents, unassigned, trip_of, agent_costs)
+
+    # Destroy operators. Each one removes up to count parcels from the trips and returns them
+
+    def remove(self, solution: Solution, parcels: List[int]) -> List[int]:
+        for parcel in parcels:
+            self.remove_parcel(solution, parcel)
+        return parcels
+
+    def assigned(self, solution: Solution) -> np.ndarray:
+        return np.flatnonzero(solution.trip_of >= 0)
+
+    def random_removal(self, solution: Solution, count: int) -> List[int]:
+        parcels = self.assigned(solution)
+        count = min(count, len(parcels))
+        picked = self.rng.choice(parcels, count, replace=False)
+        return self.remove(solution, picked.tolist())
+
+    def worst_removal(self, solution: Solution, count: int) -> List[int]:
+        # Remove the parcels whose detour costs the most, with some randomness
+        parcels = []
+        gains = []
+        for t, trip in enumerate(solution.trips):
+            if trip.load == 0:
+                continue
+            gains.append(self.removal_gains(t, trip))
+            parcels.extend(trip.parcels)
+        if len(parcels) == 0:
+            return []
+
+        order = np.argsort(-np.concatenate(gains), kind="stable")
+        return self.remove(solution, self.biased_pick(np.array(parcels)[order], count))
+
+    def related_removal(self, solution: Solution, count: int) -> List[int]:
+        # Shaw removal: remove a random parcel and the parcels closest to it
+        parcels = self.assigned(solution)
+        if len(parcels) == 0:
+            return []
+        seed = parcels[self.rng.integers(len(parcels))] + 1
+        relatedness = self.legs[seed, parcels + 1] + self.legs[parcels + 1, seed]
+        order = np.argsort(relatedness, kind="stable")
+        return self.remove(solution, self.biased_pick(parcels[order], count))
+
+    def biased_pick(self, ranked: np.ndarray, count: int) -> List[int]:
+        # Pick count parcels from a ranked array, preferring the ones at the front
+        ranked = list(ranked.tolist())
+        picked = []
+        for _ in range(min(count, len(ranked))):
+            position = int(self.rng.random() ** REMOVAL_DETERMINISM * len(ranked))
+            picked.append(ranked.pop(position))
+        return picked
+
+    # Repair operators. Each one inserts the pending parcels where they are feasible
+
+    def greedy_insertion(self, solution: Solution, pending: List[int]):
+        self.insert(solution, pending, 1)
+
+    def regret_insertion(self, solution: Solution, pending: List[int]):
+        self.insert(solution, pending, REGRET_K)
+
+    def insert(self, solution: Solution, pending: List[int], regret: int):
+        # Insertion costs come from the cache, so only the trips that changed since they were cached
+        # are computed again, and only the changed trip after each insertion.
+        # With regret 1 the cheapest insertion is made first, otherwise the parcel that loses the most
+        # by not being inserted into its best trip is inserted first. An insertion only changes the
+        # trips of one agent, so the cheapest regret options of each parcel are kept per agent and
+        # only those of that agent are found again
+        pending_parcels = np.array(pending, dtype=np.intp)
+        active = np.ones(len(pending_parcels), dtype=bool)
+
+        deltas, positions = self.cached_insertion_costs(solution, pending_parcels)
+        loads = np.array([trip.load for trip in solution.trips])
+        num_agents = len(self.delivery_agents)
+        agent_trips: List[List[int]] = [[] for _ in range(num_agents)]
+        for t, agent in enumerate(solution.agents):
+            agent_trips[agent].append(t)
+
+        # The regret cheapest costs of inserting each parcel into the trips of each agent, and its cheapest trip
+        options = np.full((len(pending_parcels), num_agents, regret), np.inf)
+        option_trips = np.zeros((len(pending_parcels), num_agents), dtype=np.intp)
+
+        def update(agent: int):
+            # The insertion has to fit the capacity and the distance budget of the agent
+            trips = np.array(agent_trips[agent], dtype=np.intp)
+            feasible = (
+                active[:, None]
+                & (loads[trips] < self.capacities[agent])[None, :]
+                & (
+                    solution.agent_costs[agent] + deltas[:, trips]
+                    <= self.budgets[agent]
+                )
+            )
+            costs = np.where(feasible, deltas[:, trips], np.inf)
+            option_trips[:, agent] = trips[np.argmin(costs, axis=1)]
+            if len(trips) > regret:
+                costs = np.partition(costs, regret - 1, axis=1)[:, :regret]
+            options[:, agent, : costs.shape[1]] = costs
+
+        for agent in range(num_agents):
+            update(agent)
+
+        while active.any():
+            costs = options.reshape(len(pending_parcels), -1)
+            best_costs = costs.min(axis=1)
+            candidates = np.isfinite(best_costs)
+            if not candidates.any():
+                break
+
+            if regret > 1 and costs.shape[1] > 1:
+                k = min(regret, costs.shape[1])
+                cheapest = np.partition(costs, k - 1, axis=1)[:, :k]
+                cheapest = np.sort(cheapest, axis=1)
+                # Parcels with fewer than k options are the most urgent
+                with np.errstate(invalid="ignore"):
+                    regrets = np.where(
+                        np.isfinite(cheapest[:, 1:]),
+                        cheapest[:, 1:] - cheapest[:, :1],
+                        self.penalty,
+                    ).sum(axis=1)
+                # Ties are broken by the cheapest insertion
+                priority = np.where(
+                    candidates, regrets - best_costs / (self.penalty * 2), -np.inf
+                )
+                chosen = int(np.argmax(priority))
+            else:
+                chosen = int(np.argmin(best_costs))
+
+            agent = int(np.argmin(options[chosen].min(axis=1)))
+            t = int(option_trips[chosen, agent])
+            num_trips = len(solution.trips)
+            self.insert_parcel(
+                solution,
+                t,
+                int(positions[chosen, t]),
+                int(pending_parcels[chosen]),
+                float(deltas[chosen, t]),
+            )
+            active[chosen] = False
+            options[chosen] = np.inf
+            loads[t] += 1
+
+            # Only the changed trip needs new insertion costs, and only for the parcels still pending
+            live = np.flatnonzero(active)
+            deltas[live, t], positions[live, t] = self.insertion_costs(
+                solution.trips[t], pending_parcels[live]
+            )
+            self.insertion_deltas[pending_parcels[live], t] = deltas[live, t]
+            self.insertion_positions[pending_parcels[live], t] = positions[live, t]
+            if len(solution.trips) > num_trips:
+                # The empty trip was used and the agent got a new empty trip
+                new_deltas, new_positions = self.insertion_costs(
+                    solution.trips[num_trips], pending_parcels
+                )
+                deltas = np.column_stack([deltas, new_deltas])
+                positions = np.column_stack([positions, new_positions])
+                loads = np.append(loads, 0)
+                agent_trips[agent].append(num_trips)
+            update(agent)
+
+        solution.unassigned = [int(parcel) for parcel in pending_parcels[active]]
+
+    # Search
+
+    def solution(self) -> Dict[DeliveryAgentInfo, Route]:
+        if len(self.delivery_parcels) == 0 or len(self.delivery_agents) == 0:
+            return {agent: Route([None]) for agent in self.delivery_agents}
+
+        if self.debug:
+            print("=" * 79)
+            print(" ALNS Progress:")
+            print("-" * 79)
+            print(
+                "|"
+                + "Iteration".center(TEXT_CENTER)
+                + "|"
+                + "Parcels Delivered".center(TEXT_CENTER)
+                + "|"
+                + "Distance".center(TEXT_CENTER)
+                + "|"
+            )
+            print("-" * 79)
+
+        deadline = (
+            None if self.time_limit is None else time.monotonic() + self.time_limit
+        )
+        current = self.initial_solution()
+        current_objective = self.objective(current)
+        best, best_objective = current.copy(), current_objective
+
+        destroy_weights = np.ones(len(self.destroy_operators))
+        repair_weights = np.ones(len(self.repair_operators))
+        destroy_scores = np.zeros(len(self.destroy_operators))
+        repair_scores = np.zeros(len(self.repair_operators))
+        destroy_uses = np.zeros(len(self.destroy_operators))
+        repair_uses = np.zeros(len(self.repair_operators))
+
+        # Accept a START_WORSE relative worsening of the distance with probability 1/2 at the start
+        distance = current.distance
+        temperature = max(START_WORSE * distance / np.log(2), 1e-9)
+        n = len(self.delivery_parcels)
+
+        iteration = 0
+        for iteration in range(self.num_iterations):
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+
+            # Choose the operators by their weights and how many parcels to remove
+            destroy = int(
+                self.rng.choice(
+                    len(destroy_weights), p=destroy_weights / destroy_weights.sum()
+                )
+            )
+            repair = int(
+                self.rng.choice(
+                    len(repair_weights), p=repair_weights / repair_weights.sum()
+                )
+            )
+            count = int(
+                self.rng.integers(
+                    max(1, int(MIN_DESTROY * n)), max(2, int(MAX_DESTROY * n)) + 1
+                )
+            )
+
+            # The candidate is made by changing the current solution in place, the changes are undone if it is rejected
+            unassigned = current.unassigned
+            removed = self.destroy_operators[destroy](current, count)
+            self.repair_operators[repair](current, removed + unassigned)
+            candidate_objective = self.objective(current)
+
+            score = 0
+            improved = candidate_objective < best_objective - 1e-9
+            if improved:
+                best, best_objective = current.copy(), candidate_objective
+                score = SCORE_BEST
+            if candidate_objective < current_objective - 1e-9:
+                score = max(score, SCORE_BETTER)
+            # Worse candidates are accepted with probability exp(-worsening / temperature)
+            worsening = candidate_objective - current_objective
+            if worsening <= 0 or self.rng.random() < np.exp(-worsening / temperature):
+                current_objective = candidate_objective
+                score = max(score, SCORE_ACCEPTED)
+                self.undo_log.clear()
+            else:
+                self.undo(current)
+                current.unassigned = unassigned
+            temperature *= COOLING
+
+            destroy_scores[destroy] += score
+            repair_scores[repair] += score
+            destroy_uses[destroy] += 1
+            repair_uses[repair] += 1
+
+            if (iteration + 1) % SEGMENT_LENGTH == 0:
+                # Move the weights towards the average score of each operator in the segment
+                for weights, scores, uses in (
+                    (destroy_weights, destroy_scores, destroy_uses),
+                    (repair_weights, repair_scores, repair_uses),
+                ):
+                    used = uses > 0
+                    weights[used] = (1 - REACTION) * weights[used] + REACTION * (
+                        scores[used] / uses[used]
+                    )
+                    np.maximum(weights, 1e-3, out=weights)
+                    scores[:] = 0
+                    uses[:] = 0
+                current = self.compact(
+                    current.trips, current.agents, current.unassigned
+                )
+                current_objective = self.objective(current)
+
+            if self.debug:
+                print(
+                    "\r|"
+                    + f"{iteration:05}".center(TEXT_CENTER)
+                    + "|"
+                    + f"{n - len(best.unassigned)} parcels".center(TEXT_CENTER)
+                    + "|"
+                    + f"{best_objective - self.penalty * len(best.unassigned):.2f}".center(
+                        TEXT_CENTER
+                    )
+                    + "|",
+                    end="",
+                )
+
+            if self.progress is not None:
+                stats = {
+                    "iteration": iteration,
+                    "best_parcels": n - len(best.unassigned),
+                    "best_distance": float(best_objective)
+                    - self.penalty * len(best.unassigned),
+                    "improved": improved,
+                    "temperature": float(temperature),
+                }
+                if self.progress(stats, lambda best=best: self.to_routes(best)):
+                    break
+
+        if self.debug:
+            print()
+
+        return self.to_routes(best)
+
+    def to_routes(self, solution: Solution) -> Dict[DeliveryAgentInfo, Route]:
+        # The agents do not return after their last trip, so the trip with the longest way back is done last
+        routes = {}
+        for agent, agent_info in enumerate(self.delivery_agents):
+            trips = [
+                trip
+                for trip, trip_agent in zip(solution.trips, solution.agents)
+                if trip_agent == agent and len(trip.parcels) > 0
+            ]
+            trips.sort(key=lambda trip: self.legs[trip.parcels[-1] + 1, 0])
+
+            route: Route = Route([None])
+            for i, trip in enumerate(trips):
+                if i > 0:
+                    route.route.append(None)
+                route.route.extend(
+                    self.delivery_parcels[parcel] for parcel in trip.parcels
+                )
+            routes[agent_info] = route
+        return routes
+
+
+def model(
+    root_node: Node | Graph,
+    delivery_parcels: List[Parcel],
+    delivery_agents: List[DeliveryAgentInfo],
+    debug: bool = False,
+    **options,
+) -> Dict[DeliveryAgentInfo, Route]:
+    return ALNS(
+        delivery_parcels, delivery_agents, root_node, debug=debug, **options
+    ).solution()
@@ -0,0 +1,234 @@
+import importlib
+import multiprocessing
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, as_completed
+from typing import Any, Dict, Iterable, List, Tuple
+
+import numpy as np
+
+from common import DeliveryAgentInfo, Parcel, Progress, Route
+from node import Graph, Node
+from Simulator import Simulator
+
+NUM_SECTORS = os.cpu_count() or 1
+# Number of processes solving sectors at the same time. With 1, the sectors are solved in this process
+NUM_WORKERS = os.cpu_count() or 1
+# Solver module in Algos used for the sectors and for the parcels left over after merging
+SOLVER = "alns"
+
+
+def sectors(
+    graph: Graph,
+    delivery_parcels: List[Parcel],
+    delivery_agents: List[DeliveryAgentInfo],
+    num_sectors: int,
+) -> List[Tuple[List[Parcel], List[DeliveryAgentInfo]]]:
+    # Split the parcels into angular sectors around the root node with the same number of parcels each.
+    # The sectors start after the largest angular gap between parcels so no cluster is cut in two
+    num_sectors = max(1, min(num_sectors, len(delivery_agents), len(delivery_parcels)))
+    locations = np.array([parcel.location for parcel in delivery_parcels])
+    angles = np.arctan2(
+        graph.y[locations] - graph.y[0], graph.x[locations] - graph.x[0]
+    )
+    order = np.argsort(angles, kind="stable")
+    gaps = np.diff(np.append(angles[order], angles[order[0]] + 2 * np.pi))
+    order = np.roll(order, -(int(np.argmax(gaps)) + 1))
+    parcel_sectors = [
+        [delivery_parcels[i] for i in part]
+        for part in np.array_split(order, num_sectors)
+    ]
+
+    # Give the strongest agents out first, each to the sector with the most parcels per unit of agent strength
+    strength = np.zeros(num_sectors)
+    demand = np.array([len(parcels) for parcels in parcel_sectors], dtype=np.float64)
+    agent_sectors: List[List[DeliveryAgentInfo]] = [[] for _ in range(num_sectors)]
+    for agent in sorted(
+        delivery_agents, key=lambda agent: -agent.max_capacity * agent.max_dist
+    ):
+        sector = int(np.argmax(demand / (1 + strength)))
+        agent_sectors[sector].append(agent)
+        strength[sector] += 1
+
+    return list(zip(parcel_sectors, agent_sectors))
+
+
+def solve(
+    solver: str,
+    graph: Graph,
+    delivery_parcels: List[Parcel],
+    delivery_agents: List[DeliveryAgentInfo],
+    options: Dict[str, Any],
+) -> Dict[DeliveryAgentInfo, Route]:
+    # Runs a solver on a sub problem. The parcels are renumbered from 0 since some solvers use the ids as indices
+    if len(delivery_parcels) == 0 or len(delivery_agents) == 0:
+        return {agent: Route([None]) for agent in delivery_agents}
+
+    renumbered = [
+        Parcel(i, parcel.location) for i, parcel in enumerate(delivery_parcels)
+    ]
+    routes = importlib.import_module(f"Algos.{solver}").model(
+        graph, renumbered, delivery_agents, False, **options
+    )
+    return {
+        agent: Route(
+            [
+                None if parcel is None else delivery_parcels[parcel.id]
+                for parcel in route.route
+            ]
+        )
+        for agent, route in routes.items()
+    }
+
+
+def model(
+    root_node: Node | Graph,
+    delivery_parcels: List[Parcel],
+    delivery_agents: List[DeliveryAgentInfo],
+    debug: bool = False,
+    solver: str = SOLVER,
+    num_sectors: int = NUM_SECTORS,
+    seed: int | np.random.SeedSequence | None = None,
+    num_workers: int = NUM_WORKERS,
+    executor: Executor | None = None,
+    **options,
+) -> Dict[DeliveryAgentInfo, Route]:
+    # Solves the sectors, merges the routes and gives the undelivered parcels to the agents that have distance left.
+    # The sectors are solved on the executor if one is given, which is left running, in this process if num_workers
+    # is at most 1, and otherwise in a pool of num_workers spawned processes. Spawned processes import the __main__
+    # module again, so a script that uses the pool must start from an if __name__ == "__main__": block
+    graph = root_node.to_graph() if isinstance(root_node, Node) else root_node
+    if len(delivery_parcels) == 0 or len(delivery_agents) == 0:
+        return {agent: Route([None]) for agent in delivery_agents}
+
+    # The progress callback cannot be sent to the sector processes. It is called with the merged routes
+    # each time a sector is solved and once more after the repair, so iteration counts the finished steps.
+    # Stopping it skips the sectors that have not started and the repair
+    progress: Progress | None = options.pop("progress", None)
+    parts = sectors(graph, delivery_parcels, delivery_agents, num_sectors)
+    # Every sector and the repair get their own independent random stream
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    seeds = seed.spawn(len(parts) + 1)
+    simulator = Simulator(graph, delivery_parcels)
+    solution: Dict[DeliveryAgentInfo, Route] = {
+        agent: Route([None]) for agent in delivery_agents
+    }
+    best_score = (-np.inf, -np.inf)
+
+    def report(iteration: int) -> bool:
+        nonlocal best_score
+        if progress is None:
+            return False
+        _, parcels, distance = simulator.simulate(
+            [{agent: route.get_allocation() for agent, route in solution.items()}]
+        )[0]
+        score = (parcels, -distance)
+        improved = score > best_score
+        best_score = max(best_score, score)
+        snapshot = dict(solution)
+        return bool(
+            progress(
+                {
+                    "iteration": iteration,
+                    "best_parcels": parcels,
+                    "best_distance": distance,
+                    "improved": improved,
+                    "sectors": len(parts),
+                },
+                lambda: snapshot,
+            )
+        )
+
+    jobs = [
+        (solver, graph, parcels, agents, {**options, "seed": sector_seed})
+        for (parcels, agents), sector_seed in zip(parts, seeds)
+    ]
+
+    def merge(sector_routes: Iterable[Dict[DeliveryAgentInfo, Route]]) -> bool:
+        # Merges the sectors as they are solved, returns True when the progress callback stops
+        for solved, routes in enumerate(sector_routes, 1):
+            solution.update(routes)
+            if report(solved):
+                return True
+        return False
+
+    def merge_futures(pool: Executor) -> bool:
+        futures = [pool.submit(solve, *job) for job in jobs]
+        stopped = merge(future.result() for future in as_completed(futures))
+        for future in futures:
+            future.cancel()
+        return stopped
+
+    if executor is not None:
+        stopped = merge_futures(executor)
+    elif num_workers <= 1:
+        # Solved one after the other, so stopping skips the sectors that are left
+        stopped = merge(solve(*job) for job in jobs)
+    else:
+        with ProcessPoolExecutor(
+            max_workers=min(num_workers, len(parts)),
+            mp_context=multiprocessing.get_context("spawn"),
+        ) as pool:
+            stopped = merge_futures(pool)
+
+    # Simulate the merged routes with a return to the warehouse to find what each agent has left
+    agents = list(solution)
+    allocations = {agent: solution[agent].get_allocation() + [-1] for agent in agents}
+    _, total_parcels, _ = simulator.simulate([allocations])[0]
+    results = simulator.get_agent_results(0)
+
+    delivered = set()
+    residual_agents = []
+    for agent, (is_valid, parcels, distance) in zip(agents, results):
+        route = solution[agent]
+        if not is_valid:
+            # Drop the routes the simulator rejects, their parcels are repaired below
+            solution[agent] = Route([None])
+            distance = 0.0
+            route = solution[agent]
+        # Only the parcels the agent reaches within its distance count as delivered
+        delivered.update(
+            parcel.id for parcel in [p for p in route.route if p is not None][:parcels]
+        )
+        if parcels < sum(p is not None for p in route.route):
+            # The agent runs out of distance, cut off the parcels it does not reach
+            kept = []
+            count = 0
+            for parcel in route.route:
+                if parcel is not None:
+                    if count == parcels:
+                        break
+                    count += 1
+                kept.append(parcel)
+            solution[agent] = Route(kept)
+        elif agent.max_dist - distance > 0:
+            residual_agents.append(
+                DeliveryAgentInfo(
+                    agent.id, agent.max_capacity, agent.max_dist - distance
+                )
+            )
+
+    # Repair: solve the undelivered parcels with the distance the agents have left after returning
+    leftover = [parcel for parcel in delivery_parcels if parcel.id not in delivered]
+    if len(leftover) > 0 and len(residual_agents) > 0 and not stopped:
+        repaired = solve(
+            solver, graph, leftover, residual_agents, {**options, "seed": seeds[-1]}
+        )
+        by_id = {agent.id: agent for agent in delivery_agents}
+        for residual, route in repaired.items():
+            if any(parcel is not None for parcel in route.route):
+                agent = by_id[residual.id]
+                solution[agent] = Route(solution[agent].route + route.route)
+
+    if debug:
+        print("=" * 79)
+        print(" Decomposition:")
+        print("-" * 79)
+        for i, (parcels, agents) in enumerate(parts):
+            print(f" Sector {i:03}: {len(parcels)} parcels, {len(agents)} agents")
+        print(f" Parcels delivered by the sectors: {total_parcels}")
+        print(f" Parcels left for repair: {len(leftover)}")
+
+    if not stopped:
+        report(len(parts) + 1)
+    return solution
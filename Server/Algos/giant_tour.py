@@ -0,0 +1,459 @@
+import time
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from common import DeliveryAgentInfo, Parcel, Progress, Route
+from distances import DistanceMatrix
+from node import Graph, Node
+from Simulator import Simulator
+from Algos.GA import (
+    FITNESS_CACHE_SIZE,
+    SELECTION_STRATEGIES,
+    TEXT_CENTER,
+    FitnessCache,
+    float_ensure_width,
+)
+
+NUM_GENERATIONS = 200
+POPULATION_SIZE = 100
+POPULATION_CUTOFF = 5
+
+CROSSOVER = "ox"
+MUTATION_RATE = 0.2
+SELECTION = "tournament"
+TIME_LIMIT = 5.0
+
+
+class Split:
+    # Decodes a giant tour, an ordering of all the parcels, into trips for each agent.
+    # Each agent delivers a consecutive part of the tour in consecutive trips, and each trip
+    # is a consecutive part of the agent's share. Every trip respects the agent's capacity and
+    # every agent stays within its distance budget. The agents are split one after the other by
+    # a Bellman labelling over the positions of the tour, which takes O(n * capacity) per agent.
+    # Each position keeps two labels for the agent back at the warehouse: the one with the least
+    # total distance and the one where the agent has travelled the least. The second reaches as far
+    # as any split can, so the number of parcels delivered is exact. The distance is a heuristic:
+    # labels in between, with more total but less of the agent's own distance than the first, are
+    # dropped although the split they lead to can be shorter. Some tours are then given a split a
+    # little longer than their best one, which is good enough to rank tours but not an optimal split.
+    # Tours are split in batches, one row per tour
+    def __init__(
+        self,
+        delivery_parcels: List[Parcel],
+        delivery_agents: List[DeliveryAgentInfo],
+        distances: DistanceMatrix,
+    ):
+        self.delivery_agents = delivery_agents
+        self.max_capacity = max(
+            [agent.max_capacity for agent in delivery_agents], default=0
+        )
+
+        # Distances between the parcels and from and to the warehouse, indexed by the position of the parcel
+        indices = distances.indices(parcel.location for parcel in delivery_parcels)
+        self.legs = distances.distances[np.ix_(indices, indices)].astype(np.float64)
+        self.outbound = distances.distances[0, indices].astype(np.float64)
+        self.inbound = distances.distances[indices, 0].astype(np.float64)
+
+    def trip_costs(self, tours: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        # closed[b, j, l - 1] is the distance of a trip from the warehouse delivering tours[b, j:j + l] and returning.
+        # open[b, j, l - 1] is the same trip without returning, used for the last trip of an agent.
+        # No trip is longer than the largest capacity
+        num_tours, n = tours.shape
+        path = np.zeros((num_tours, n))
+        np.cumsum(self.legs[tours[:, :-1], tours[:, 1:]], axis=1, out=path[:, 1:])
+
+        first = np.arange(n)[:, None]
+        last = first + np.arange(max(1, min(self.max_capacity, n)))[None, :]
+        valid = last < n
+        last = np.minimum(last, n - 1)
+        open_costs = self.outbound[tours][:, :, None] + path[:, last] - path[:, :, None]
+        open_costs = np.where(valid, open_costs, np.inf)
+        closed_costs = open_costs + self.inbound[tours[:, last]]
+        return closed_costs, open_costs
+
+    def labels(
+        self, tours: np.ndarray, track: bool = False
+    ) -> Tuple[np.ndarray, List[Tuple[np.ndarray, ...]]]:
+        # distance[b, j] is the least distance found for the agents to deliver tours[b, :j].
+        # When tracking, each agent's choices give where its labels and its last trip come from
+        num_tours, n = tours.shape
+        closed_costs, open_costs = self.trip_costs(tours)
+
+        distance = np.full((num_tours, n + 1), np.inf)
+        distance[:, 0] = 0
+        choices = []
+        for agent in self.delivery_agents:
+            capacity = min(agent.max_capacity, n)
+            budget = agent.max_dist
+            # total[b, j, s] and used[b, j, s] are the total distance and the distance of this agent of label s
+            # at position j. origin[b, j, s] is the position of the label it extends and slot[b, j, s] which
+            # label there, origin is -1 when the agent starts at j
+            total = np.full((num_tours, n + 1, 2), np.inf)
+            used = np.full((num_tours, n + 1, 2), np.inf)
+            # finished is distance after this agent, finish_origin is where its last trip starts or -1
+            # when it delivers nothing
+            finished = distance.copy()
+            shape = (num_tours, n + 1) if track else (0, 0)
+            origin = np.full((*shape, 2), -1)
+            slot = np.zeros((*shape, 2), dtype=np.intp)
+            finish_origin = np.full(shape, -1)
+            finish_slot = np.zeros(shape, dtype=np.intp)
+
+            for j in range(n if capacity > 0 else 0):
+                # The agent can start at j once the previous agents delivered tour[:j].
+                # Starting has no distance of its own, so it is always the label with the least used
+                start = distance[:, j]
+                better = start < total[:, j, 0]
+                total[:, j, 0] = np.where(better, start, total[:, j, 0])
+                used[:, j, 0] = np.where(better, 0, used[:, j, 0])
+                reachable = np.isfinite(start)
+                total[:, j, 1] = np.where(reachable, start, total[:, j, 1])
+                used[:, j, 1] = np.where(reachable, 0, used[:, j, 1])
+                if track:
+                    origin[:, j, 0] = np.where(better, -1, origin[:, j, 0])
+                    origin[:, j, 1] = np.where(reachable, -1, origin[:, j, 1])
+                if not np.isfinite(total[:, j]).any():
+                    continue
+
+                # Trips delivering tour[j:k] for every k the capacity allows
+                width = min(capacity, n - j)
+                ends = slice(j + 1, j + 1 + width)
+                for costs, is_last in ((closed_costs, False), (open_costs, True)):
+                    trip = costs[:, j, None, :width]
+                    new_used = used[:, j, :, None] + trip
+                    feasible = new_used <= budget
+                    new_total = np.where(feasible, total[:, j, :, None] + trip, np.inf)
+                    new_used = np.where(feasible, new_used, np.inf)
+
+                    if is_last:
+                        # The agent finishes at k
+                        best = np.argmin(new_total, axis=1)
+                        best_total = np.take_along_axis(new_total, best[:, None], 1)[
+                            :, 0
+                        ]
+                        better = best_total < finished[:, ends]
+                        finished[:, ends] = np.where(
+                            better, best_total, finished[:, ends]
+                        )
+                        if track:
+                            finish_origin[:, ends] = np.where(
+                                better, j, finish_origin[:, ends]
+                            )
+                            finish_slot[:, ends] = np.where(
+                                better, best, finish_slot[:, ends]
+                            )
+                        continue
+
+                    # The agent returns to the warehouse at k and continues from there
+                    for s, key in ((0, new_total), (1, new_used)):
+                        best = np.argmin(key, axis=1)
+                        best_total = np.take_along_axis(new_total, best[:, None], 1)[
+                            :, 0
+                        ]
+                        best_used = np.take_along_axis(new_used, best[:, None], 1)[:, 0]
+                        current = total if s == 0 else used
+                        candidate = best_total if s == 0 else best_used
+                        better = candidate < current[:, ends, s]
+                        total[:, ends, s] = np.where(
+                            better, best_total, total[:, ends, s]
+                        )
+                        used[:, ends, s] = np.where(better, best_used, used[:, ends, s])
+                        if track:
+                            origin[:, ends, s] = np.where(better, j, origin[:, ends, s])
+                            slot[:, ends, s] = np.where(better, best, slot[:, ends, s])
+
+            distance = finished
+            choices.append((origin, slot, finish_origin, finish_slot))
+
+        return distance, choices
+
+    def evaluate(self, tours: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        # The number of parcels delivered and the distance travelled of each tour
+        distance, _ = self.labels(tours)
+        n = tours.shape[1]
+        delivered = n - np.argmax(np.isfinite(distance[:, ::-1]), axis=1)
+        return delivered, distance[np.arange(len(tours)), delivered]
+
+    def __call__(
+        self, tour: np.ndarray, track: bool = False
+    ) -> Tuple[int, float, List[List[List[int]]]]:
+        # Returns the number of parcels delivered, the distance travelled and, when tracking, the trips of each agent
+        distance, choices = self.labels(tour[None, :], track)
+        n = len(tour)
+        delivered = n - int(np.argmax(np.isfinite(distance[0, ::-1])))
+        travelled = float(distance[0, delivered])
+
+        trips: List[List[List[int]]] = [[] for _ in self.delivery_agents]
+        if not track:
+            return delivered, travelled, trips
+
+        # Walk back through the agents and their labels to recover their trips
+        end = delivered
+        for agent in reversed(range(len(self.delivery_agents))):
+            origin, slot, finish_origin, finish_slot = (
+                choice[0] for choice in choices[agent]
+            )
+            start = int(finish_origin[end])
+            if start < 0:
+                continue
+            trips[agent].insert(0, tour[start:end].tolist())
+            label = int(finish_slot[end])
+            while origin[start, label] >= 0:
+                previous = int(origin[start, label])
+                label = int(slot[start, label])
+                trips[agent].insert(0, tour[previous:start].tolist())
+                start = previous
+            end = start
+
+        return delivered, travelled, trips
+
+
+def order_crossover(
+    rng: np.random.Generator, parent1: np.ndarray, parent2: np.ndarray
+) -> np.ndarray:
+    # OX: the child keeps a random slice of the first parent and takes the remaining
+    # parcels in the order they appear in the second parent, starting after the slice
+    n = len(parent1)
+    start, end = np.sort(rng.choice(n + 1, 2, replace=False))
+    child = np.empty_like(parent1)
+    child[start:end] = parent1[start:end]
+
+    rotated = np.roll(parent2, -end)
+    rest = rotated[~np.isin(rotated, parent1[start:end])]
+    child[np.roll(np.arange(n), -end)[: n - (end - start)]] = rest
+    return child
+
+
+def partially_mapped_crossover(
+    rng: np.random.Generator, parent1: np.ndarray, parent2: np.ndarray
+) -> np.ndarray:
+    # PMX: the child keeps a random slice of the first parent, the other positions come from
+    # the second parent with conflicts resolved through the mapping defined by the slice
+    n = len(parent1)
+    start, end = np.sort(rng.choice(n + 1, 2, replace=False))
+    child = parent2.copy()
+    child[start:end] = parent1[start:end]
+
+    # position[parcel] is the position of the parcel in the first parent's slice, or -1
+    position = np.full(n, -1)
+    position[parent1[start:end]] = np.arange(start, end)
+    for i in np.concatenate([np.arange(start), np.arange(end, n)]):
+        gene = parent2[i]
+        while position[gene] != -1:
+            gene = parent2[position[gene]]
+        child[i] = gene
+    return child
+
+
+CROSSOVERS = {
+    "ox": order_crossover,
+    "pmx": partially_mapped_crossover,
+}
+
+
+def mutate(rng: np.random.Generator, tour: np.ndarray, mutation_rate: float):
+    # Either swap two parcels or reverse a part of the tour
+    if len(tour) < 2 or rng.random() >= mutation_rate:
+        return
+    i, j = np.sort(rng.choice(len(tour), 2, replace=False))
+    if rng.random() < 0.5:
+        tour[[i, j]] = tour[[j, i]]
+    else:
+        tour[i : j + 1] = tour[i : j + 1][::-1]
+
+
+class GiantTour:
+    def __init__(
+        self,
+        delivery_parcels: List[Parcel],
+        delivery_agents: List[DeliveryAgentInfo],
+        starting_location: Node | Graph,
+        population_size: int = POPULATION_SIZE,
+        num_generations: int = NUM_GENERATIONS,
+        population_cutoff: int = POPULATION_CUTOFF,
+        crossover: str = CROSSOVER,
+        mutation_rate: float = MUTATION_RATE,
+        selection: str = SELECTION,
+        debug: bool = False,
+        seed: int | np.random.SeedSequence | None = None,
+        time_limit: float | None = TIME_LIMIT,
+        fitness_cache_size: int = FITNESS_CACHE_SIZE,
+        progress: Progress | None = None,
+    ):
+        self.progress = progress
+        self.deadline = None if time_limit is None else time.monotonic() + time_limit
+        # Split results of tours that have already been evaluated
+        self.fitness_cache = FitnessCache(fitness_cache_size)
+
+        if crossover not in CROSSOVERS:
+            raise ValueError(
+                f"Unknown crossover {crossover!r}, expected one of {list(CROSSOVERS)}"
+            )
+        if selection not in SELECTION_STRATEGIES:
+            raise ValueError(
+                f"Unknown selection strategy {selection!r}, expected one of {list(SELECTION_STRATEGIES)}"
+            )
+
+        self.rng = np.random.default_rng(seed)
+        self.crossover = CROSSOVERS[crossover]
+        self.select = SELECTION_STRATEGIES[selection]
+        self.num_generations = num_generations
+        self.population_cutoff = min(population_cutoff, population_size)
+        self.mutation_rate = mutation_rate
+        self.debug = debug
+        self.delivery_parcels = delivery_parcels
+        self.delivery_agents = delivery_agents
+
+        graph = (
+            starting_location.to_graph()
+            if isinstance(starting_location, Node)
+            else starting_location
+        )
+        distances = DistanceMatrix(
+            graph, delivery_parcels, Simulator(graph, delivery_parcels)
+        )
+        self.split = Split(delivery_parcels, delivery_agents, distances)
+
+        # Each individual is an ordering of the positions of the parcels
+        self.population = np.array(
+            [
+                self.rng.permutation(len(delivery_parcels))
+                for _ in range(population_size)
+            ]
+        ).reshape(population_size, len(delivery_parcels))
+
+    def evaluate(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # Every individual is feasible, so the split gives its parcels delivered and distance travelled directly.
+        # The tours that are not cached are split in one batch
+        results = np.zeros((len(self.population), 2))
+        missing = []
+        for i, tour in enumerate(self.population):
+            result = self.fitness_cache.get(tour.tobytes())
+            if result is None:
+                missing.append(i)
+            else:
+                results[i] = result
+        if missing:
+            delivered, travelled = self.split.evaluate(self.population[missing])
+            for i, result in zip(missing, zip(delivered.tolist(), travelled.tolist())):
+                self.fitness_cache.put(self.population[i].tobytes(), result)
+                results[i] = result
+        delivered, travelled = results[:, 0], results[:, 1]
+
+        # Delivering more parcels is prioritized over travelling less distance
+        max_distance = np.max(travelled) * 1.1
+        if max_distance != 0:
+            travelled = travelled / max_distance
+        fitness = delivered + 1 - travelled + 0.001
+
+        order = np.argsort(-fitness, kind="stable")
+        return order, fitness, results
+
+    def solution(self) -> Dict[DeliveryAgentInfo, Route]:
+        if self.debug:
+            print("=" * 79)
+            print(" Giant Tour GA Progress:")
+            print("-" * 79)
+            print(
+                "|"
+                + "Generation No".center(TEXT_CENTER)
+                + "|"
+                + "Highest Fitness".center(TEXT_CENTER)
+                + "|"
+                + "Median Fitness".center(TEXT_CENTER)
+                + "|"
+            )
+            print("-" * 79)
+
+        if len(self.delivery_parcels) == 0:
+            return {agent: Route([None]) for agent in self.delivery_agents}
+
+        best_score = (-np.inf, -np.inf)
+        for generation in range(self.num_generations):
+            if self.deadline is not None and time.monotonic() >= self.deadline:
+                break
+            order, fitness, results = self.evaluate()
+
+            if self.progress is not None:
+                delivered, travelled = results[order[0]]
+                score = (delivered, -travelled)
+                improved = bool(score > best_score)
+                best_score = max(best_score, score)
+                best = self.population[order[0]].copy()
+                stats = {
+                    "iteration": generation,
+                    "best_parcels": int(delivered),
+                    "best_distance": float(travelled),
+                    "improved": improved,
+                    "best_fitness": float(fitness[order[0]]),
+                    "average_fitness": float(fitness[order[len(order) // 2]]),
+                }
+                if self.progress(stats, lambda tour=best: self.routes(tour)):
+                    break
+
+            if self.debug:
+                print(
+                    "\r|"
+                    + f"{generation:03}".center(TEXT_CENTER)
+                    + "|"
+                    + float_ensure_width(fitness[order[0]], TEXT_CENTER - 6).center(
+                        TEXT_CENTER
+                    )
+                    + "|"
+                    + float_ensure_width(
+                        fitness[order[len(order) // 2]], TEXT_CENTER - 6
+                    ).center(TEXT_CENTER)
+                    + "|",
+                    end="",
+                )
+
+            # Keep the elites and fill the rest of the population with children
+            elites = self.population[order[: self.population_cutoff]]
+            num_children = len(self.population) - len(elites)
+            parents = self.select(self.rng, fitness, 2 * num_children).reshape(-1, 2)
+            children = np.empty(
+                (num_children, self.population.shape[1]), dtype=self.population.dtype
+            )
+            for child, (parent1, parent2) in enumerate(parents):
+                children[child] = self.crossover(
+                    self.rng, self.population[parent1], self.population[parent2]
+                )
+                mutate(self.rng, children[child], self.mutation_rate)
+
+            self.population = np.concatenate([elites, children])
+
+        if self.debug:
+            print()
+            print(
+                f" Fitness cache: {self.fitness_cache.hits} hits, {self.fitness_cache.misses} misses"
+            )
+
+        order, _, _ = self.evaluate()
+        return self.routes(self.population[order[0]])
+
+    def routes(self, tour: np.ndarray) -> Dict[DeliveryAgentInfo, Route]:
+        # Build the routes of a giant tour, each trip starts at the warehouse
+        _, _, trips = self.split(tour, track=True)
+        solution = {}
+        for agent, agent_trips in zip(self.delivery_agents, trips):
+            route: Route = Route([None])
+            for i, trip in enumerate(agent_trips):
+                if i > 0:
+                    route.route.append(None)
+                route.route.extend(self.delivery_parcels[parcel] for parcel in trip)
+            solution[agent] = route
+        return solution
+
+
+def model(
+    root_node: Node,
+    delivery_parcels: List[Parcel],
+    delivery_agents: List[DeliveryAgentInfo],
+    debug: bool = False,
+    **options,
+) -> Dict[DeliveryAgentInfo, Route]:
+    # Evolve giant tours and split the best one into trips for the agents
+    return GiantTour(
+        delivery_parcels, delivery_agents, root_node, debug=debug, **options
+    ).solution()
@@ -0,0 +1,195 @@
+import math
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from common import DeliveryAgentInfo, Id, Parcel
+from distances import DistanceMatrix
+
+# Number of random moves tried per individual
+NUM_MOVES = 200
+# Longest segment moved by or-opt
+OR_OPT_LENGTH = 3
+
+TWO_OPT = 0
+OR_OPT = 1
+RELOCATE = 2
+SWAP = 3
+MOVES = (TWO_OPT, OR_OPT, RELOCATE, SWAP)
+
+
+class LocalSearch:
+    # Improves individuals, the genes of every agent, with random 2-opt, or-opt, relocate and swap moves.
+    # Moves are evaluated by walking the changed routes over the precomputed leg distances, not by simulating.
+    # Only moves that deliver more parcels, or the same parcels in less distance, are kept.
+    def __init__(
+        self,
+        delivery_parcels: List[Parcel],
+        delivery_agents: List[DeliveryAgentInfo],
+        distances: DistanceMatrix,
+        rng: np.random.Generator,
+        moves: Tuple[int, ...] = MOVES,
+    ):
+        self.delivery_agents = delivery_agents
+        self.rng = rng
+        self.moves = moves
+        # Row of the distance matrix of each parcel, and the leg distances as nested lists for fast lookups
+        self.locations: Dict[Id, int] = {
+            parcel.id: distances.index[parcel.location] for parcel in delivery_parcels
+        }
+        self.legs: List[List[float]] = distances.distances.astype(np.float64).tolist()
+
+    def route_score(
+        self, agent: DeliveryAgentInfo, genes: List[Id]
+    ) -> Tuple[int, float]:
+        # Parcels delivered and distance travelled before the agent runs out of distance, like the simulator.
+        # The simulator moves 1 unit per step and carries the rest of a step over, so it has travelled
+        # the distance rounded up when it arrives
+        current = 0
+        delivered = 0
+        travelled = 0.0
+        for gene in genes[1:]:
+            target = 0 if gene == -1 else self.locations[gene]
+            travelled += self.legs[current][target]
+            if math.ceil(travelled) >= agent.max_dist:
+                return delivered, agent.max_dist
+            if target != 0:
+                delivered += 1
+            current = target
+        return delivered, float(math.ceil(travelled))
+
+    def is_feasible(self, agent: DeliveryAgentInfo, genes: List[Id]) -> bool:
+        # The route starts at the warehouse and no trip carries more than the capacity of the agent
+        if len(genes) == 0 or genes[0] != -1:
+            return False
+        load = 0
+        for gene in genes:
+            load = 0 if gene == -1 else load + 1
+            if load > agent.max_capacity:
+                return False
+        return True
+
+    def is_valid(self, individual: List[List[Id]]) -> bool:
+        # Only individuals the simulator accepts are improved
+        parcels = [gene for genes in individual for gene in genes if gene != -1]
+        return (
+            len(individual) == len(self.delivery_agents)
+            and len(parcels) == len(set(parcels))
+            and all(parcel in self.locations for parcel in parcels)
+            and all(
+                self.is_feasible(agent, genes)
+                for agent, genes in zip(self.delivery_agents, individual)
+            )
+        )
+
+    def improve(
+        self, individual: List[List[Id]], num_moves: int = NUM_MOVES
+    ) -> List[List[Id]]:
+        if not self.is_valid(individual):
+            return individual
+
+        routes = [list(genes) for genes in individual]
+        scores = [
+            self.route_score(agent, genes)
+            for agent, genes in zip(self.delivery_agents, routes)
+        ]
+        # Parcels that no agent delivers can be relocated into a route
+        assigned = {gene for genes in routes for gene in genes}
+        unassigned = [parcel for parcel in self.locations if parcel not in assigned]
+
+        for _ in range(num_moves):
+            move = self.propose(routes, unassigned)
+            if move is None:
+                continue
+            changed, used = move
+
+            # Check that the changed routes are feasible and better than before
+            delivered = 0
+            travelled = 0.0
+            new_scores = {}
+            feasible = True
+            for agent, genes in changed.items():
+                if not self.is_feasible(self.delivery_agents[agent], genes):
+                    feasible = False
+                    break
+                new_scores[agent] = self.route_score(self.delivery_agents[agent], genes)
+                delivered += new_scores[agent][0] - scores[agent][0]
+                travelled += new_scores[agent][1] - scores[agent][1]
+            if not feasible or delivered < 0 or (delivered == 0 and travelled >= -1e-6):
+                continue
+
+            for agent, genes in changed.items():
+                routes[agent] = genes
+                scores[agent] = new_scores[agent]
+            if used is not None:
+                unassigned.remove(used)
+
+        return routes
+
+    def propose(
+        self, routes: List[List[Id]], unassigned: List[Id]
+    ) -> Tuple[Dict[int, List[Id]], Id | None] | None:
+        # Returns the changed routes of a random move and the unassigned parcel it uses, if any
+        rng = self.rng
+        kind = self.moves[int(rng.integers(len(self.moves)))]
+        agent = int(rng.integers(len(routes)))
+        genes = routes[agent]
+
+        if kind == TWO_OPT:
+            # Reverse a part of a route
+            if len(genes) < 3:
+                return None
+            i, j = sorted(rng.choice(np.arange(1, len(genes)), 2, replace=False))
+            return {agent: genes[:i] + genes[i : j + 1][::-1] + genes[j + 1 :]}, None
+
+        if kind == OR_OPT:
+            # Move a short segment of a route to another position of the same route
+            if len(genes) < 3:
+                return None
+            length = int(rng.integers(1, OR_OPT_LENGTH + 1))
+            i = int(rng.integers(1, max(len(genes) - length + 1, 2)))
+            segment = genes[i : i + length]
+            rest = genes[:i] + genes[i + length :]
+            j = int(rng.integers(1, len(rest) + 1))
+            return {agent: rest[:j] + segment + rest[j:]}, None
+
+        if kind == RELOCATE:
+            # Move a parcel to any position of any route, or give an unassigned parcel to an agent
+            other = int(rng.integers(len(routes)))
+            if len(unassigned) > 0 and rng.random() < 0.5:
+                parcel = unassigned[int(rng.integers(len(unassigned)))]
+                target = routes[other]
+                j = int(rng.integers(1, len(target) + 1))
+                return {other: target[:j] + [parcel] + target[j:]}, parcel
+
+            positions = [i for i, gene in enumerate(genes) if gene != -1]
+            if len(positions) == 0:
+                return None
+            i = positions[int(rng.integers(len(positions)))]
+            parcel = genes[i]
+            source = genes[:i] + genes[i + 1 :]
+            target = source if other == agent else routes[other]
+            j = int(rng.integers(1, len(target) + 1))
+            moved = target[:j] + [parcel] + target[j:]
+            if other == agent:
+                return {agent: moved}, None
+            return {agent: source, other: moved}, None
+
+        # Swap two parcels, in the same route or in different routes
+        other = int(rng.integers(len(routes)))
+        positions = [i for i, gene in enumerate(genes) if gene != -1]
+        other_positions = [i for i, gene in enumerate(routes[other]) if gene != -1]
+        if len(positions) == 0 or len(other_positions) == 0:
+            return None
+        i = positions[int(rng.integers(len(positions)))]
+        j = other_positions[int(rng.integers(len(other_positions)))]
+        if other == agent:
+            if i == j:
+                return None
+            swapped = list(genes)
+            swapped[i], swapped[j] = swapped[j], swapped[i]
+            return {agent: swapped}, None
+        source = list(genes)
+        target = list(routes[other])
+        source[i], target[j] = target[j], source[i]
+        return {agent: source, other: target}, None
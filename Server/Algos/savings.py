@@ -0,0 +1,268 @@
+from typing import Dict, List
+
+import numpy as np
+
+from common import DeliveryAgentInfo, Parcel, Route
+from distances import DistanceMatrix, step_budget, step_distances
+from node import Graph, Node
+from Simulator import Simulator
+
+# Number of nearest parcels each trip end is considered for merging with
+SAVINGS_NEIGHBOURS = 20
+
+
+class Trip:
+    def __init__(self, parcels: List[int], load: int, cost: float):
+        # Positions of the parcels in the order they are delivered, and the distance from and back to the warehouse
+        self.parcels = parcels
+        self.load = load
+        self.cost = cost
+
+
+def savings_trips(
+    outbound: np.ndarray,
+    inbound: np.ndarray,
+    legs: np.ndarray,
+    max_capacity: int,
+    max_distance: float,
+    neighbours: int = SAVINGS_NEIGHBOURS,
+) -> List[Trip]:
+    # Clarke-Wright: start with one trip per parcel and merge the trips with the largest savings,
+    # joining the end of one trip to the start of another while the trip fits max_capacity and max_distance.
+    # Only the nearest parcels of each parcel are considered, the far ones rarely save anything
+    n = len(outbound)
+    trips = [Trip([i], 1, outbound[i] + inbound[i]) for i in range(n)]
+    trip_of = list(range(n))
+    k = min(neighbours, n - 1)
+    if k <= 0:
+        return trips
+
+    nearest = legs.copy()
+    np.fill_diagonal(nearest, np.inf)
+    ends = np.repeat(np.arange(n), k)
+    starts = np.argpartition(nearest, k - 1, axis=1)[:, :k].ravel()
+    # savings[c] is the distance saved by going from parcel ends[c] straight to parcel starts[c] instead of through the warehouse
+    savings = inbound[ends] + outbound[starts] - legs[ends, starts]
+    order = np.argsort(-savings, kind="stable")
+
+    for i, j, saving in zip(
+        ends[order].tolist(), starts[order].tolist(), savings[order].tolist()
+    ):
+        if saving <= 0:
+            break
+
+        first = trips[trip_of[i]]
+        second = trips[trip_of[j]]
+        # i has to end its trip and j has to start a different trip
+        if first is second or first.parcels[-1] != i or second.parcels[0] != j:
+            continue
+        if first.load + second.load > max_capacity:
+            continue
+        cost = first.cost + second.cost - saving
+        if cost > max_distance:
+            continue
+
+        first.parcels.extend(second.parcels)
+        first.load += second.load
+        first.cost = cost
+        for parcel in second.parcels:
+            trip_of[parcel] = trip_of[i]
+        second.parcels = []
+
+    return [trip for trip in trips if len(trip.parcels) > 0]
+
+
+def assign_trips(
+    trips: List[Trip],
+    delivery_agents: List[DeliveryAgentInfo],
+    outbound: np.ndarray,
+    inbound: np.ndarray,
+    legs: np.ndarray,
+) -> List[List[Trip]]:
+    # Best fit decreasing: the longest trips are given first to the agent that can carry them
+    # and has the least distance left afterwards. Trips that fit no agent are split in two, and the
+    # parcels that still fit nowhere are inserted where the agents have distance left
+    budgets = [step_budget(agent.max_dist) for agent in delivery_agents]
+    assigned: List[List[Trip]] = [[] for _ in delivery_agents]
+    queue = sorted(trips, key=lambda trip: trip.cost)
+    dropped: List[int] = []
+
+    while len(queue) > 0:
+        trip = queue.pop()
+        candidates = [
+            a
+            for a, agent in enumerate(delivery_agents)
+            if agent.max_capacity >= trip.load and budgets[a] >= trip.cost
+        ]
+        if len(candidates) > 0:
+            best = min(candidates, key=lambda a: budgets[a] - trip.cost)
+            budgets[best] -= trip.cost
+            assigned[best].append(trip)
+            continue
+
+        if len(trip.parcels) == 1:
+            dropped.append(trip.parcels[0])
+            continue
+        half = len(trip.parcels) // 2
+        for parcels in (trip.parcels[:half], trip.parcels[half:]):
+            cost = (
+                outbound[parcels[0]]
+                + legs[parcels[:-1], parcels[1:]].sum()
+                + inbound[parcels[-1]]
+            )
+            queue.append(Trip(parcels, len(parcels), float(cost)))
+        queue.sort(key=lambda trip: trip.cost)
+
+    insert_dropped(dropped, assigned, delivery_agents, budgets, outbound, inbound, legs)
+    order_trips(assigned, inbound)
+    return assigned
+
+
+def savings_routes(
+    delivery_agents: List[DeliveryAgentInfo],
+    outbound: np.ndarray,
+    inbound: np.ndarray,
+    legs: np.ndarray,
+) -> List[List[Trip]]:
+    # The agents that can travel the furthest go first. Each one merges the parcels that are left within
+    # its own capacity and distance, and keeps the trips that deliver the most parcels per distance while
+    # it has the distance for them. The parcels left at the end are inserted where there is distance left
+    budgets = [step_budget(agent.max_dist) for agent in delivery_agents]
+    assigned: List[List[Trip]] = [[] for _ in delivery_agents]
+    remaining = np.arange(len(outbound))
+
+    for a in sorted(range(len(delivery_agents)), key=lambda a: -budgets[a]):
+        capacity = delivery_agents[a].max_capacity
+        if len(remaining) == 0:
+            break
+        if capacity <= 0:
+            continue
+        trips = savings_trips(
+            outbound[remaining],
+            inbound[remaining],
+            legs[np.ix_(remaining, remaining)],
+            capacity,
+            budgets[a],
+        )
+        taken = np.zeros(len(outbound), dtype=bool)
+        for trip in sorted(trips, key=lambda trip: trip.cost / trip.load):
+            if trip.cost <= budgets[a]:
+                budgets[a] -= trip.cost
+                parcels = remaining[trip.parcels].tolist()
+                assigned[a].append(Trip(parcels, trip.load, trip.cost))
+                taken[parcels] = True
+        remaining = remaining[~taken[remaining]]
+
+    insert_dropped(
+        remaining.tolist(), assigned, delivery_agents, budgets, outbound, inbound, legs
+    )
+    order_trips(assigned, inbound)
+    return assigned
+
+
+def order_trips(assigned: List[List[Trip]], inbound: np.ndarray):
+    # The agents do not return after their last trip, so the trip with the longest way back is done last
+    for trips in assigned:
+        trips.sort(key=lambda trip: inbound[trip.parcels[-1]])
+
+
+def insert_dropped(
+    dropped: List[int],
+    assigned: List[List[Trip]],
+    delivery_agents: List[DeliveryAgentInfo],
+    budgets: List[float],
+    outbound: np.ndarray,
+    inbound: np.ndarray,
+    legs: np.ndarray,
+):
+    # Best fit insertion, closest parcels first: each dropped parcel goes where it adds the least
+    # distance, into a trip with room or as a new trip, among the agents that have the distance left
+    n = len(outbound)
+    # stops[i, j] is the leg from stop i to stop j, where stop n is the warehouse
+    stops = np.zeros((n + 1, n + 1))
+    stops[:n, :n] = legs
+    stops[n, :n] = outbound
+    stops[:n, n] = inbound
+
+    for parcel in sorted(
+        dropped, key=lambda parcel: outbound[parcel] + inbound[parcel]
+    ):
+        best = None
+        cost = outbound[parcel] + inbound[parcel]
+        for a, agent in enumerate(delivery_agents):
+            if agent.max_capacity <= 0:
+                continue
+            if cost <= budgets[a] and (best is None or cost < best[0]):
+                best = (cost, a, None, 0)
+            for trip in assigned[a]:
+                if trip.load >= agent.max_capacity:
+                    continue
+                route = np.array([n] + trip.parcels + [n])
+                deltas = (
+                    stops[route[:-1], parcel]
+                    + stops[parcel, route[1:]]
+                    - stops[route[:-1], route[1:]]
+                )
+                position = int(np.argmin(deltas))
+                delta = float(deltas[position])
+                if delta <= budgets[a] and (best is None or delta < best[0]):
+                    best = (delta, a, trip, position)
+
+        if best is None:
+            # No agent can deliver this parcel
+            continue
+        delta, a, trip, position = best
+        budgets[a] -= delta
+        if trip is None:
+            assigned[a].append(Trip([parcel], 1, float(delta)))
+        else:
+            trip.parcels.insert(position, parcel)
+            trip.load += 1
+            trip.cost += delta
+
+
+def model(
+    root_node: Node | Graph,
+    delivery_parcels: List[Parcel],
+    delivery_agents: List[DeliveryAgentInfo],
+    debug: bool = False,
+    **options,
+) -> Dict[DeliveryAgentInfo, Route]:
+    # The savings algorithm is deterministic, options such as seed are accepted so it can be used like the other solvers
+    if len(delivery_parcels) == 0 or len(delivery_agents) == 0:
+        return {agent: Route([None]) for agent in delivery_agents}
+
+    graph = root_node.to_graph() if isinstance(root_node, Node) else root_node
+    distances = DistanceMatrix(
+        graph, delivery_parcels, Simulator(graph, delivery_parcels)
+    )
+
+    # Distances between the parcels and from and to the warehouse, indexed by the position of the parcel.
+    # They are counted in simulator steps, so that the agents deliver every parcel they are given
+    indices = distances.indices(parcel.location for parcel in delivery_parcels)
+    steps = step_distances(distances.distances.astype(np.float64))
+    legs = steps[np.ix_(indices, indices)]
+    outbound = steps[0, indices]
+    inbound = steps[indices, 0]
+
+    assigned = savings_routes(delivery_agents, outbound, inbound, legs)
+
+    solution = {}
+    for agent, agent_trips in zip(delivery_agents, assigned):
+        route: Route = Route([None])
+        for i, trip in enumerate(agent_trips):
+            if i > 0:
+                route.route.append(None)
+            route.route.extend(delivery_parcels[parcel] for parcel in trip.parcels)
+        solution[agent] = route
+
+    if debug:
+        print("=" * 79)
+        print(" Savings:")
+        print("-" * 79)
+        print(f" Trips: {sum(len(agent_trips) for agent_trips in assigned)}")
+        print(
+            f" Parcels assigned: {sum(len(trip.parcels) for agent_trips in assigned for trip in agent_trips)} of {len(delivery_parcels)}"
+        )
+
+    return solution
@@ -0,0 +1,192 @@
+import math
+from typing import Callable, Dict, List
+
+import numpy as np
+
+from common import DeliveryAgentInfo, Id, Parcel
+from distances import DistanceMatrix, step_budget
+from node import Graph
+
+# A seeder builds one feasible individual: the genes of every agent, in the order of the agents.
+# Each agent's genes start at the warehouse (-1) and every trip respects the agent's capacity.
+# The distance budget is checked in simulator steps, with every shortest path leg rounded up, so the agents
+# can deliver every parcel they are given.
+Seeder = Callable[
+    [np.random.Generator, List[Parcel], List[DeliveryAgentInfo], DistanceMatrix, Graph],
+    List[List[Id]],
+]
+
+# Number of nearest candidates the randomized nearest neighbour seeder chooses from
+NEAREST_CANDIDATES = 3
+
+
+class Trips:
+    # Builds the genes of an agent trip by trip while tracking the distance travelled and the load
+    def __init__(self, agent: DeliveryAgentInfo, distances: DistanceMatrix):
+        self.agent = agent
+        self.distances = distances
+        self.genes: List[Id] = [-1]
+        self.location = 0
+        self.load = 0
+        self.distance = 0.0
+        self.budget = step_budget(agent.max_dist)
+
+    def steps(self, start: int, end: int) -> float:
+        return math.ceil(self.distances.distance(start, end))
+
+    def cost(self, parcel: Parcel) -> float:
+        # Steps needed to deliver the parcel next, returning to the warehouse first if the agent is full
+        if self.load < self.agent.max_capacity:
+            return self.steps(self.location, parcel.location)
+        return self.steps(self.location, 0) + self.steps(0, parcel.location)
+
+    def fits(self, parcel: Parcel) -> bool:
+        return (
+            self.agent.max_capacity > 0
+            and self.distance + self.cost(parcel) <= self.budget
+        )
+
+    def add(self, parcel: Parcel):
+        self.distance += self.cost(parcel)
+        if self.load >= self.agent.max_capacity:
+            self.genes.append(-1)
+            self.load = 0
+        self.genes.append(parcel.id)
+        self.location = parcel.location
+        self.load += 1
+
+
+def nearest_neighbour(
+    rng: np.random.Generator,
+    delivery_parcels: List[Parcel],
+    delivery_agents: List[DeliveryAgentInfo],
+    distances: DistanceMatrix,
+    graph: Graph,
+) -> List[List[Id]]:
+    # Agents take turns in a random order to deliver one of the nearest undelivered parcels
+    trips = [Trips(agent, distances) for agent in delivery_agents]
+    remaining = list(delivery_parcels)
+    active = list(rng.permutation(len(trips)))
+
+    while len(remaining) > 0 and len(active) > 0:
+        for agent in list(active):
+            costs = np.array([trips[agent].cost(parcel) for parcel in remaining])
+            feasible = np.flatnonzero(
+                trips[agent].distance + costs <= trips[agent].budget
+            )
+            if len(feasible) == 0 or trips[agent].agent.max_capacity <= 0:
+                active.remove(agent)
+                continue
+
+            # Randomly choose one of the nearest parcels so the seeded individuals differ
+            nearest = feasible[np.argsort(costs[feasible])[:NEAREST_CANDIDATES]]
+            trips[agent].add(remaining.pop(int(rng.choice(nearest))))
+            if len(remaining) == 0:
+                break
+
+    return [trip.genes for trip in trips]
+
+
+def sweep(
+    rng: np.random.Generator,
+    delivery_parcels: List[Parcel],
+    delivery_agents: List[DeliveryAgentInfo],
+    distances: DistanceMatrix,
+    graph: Graph,
+) -> List[List[Id]]:
+    # Sweep a ray around the root node from a random angle, giving the parcels to the agents in the order they are hit
+    angles = np.array(
+        [
+            np.arctan2(
+                graph.y[parcel.location] - graph.y[0],
+                graph.x[parcel.location] - graph.x[0],
+            )
+            for parcel in delivery_parcels
+        ]
+    )
+    direction = rng.choice([-1, 1])
+    angles = np.mod(direction * angles - rng.uniform(0, 2 * np.pi), 2 * np.pi)
+
+    trips = [Trips(agent, distances) for agent in delivery_agents]
+    order = rng.permutation(len(trips))
+    current = 0
+    for parcel in (delivery_parcels[i] for i in np.argsort(angles, kind="stable")):
+        # Move on to the next agent once the current one cannot deliver the parcel
+        while current < len(order) and not trips[order[current]].fits(parcel):
+            current += 1
+        if current == len(order):
+            break
+        trips[order[current]].add(parcel)
+
+    return [trip.genes for trip in trips]
+
+
+def bin_packing(
+    rng: np.random.Generator,
+    delivery_parcels: List[Parcel],
+    delivery_agents: List[DeliveryAgentInfo],
+    distances: DistanceMatrix,
+    graph: Graph,
+) -> List[List[Id]]:
+    # Best fit decreasing: the agents are bins sized by their distance budget and each parcel
+    # weighs its share of a round trip from the warehouse. The farthest parcels are packed first
+    round_trips = np.array(
+        [
+            math.ceil(distances.distance(0, parcel.location))
+            + math.ceil(distances.distance(parcel.location, 0))
+            for parcel in delivery_parcels
+        ],
+        dtype=np.float64,
+    )
+    # Perturb the weights so the seeded individuals differ
+    order = np.argsort(-round_trips * rng.uniform(0.9, 1.1, len(round_trips)))
+
+    budgets = np.array(
+        [step_budget(agent.max_dist) for agent in delivery_agents], dtype=np.float64
+    )
+    capacities = np.array([max(agent.max_capacity, 0) for agent in delivery_agents])
+    bins: List[List[Parcel]] = [[] for _ in delivery_agents]
+    for i in order:
+        # Agents carrying more parcels per trip spend less of their budget per parcel
+        weights = np.where(
+            capacities > 0, round_trips[i] / np.maximum(capacities, 1), np.inf
+        )
+        left = budgets - weights
+        candidates = np.flatnonzero(left >= 0)
+        if len(candidates) == 0:
+            continue
+        best = candidates[np.argmin(left[candidates])]
+        budgets[best] = left[best]
+        bins[best].append(delivery_parcels[i])
+
+    # Deliver each agent's parcels around the warehouse in angle order, trip by trip.
+    # Parcels that do not fit the agent's actual route are offered to the other agents afterwards
+    trips = [Trips(agent, distances) for agent in delivery_agents]
+    leftovers: List[Parcel] = []
+    for agent_trips, parcels in zip(trips, bins):
+        parcels.sort(
+            key=lambda parcel: np.arctan2(
+                graph.y[parcel.location] - graph.y[0],
+                graph.x[parcel.location] - graph.x[0],
+            )
+        )
+        for parcel in parcels:
+            if agent_trips.fits(parcel):
+                agent_trips.add(parcel)
+            else:
+                leftovers.append(parcel)
+
+    for parcel in leftovers:
+        for agent_trips in trips:
+            if agent_trips.fits(parcel):
+                agent_trips.add(parcel)
+                break
+
+    return [agent_trips.genes for agent_trips in trips]
+
+
+SEEDERS: Dict[str, Seeder] = {
+    "nearest_neighbour": nearest_neighbour,
+    "sweep": sweep,
+    "bin_packing": bin_packing,
+}
@@ -1,19 +1,32 @@
 import os
 import sys
 
+from collections.abc import Buffer
 from typing import List, Tuple, Dict
-from common import DeliveryAgentInfo, Parcel, Id
-from node import Node
+from common import DeliveryAgentInfo, Parcel, ParcelSet, Id
+from node import Graph, Node
 
 __ran = False
 
 
 class Simulator:
-    def __init__(self, node: Node, all_parcels: List[Parcel]) -> None: ...
-    def set_parcels(self, parcels: List[Parcel]) -> None: ...
+    def __init__(
+        self,
+        node: Node | Graph,
+        all_parcels: List[Parcel] | ParcelSet,
+        num_threads: int = 0,
+        mode: str = "event",
+    ) -> None: ...
+    def set_parcels(self, parcels: List[Parcel] | ParcelSet) -> None: ...
     def simulate(
         self, agent_allocations: List[Dict[DeliveryAgentInfo, List[Id]]]
     ) -> List[Tuple[int, int, float]]: ...
+    def simulate_array(
+        self, genes: Buffer, offsets: Buffer, agent_table: Buffer
+    ) -> List[Tuple[int, int, float]]: ...
+    def shortest_paths(
+        self, locations: Buffer, distances: Buffer, next_hops: Buffer
+    ) -> None: ...
     def get_agent_results(
         self, sub_simulator_index: int
     ) -> List[Tuple[bool, int, float]]: ...
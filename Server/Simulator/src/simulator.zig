@@ -5,8 +5,14 @@ const py = @cImport({
 
 const PyObject = [*c]py.PyObject;
 
+// Declared by hand since PyThreadState does not translate on every python version. It is only used as a handle.
+extern fn PyEval_SaveThread() ?*anyopaque;
+extern fn PyEval_RestoreThread(?*anyopaque) void;
+
 const Id = isize;
 const Location = isize;
+// A parcel id or -1 for the warehouse in an agent allocation
+const Gene = i32;
 
 const Parcel = struct {
     id: Id,
@@ -19,138 +25,476 @@ const AgentInfo = struct {
     max_distance: f32,
 };
 
-const Node = struct {
-    id: Id,
-    x: f32,
-    y: f32,
-    neighbours: std.ArrayList(*Node),
+// Compressed sparse row graph. Nodes are indexed by their id, which is also their location.
+// The neighbours of node i are neighbours[offsets[i]..offsets[i + 1]], and lengths holds the
+// length of each of those edges. The slices are read in place from the arrays of a python Graph.
+const Graph = struct {
+    x: []const f64,
+    y: []const f64,
+    offsets: []const i32,
+    neighbours: []const i32,
+    lengths: []const f32,
 
     const Self = @This();
 
-    fn init(py_root_node: PyObject, allocator: std.mem.Allocator, visited: *std.AutoHashMap(Id, *Node)) !*Self {
-        var tmp = py.PyObject_GetAttrString(py_root_node, "id");
-        if (tmp == null) {
-            py.PyErr_SetString(py.PyExc_TypeError, "Object does not have an id attribute");
-            return error.NodeInitFailed;
+    fn len(self: *const Self) usize {
+        return self.x.len;
+    }
+
+    fn contains(self: *const Self, node: Location) bool {
+        return node >= 0 and node < self.len();
+    }
+
+    // Returns the length of the edge between from and to, or null if they are not neighbours
+    fn edge_length(self: *const Self, from: Location, to: Location) ?f32 {
+        const start: usize = @intCast(self.offsets[@intCast(from)]);
+        const end: usize = @intCast(self.offsets[@intCast(from + 1)]);
+        for (self.neighbours[start..end], start..) |neighbour, i| {
+            if (neighbour == to) {
+                return self.lengths[i];
+            }
         }
-        const id: Id = @intCast(py.PyLong_AsLong(tmp));
+        return null;
+    }
+
+    fn simple_distance(self: *const Self, from: usize, to: usize) f32 {
+        const dx = self.x[to] - self.x[from];
+        const dy = self.y[to] - self.y[from];
+        return @floatCast(@sqrt(dx * dx + dy * dy));
+    }
+
+    // Runs Dijkstra from source over the whole graph. distances is filled with the distance from source
+    // to each node, and parents with the next node on the shortest path from each node back to source.
+    fn shortest_path_tree(self: *const Self, source: Location, distances: []f32, parents: []i32, allocator: std.mem.Allocator) !void {
+        const Entry = struct {
+            node: usize,
+            distance: f32,
+
+            fn compare(_: void, a: @This(), b: @This()) std.math.Order {
+                return std.math.order(a.distance, b.distance);
+            }
+        };
+
+        @memset(distances, std.math.inf(f32));
+        @memset(parents, -1);
+
+        const start: usize = @intCast(source);
+        distances[start] = 0.0;
+
+        var queue = std.PriorityQueue(Entry, void, Entry.compare).init(allocator, {});
+        defer queue.deinit();
+        try queue.add(.{ .node = start, .distance = 0.0 });
+
+        while (queue.removeOrNull()) |current| {
+            // Skip entries that were superseded by a shorter path
+            if (current.distance > distances[current.node]) {
+                continue;
+            }
 
-        if (visited.contains(id)) {
-            return visited.get(id).?;
+            const first: usize = @intCast(self.offsets[current.node]);
+            const last: usize = @intCast(self.offsets[current.node + 1]);
+            for (self.neighbours[first..last], self.lengths[first..last]) |n, length| {
+                const neighbour: usize = @intCast(n);
+                const distance = current.distance + length;
+                if (distance >= distances[neighbour]) {
+                    continue;
+                }
+                distances[neighbour] = distance;
+                parents[neighbour] = @intCast(current.node);
+                try queue.add(.{ .node = neighbour, .distance = distance });
+            }
         }
+    }
 
-        tmp = py.PyObject_GetAttrString(py_root_node, "x");
-        if (tmp == null) {
-            py.PyErr_SetString(py.PyExc_TypeError, "Object does not have an x attribute");
-            return error.NodeInitFailed;
+    // Finds the shortest path from source to target using A* with the straight line distance as the heuristic.
+    // The route is stored in reverse, starting with the target and ending with the source.
+    fn find_route(self: *const Self, source: Location, target: Location, route: *std.ArrayList(Location)) !void {
+        if (route.items.len != 0 or !self.contains(source) or !self.contains(target)) {
+            return error.RouteError;
         }
-        const x = py.PyFloat_AsDouble(tmp);
 
-        tmp = py.PyObject_GetAttrString(py_root_node, "y");
-        if (tmp == null) {
-            py.PyErr_SetString(py.PyExc_TypeError, "Object does not have an y attribute");
-            return error.NodeInitFailed;
+        var temp_arena = std.heap.ArenaAllocator.init(std.heap.page_allocator);
+        const temp_allocator = temp_arena.allocator();
+
+        errdefer temp_arena.deinit();
+        defer temp_arena.deinit();
+
+        const Entry = struct {
+            node: usize,
+            distance: f32,
+            estimate: f32,
+
+            fn compare(_: void, a: @This(), b: @This()) std.math.Order {
+                return std.math.order(a.estimate, b.estimate);
+            }
+        };
+
+        const start: usize = @intCast(source);
+        const end: usize = @intCast(target);
+
+        const distances = try temp_allocator.alloc(f32, self.len());
+        @memset(distances, std.math.inf(f32));
+        distances[start] = 0.0;
+
+        const parent = try temp_allocator.alloc(isize, self.len());
+        parent[start] = -1;
+
+        var queue = std.PriorityQueue(Entry, void, Entry.compare).init(temp_allocator, {});
+        try queue.add(.{
+            .node = start,
+            .distance = 0.0,
+            .estimate = self.simple_distance(start, end),
+        });
+
+        while (queue.removeOrNull()) |current| {
+            // Skip entries that were superseded by a shorter path
+            if (current.distance > distances[current.node]) {
+                continue;
+            }
+
+            if (current.node == end) {
+                var node: isize = @intCast(end);
+                while (node != -1) {
+                    try route.append(node);
+                    node = parent[@intCast(node)];
+                }
+                return;
+            }
+
+            const first: usize = @intCast(self.offsets[current.node]);
+            const last: usize = @intCast(self.offsets[current.node + 1]);
+            for (self.neighbours[first..last], self.lengths[first..last]) |n, length| {
+                const neighbour: usize = @intCast(n);
+                const distance = current.distance + length;
+                if (distance >= distances[neighbour]) {
+                    continue;
+                }
+                distances[neighbour] = distance;
+                parent[neighbour] = @intCast(current.node);
+                try queue.add(.{
+                    .node = neighbour,
+                    .distance = distance,
+                    .estimate = distance + self.simple_distance(neighbour, end),
+                });
+            }
         }
-        const y = py.PyFloat_AsDouble(tmp);
 
-        tmp = py.PyObject_GetAttrString(py_root_node, "neighbours");
-        var neighbours = std.ArrayList(*Node).init(allocator);
-        if (tmp == null) {
-            py.PyErr_SetString(py.PyExc_TypeError, "Object does not have an neighbours attribute");
-            return error.NodeInitFailed;
+        return error.RouteError;
+    }
+};
+
+// Shortest paths between nodes, kept for the lifetime of a Simulator. The graph of a Simulator
+// never changes, so a path stays valid until the Simulator is destroyed.
+// Shared by the worker threads, so the paths are guarded by a read write lock.
+const RouteCache = struct {
+    graph: *const Graph,
+    paths: std.AutoHashMap(Key, []const Location),
+    arena: std.heap.ArenaAllocator,
+    lock: std.Thread.RwLock = .{},
+
+    const Key = struct {
+        source: Location,
+        target: Location,
+    };
+
+    const Self = @This();
+
+    fn init(graph: *const Graph, allocator: std.mem.Allocator) Self {
+        return .{
+            .graph = graph,
+            .paths = std.AutoHashMap(Key, []const Location).init(allocator),
+            .arena = std.heap.ArenaAllocator.init(std.heap.page_allocator),
+        };
+    }
+
+    fn deinit(self: *Self) void {
+        self.arena.deinit();
+    }
+
+    // Same as Graph.find_route, but only searches for paths that have not been found before
+    fn find_route(self: *Self, source: Location, target: Location, route: *std.ArrayList(Location)) !void {
+        if (route.items.len != 0) {
+            return error.RouteError;
         }
 
-        const len = py.PyList_Size(tmp);
+        const key: Key = .{
+            .source = source,
+            .target = target,
+        };
 
-        const self: *Self = try allocator.create(Self);
-        self.id = id;
-        self.x = @floatCast(x);
-        self.y = @floatCast(y);
-        try visited.put(id, self);
+        self.lock.lockShared();
+        const cached = self.paths.get(key);
+        self.lock.unlockShared();
 
-        var i: i32 = 0;
-        while (i < len) : (i += 1) {
-            const neighbour = py.PyList_GetItem(tmp, i);
-            const n = try Node.init(neighbour, allocator, visited);
-            try neighbours.append(n);
+        if (cached) |path| {
+            try route.appendSlice(path);
+            return;
         }
 
-        self.neighbours = neighbours;
+        try self.graph.find_route(source, target, route);
+
+        self.lock.lock();
+        defer self.lock.unlock();
+
+        const entry = try self.paths.getOrPut(key);
+        if (!entry.found_existing) {
+            entry.value_ptr.* = self.arena.allocator().dupe(Location, route.items) catch |err| {
+                _ = self.paths.remove(key);
+                return err;
+            };
+        }
+    }
+};
+
+// Read only view of a C contiguous python buffer, such as a numpy array
+fn Buffer(comptime T: type) type {
+    return struct {
+        view: py.Py_buffer,
+
+        const Self = @This();
+
+        fn init(object: PyObject, name: []const u8) !Self {
+            return init_with_flags(object, name, py.PyBUF_C_CONTIGUOUS | py.PyBUF_FORMAT);
+        }
+
+        fn init_writable(object: PyObject, name: []const u8) !Self {
+            return init_with_flags(object, name, py.PyBUF_C_CONTIGUOUS | py.PyBUF_FORMAT | py.PyBUF_WRITABLE);
+        }
+
+        fn init_with_flags(object: PyObject, name: []const u8, flags: c_int) !Self {
+            var self: Self = undefined;
+            if (py.PyObject_GetBuffer(object, &self.view, flags) != 0) {
+                return error.InvalidArray;
+            }
+            errdefer py.PyBuffer_Release(&self.view);
+
+            const format = std.mem.span(self.view.format);
+            const kind = if (format.len == 0) 0 else format[format.len - 1];
+            const valid = switch (T) {
+                i32 => kind == 'i' or kind == 'l',
+                i64 => kind == 'q' or kind == 'l',
+                f32 => kind == 'f',
+                f64 => kind == 'd',
+                else => @compileError("Unsupported buffer type"),
+            };
+
+            if (!valid or self.view.itemsize != @sizeOf(T)) {
+                var message: [128]u8 = undefined;
+                const text = std.fmt.bufPrintZ(&message, "{s} should be a contiguous {s} array", .{
+                    name,
+                    switch (T) {
+                        i32 => "int32",
+                        i64 => "int64",
+                        f32 => "float32",
+                        else => "float64",
+                    },
+                }) catch "Invalid array";
+                py.PyErr_SetString(py.PyExc_TypeError, text);
+                return error.InvalidArray;
+            }
+            return self;
+        }
+
+        fn items(self: *const Self) []const T {
+            return self.items_mut();
+        }
+
+        // Only for buffers from init_writable
+        fn items_mut(self: *const Self) []T {
+            const len: usize = @intCast(@divExact(self.view.len, self.view.itemsize));
+            if (len == 0) {
+                return &.{};
+            }
+            const ptr: [*]T = @ptrCast(@alignCast(self.view.buf));
+            return ptr[0..len];
+        }
+
+        fn deinit(self: *Self) void {
+            py.PyBuffer_Release(&self.view);
+        }
+    };
+}
+
+// Read only view of the array in an attribute of a python object
+fn get_attr_buffer(comptime T: type, object: PyObject, name: [:0]const u8) !Buffer(T) {
+    const attr = py.PyObject_GetAttrString(object, name);
+    if (attr == null) {
+        return error.InvalidArray;
+    }
+    defer py.Py_DECREF(attr);
+    return Buffer(T).init(attr, name);
+}
+
+// Arrays of a python Graph. They are held for the lifetime of the Simulator so the graph can be read in place.
+const GraphBuffers = struct {
+    x: Buffer(f64),
+    y: Buffer(f64),
+    offsets: Buffer(i32),
+    neighbours: Buffer(i32),
+    lengths: Buffer(f32),
+
+    const Self = @This();
+
+    // Anything that is not a Graph, such as the root Node of a map, is converted with its to_graph method
+    fn init(py_graph: PyObject) !Self {
+        var object = py_graph;
+        const convert = py.PyObject_HasAttrString(py_graph, "offsets") == 0;
+        if (convert) {
+            object = py.PyObject_CallMethod(py_graph, "to_graph", @as([*c]const u8, null));
+            if (object == null) {
+                return error.GraphInitFailed;
+            }
+        }
+        defer if (convert) py.Py_DECREF(object);
+
+        var self: Self = undefined;
+        self.x = try get_attr_buffer(f64, object, "x");
+        errdefer self.x.deinit();
+        self.y = try get_attr_buffer(f64, object, "y");
+        errdefer self.y.deinit();
+        self.offsets = try get_attr_buffer(i32, object, "offsets");
+        errdefer self.offsets.deinit();
+        self.neighbours = try get_attr_buffer(i32, object, "neighbours");
+        errdefer self.neighbours.deinit();
+        self.lengths = try get_attr_buffer(f32, object, "lengths");
+        errdefer self.lengths.deinit();
+
+        try self.validate();
         return self;
     }
 
-    fn find_immediate_by_id(self: *const Self, id: Id) ?*Self {
-        for (self.neighbours.items) |neighbour| {
-            if (neighbour.id == id) {
-                return neighbour;
+    fn validate(self: *const Self) !void {
+        const graph = self.get_graph();
+        const n = graph.len();
+
+        if (n == 0 or graph.y.len != n or graph.offsets.len != n + 1 or graph.offsets[0] != 0) {
+            py.PyErr_SetString(py.PyExc_ValueError, "Graph should have x, y and offsets arrays for at least one node");
+            return error.GraphInitFailed;
+        }
+        for (graph.offsets[0..n], graph.offsets[1..]) |start, end| {
+            if (end < start) {
+                py.PyErr_SetString(py.PyExc_ValueError, "Graph offsets should be increasing");
+                return error.GraphInitFailed;
+            }
+        }
+        const num_edges: usize = @intCast(graph.offsets[n]);
+        if (graph.neighbours.len != num_edges or graph.lengths.len != num_edges) {
+            py.PyErr_SetString(py.PyExc_ValueError, "Graph neighbours and lengths should have offsets[-1] elements");
+            return error.GraphInitFailed;
+        }
+        for (graph.neighbours) |neighbour| {
+            if (!graph.contains(neighbour)) {
+                py.PyErr_SetString(py.PyExc_ValueError, "Graph neighbours should be node ids");
+                return error.GraphInitFailed;
             }
         }
-        return null;
     }
 
-    fn simple_distance(self: *const Self, other: *const Self) f32 {
-        const dx = other.x - self.x;
-        const dy = other.y - self.y;
-        return @floatCast(@sqrt(dx * dx + dy * dy));
+    fn get_graph(self: *const Self) Graph {
+        return .{
+            .x = self.x.items(),
+            .y = self.y.items(),
+            .offsets = self.offsets.items(),
+            .neighbours = self.neighbours.items(),
+            .lengths = self.lengths.items(),
+        };
     }
 
-    fn find_route(self: *Self, target: Location, route: *std.ArrayList(Location)) !void {
-        if (route.items.len != 0) {
-            return error.RouteError;
+    fn deinit(self: *Self) void {
+        self.x.deinit();
+        self.y.deinit();
+        self.offsets.deinit();
+        self.neighbours.deinit();
+        self.lengths.deinit();
+    }
+};
+
+// Allocation of parcels for one agent, converted from Python before simulating
+const AgentAllocation = struct {
+    info: AgentInfo,
+    parcels: []const Gene,
+
+    const Self = @This();
+
+    fn get_attr(object: PyObject, name: [*c]const u8, message: [*c]const u8) !PyObject {
+        const attr = py.PyObject_GetAttrString(object, name);
+        if (attr == null) {
+            py.PyErr_SetString(py.PyExc_TypeError, message);
+            return error.AgentInitializationFalied;
         }
+        return attr;
+    }
 
-        var temp_arena = std.heap.ArenaAllocator.init(std.heap.page_allocator);
-        var temp_allocator = temp_arena.allocator();
+    // Converts a Dict[DeliveryAgentInfo, List[Id]] into a list of allocations. Requires the GIL.
+    fn from_python(agent_allocation: PyObject, allocator: std.mem.Allocator) !std.ArrayList(Self) {
+        if (py.PyDict_Check(agent_allocation) == 0) {
+            py.PyErr_SetString(py.PyExc_TypeError, "Agent allocation should be a Dict");
+            return error.AgentInitializationFalied;
+        }
 
-        errdefer temp_arena.deinit();
-        defer temp_arena.deinit();
+        var key: PyObject = undefined;
+        var value: PyObject = undefined;
+        var pos: py.Py_ssize_t = 0;
 
-        const dl = std.DoublyLinkedList(*Self);
-        var queue = dl{};
-        const s = try temp_allocator.create(dl.Node);
-        s.data = self;
-        queue.append(s);
+        var allocations = try std.ArrayList(Self).initCapacity(allocator, @intCast(py.PyDict_Size(agent_allocation)));
 
-        var visited = std.AutoHashMap(Id, void).init(temp_allocator);
-        try visited.put(self.id, {});
+        while (py.PyDict_Next(agent_allocation, &pos, &key, &value) != 0) {
+            var info: AgentInfo = undefined;
 
-        var parent = std.AutoHashMap(Id, ?Id).init(temp_allocator);
-        try parent.put(self.id, null);
+            var tmp = try get_attr(key, "id", "Object does not have an id attribute");
+            info.id = @intCast(py.PyLong_AsLong(tmp));
+            py.Py_DECREF(tmp);
 
-        while (queue.len > 0) {
-            const current = queue.popFirst().?;
+            tmp = try get_attr(key, "max_capacity", "Object does not have an max_capacity attribute");
+            info.max_capacity = @intCast(py.PyLong_AsLong(tmp));
+            py.Py_DECREF(tmp);
 
-            if (current.data.id == target) {
-                var id: ?Id = current.data.id;
+            tmp = try get_attr(key, "max_dist", "Object does not have an max_dist attribute");
+            info.max_distance = @floatCast(py.PyFloat_AsDouble(tmp));
+            py.Py_DECREF(tmp);
 
-                while (id) |i| {
-                    try route.append(i);
-                    id = parent.get(i).?;
-                }
-                return;
+            if (py.PyList_Check(value) == 0) {
+                py.PyErr_SetString(py.PyExc_TypeError, "Agent allocation should be a List");
+                return error.AgentInitializationFalied;
             }
 
-            for (current.data.neighbours.items) |neighbour| {
-                if (visited.contains(neighbour.id)) {
-                    continue;
+            const len = py.PyList_Size(value);
+            var parcels_allocated = try std.ArrayList(Gene).initCapacity(allocator, @intCast(len));
+
+            var i: i32 = 0;
+            while (i < len) : (i += 1) {
+                tmp = py.PyList_GetItem(value, i);
+                if (tmp == null) {
+                    py.PyErr_SetString(py.PyExc_TypeError, "Object does not have an id attribute");
+                    return error.AgentInitializationFalied;
                 }
-                try visited.put(neighbour.id, {});
-                try parent.put(neighbour.id, current.data.id);
-                const n = try temp_allocator.create(dl.Node);
-                n.data = neighbour;
-                queue.append(n);
+
+                const parcel_id: Gene = @truncate(py.PyLong_AsLong(tmp));
+                try parcels_allocated.append(parcel_id);
             }
+
+            try allocations.append(.{
+                .info = info,
+                .parcels = parcels_allocated.items,
+            });
         }
 
-        return error.RouteError;
+        return allocations;
     }
 };
 
 const SubSimulator = struct {
     all_parcels: std.ArrayList(Parcel),
-    root_node: *Node,
+    root_node: Location,
     agents: std.ArrayList(Agent),
 
+    // tick advances every agent by 1 distance unit per step.
+    // event jumps each agent directly from node to node and gives the same results.
+    pub const Mode = enum {
+        tick,
+        event,
+    };
+
     pub const Performance = struct {
         total_distance_travelled: f64,
         total_parcels_delivered: i64,
@@ -164,11 +508,11 @@ const SubSimulator = struct {
         is_running: bool = true,
         progress: f32 = 0,
         locations_to_visit: std.ArrayList(Location) = undefined,
-        current_location: *Node = undefined,
-        target_location: *Node = undefined,
+        current_location: Location = undefined,
         current_target: Location = 0,
         route: std.ArrayList(Location) = undefined,
         allocator: std.mem.Allocator = undefined,
+        routes: *RouteCache = undefined,
         current_parcel_to_deliver: Location = undefined,
         distance_to_target: f32 = undefined,
 
@@ -176,23 +520,24 @@ const SubSimulator = struct {
 
         fn init(
             info: AgentInfo,
-            parcels_allocated: std.ArrayList(Id),
+            parcels_allocated: []const Gene,
             all_parcels: *std.AutoHashMap(Id, Location),
-            agent_starting_location: *Node,
+            agent_starting_location: Location,
+            routes: *RouteCache,
             allocator: std.mem.Allocator,
         ) !AgentSelf {
-            if (parcels_allocated.items[0] != -1) {
+            if (parcels_allocated.len == 0 or parcels_allocated[0] != -1) {
                 return .{
                     .is_valid = false,
                 };
             }
 
-            for (parcels_allocated.items, 0..) |parcel_id, i| {
+            for (parcels_allocated, 0..) |parcel_id, i| {
                 if (parcel_id == -1) {
                     continue;
                 }
 
-                for (parcels_allocated.items, 0..) |other_id, j| {
+                for (parcels_allocated, 0..) |other_id, j| {
                     if (i == j) {
                         continue;
                     }
@@ -212,7 +557,7 @@ const SubSimulator = struct {
 
             var parcels_to_deliver = std.ArrayList(?Parcel).init(temp_arena.allocator());
 
-            for (parcels_allocated.items) |parcel_id| {
+            for (parcels_allocated) |parcel_id| {
                 if (parcel_id == -1) {
                     num_parcels = 0;
                     try parcels_to_deliver.append(null);
@@ -275,6 +620,7 @@ const SubSimulator = struct {
                 .locations_to_visit = locations_to_visit,
                 .current_location = agent_starting_location,
                 .allocator = allocator,
+                .routes = routes,
                 .route = std.ArrayList(Location).init(allocator),
             };
 
@@ -288,11 +634,10 @@ const SubSimulator = struct {
                     }
                 }
                 self.current_target = self.route.pop();
-                self.target_location = self.current_location.find_immediate_by_id(self.current_target) orelse {
+                self.distance_to_target = self.routes.graph.edge_length(self.current_location, self.current_target) orelse {
                     self.is_valid = false;
                     return self;
                 };
-                self.distance_to_target = self.current_location.simple_distance(self.target_location);
             }
 
             return self;
@@ -305,7 +650,7 @@ const SubSimulator = struct {
             }
 
             self.current_parcel_to_deliver = self.locations_to_visit.pop();
-            self.current_location.find_route(self.current_parcel_to_deliver, &self.route) catch {
+            self.routes.find_route(self.current_location, self.current_parcel_to_deliver, &self.route) catch {
                 self.is_valid = false;
                 return false;
             };
@@ -325,43 +670,108 @@ const SubSimulator = struct {
             }
 
             if (self.progress >= self.distance_to_target) {
-                self.current_location = self.target_location;
-                self.progress -= self.distance_to_target;
-                while (self.route.items.len == 0) {
-                    if (self.current_location.id != 0) {
-                        self.parcels_delivered += 1;
-                    }
-                    if (!self.calculate_route()) {
-                        return false;
-                    }
-                }
-                self.current_target = self.route.pop();
-                self.target_location = self.current_location.find_immediate_by_id(self.current_target) orelse {
-                    self.is_valid = false;
+                if (!self.arrive()) {
                     return false;
-                };
-                self.distance_to_target = self.current_location.simple_distance(self.target_location);
+                }
             }
 
             self.distance_travelled += 1.0;
             self.progress += 1.0;
             return true;
         }
+
+        // Moves the agent onto the target node and picks the next target.
+        // Returns false if the agent has stopped running or became invalid.
+        fn arrive(self: *AgentSelf) bool {
+            self.current_location = self.current_target;
+            self.progress -= self.distance_to_target;
+            while (self.route.items.len == 0) {
+                if (self.current_location != 0) {
+                    self.parcels_delivered += 1;
+                }
+                if (!self.calculate_route()) {
+                    return false;
+                }
+            }
+            self.current_target = self.route.pop();
+            self.distance_to_target = self.routes.graph.edge_length(self.current_location, self.current_target) orelse {
+                self.is_valid = false;
+                return false;
+            };
+            return true;
+        }
+
+        // Runs the agent until it stops, jumping directly from node to node.
+        // Produces the same results as calling step until it returns false.
+        fn run(self: *AgentSelf) void {
+            if (!self.is_running or !self.is_valid) {
+                return;
+            }
+
+            while (true) {
+                // Number of 1 unit steps needed to reach the target node. The agent stops once it has
+                // travelled max_distance, so there is no need to step further than that
+                const remaining = @ceil(@as(f64, self.info.max_distance) - self.distance_travelled);
+                const steps = advance_progress(&self.progress, self.distance_to_target, remaining);
+                self.distance_travelled += steps;
+
+                if (self.distance_travelled >= self.info.max_distance) {
+                    self.distance_travelled = self.info.max_distance;
+                    return;
+                }
+
+                if (!self.arrive()) {
+                    return;
+                }
+
+                self.distance_travelled += 1.0;
+                self.progress += 1.0;
+            }
+        }
+
+        // Adds 1.0 to progress until it reaches target or limit additions were made, and returns the number of additions.
+        // Inside a binade adding 1.0 to an f32 is exact, so whole runs are added at once and
+        // only the additions that cross into the next binade are done one at a time to keep the rounding.
+        // Past 2^24 adding 1.0 no longer changes progress, so the remaining additions are counted at once.
+        fn advance_progress(progress: *f32, target: f32, limit: f64) f64 {
+            var steps: f64 = 0.0;
+            while (progress.* < target and steps < limit) {
+                if (progress.* >= 1.0 and progress.* < 16777216.0) {
+                    const boundary = std.math.ldexp(@as(f64, 1.0), std.math.frexp(progress.*).exponent);
+                    const room = @ceil(boundary - progress.*) - 1.0;
+                    const needed = @min(@ceil(@as(f64, target) - progress.*), limit - steps);
+
+                    if (needed <= room) {
+                        progress.* += @floatCast(needed);
+                        steps += needed;
+                        break;
+                    }
+                    if (room > 0.0) {
+                        progress.* += @floatCast(room);
+                        steps += room;
+                        continue;
+                    }
+                }
+                if (progress.* + 1.0 == progress.*) {
+                    return limit;
+                }
+                progress.* += 1.0;
+                steps += 1.0;
+            }
+            return steps;
+        }
     };
 
     const Self = @This();
 
     pub fn init(
-        root_node: *Node,
+        root_node: Location,
         all_parcels: std.ArrayList(Parcel),
+        routes: *RouteCache,
         allocator: std.mem.Allocator,
-        agent_allocation: PyObject,
+        agent_allocations: []const AgentAllocation,
     ) !Self {
-        var key: PyObject = undefined;
-        var value: PyObject = undefined;
-        var pos: py.Py_ssize_t = 0;
-
-        var agents = std.ArrayList(Agent).init(allocator);
+        var agents = try std.ArrayList(Agent).initCapacity(allocator, agent_allocations.len);
 
         var arena = std.heap.ArenaAllocator.init(std.heap.page_allocator);
         defer arena.deinit();
@@ -373,54 +783,13 @@ const SubSimulator = struct {
             try parcel_map.put(parcel.id, parcel.location);
         }
 
-        while (py.PyDict_Next(agent_allocation, &pos, &key, &value) != 0) {
-            var info: AgentInfo = undefined;
-            var tmp = py.PyObject_GetAttrString(key, "id");
-            if (tmp == null) {
-                py.PyErr_SetString(py.PyExc_TypeError, "Object does not have an id attribute");
-                return error.AgentInitializationFalied;
-            }
-            info.id = @intCast(py.PyLong_AsLong(tmp));
-
-            tmp = py.PyObject_GetAttrString(key, "max_capacity");
-            if (tmp == null) {
-                py.PyErr_SetString(py.PyExc_TypeError, "Object does not have an max_capacity attribute");
-                return error.AgentInitializationFalied;
-            }
-            info.max_capacity = @intCast(py.PyLong_AsLong(tmp));
-
-            tmp = py.PyObject_GetAttrString(key, "max_dist");
-            if (tmp == null) {
-                py.PyErr_SetString(py.PyExc_TypeError, "Object does not have an max_dist attribute");
-                return error.AgentInitializationFalied;
-            }
-            info.max_distance = @floatCast(py.PyFloat_AsDouble(tmp));
-
-            if (py.PyList_Check(value) == 0) {
-                py.PyErr_SetString(py.PyExc_TypeError, "Agent allocation should be a List");
-                return error.AgentInitializationFalied;
-            }
-
-            const len = py.PyList_Size(value);
-            var parcels_allocated = try std.ArrayList(Id).initCapacity(arena.allocator(), @intCast(len));
-
-            var i: i32 = 0;
-            while (i < len) : (i += 1) {
-                tmp = py.PyList_GetItem(value, i);
-                if (tmp == null) {
-                    py.PyErr_SetString(py.PyExc_TypeError, "Object does not have an id attribute");
-                    return error.AgentInitializationFalied;
-                }
-
-                const parcel_id: i32 = @truncate(py.PyLong_AsLong(tmp));
-                try parcels_allocated.append(parcel_id);
-            }
-
+        for (agent_allocations) |agent_allocation| {
             try agents.append(try Agent.init(
-                info,
-                parcels_allocated,
+                agent_allocation.info,
+                agent_allocation.parcels,
                 &parcel_map,
                 root_node,
+                routes,
                 allocator,
             ));
         }
@@ -432,17 +801,22 @@ const SubSimulator = struct {
         };
     }
 
-    pub fn simulate(self: *Self) !Performance {
-        while (true) {
-            var done: u32 = 0;
-            for (self.agents.items) |*agent| {
-                if (agent.step()) {
-                    done += 1;
+    pub fn simulate(self: *Self, mode: Mode) !Performance {
+        switch (mode) {
+            .tick => while (true) {
+                var done: u32 = 0;
+                for (self.agents.items) |*agent| {
+                    if (agent.step()) {
+                        done += 1;
+                    }
                 }
-            }
-            if (done == 0) {
-                break;
-            }
+                if (done == 0) {
+                    break;
+                }
+            },
+            .event => for (self.agents.items) |*agent| {
+                agent.run();
+            },
         }
 
         var performance: Performance = .{
@@ -461,20 +835,27 @@ const SubSimulator = struct {
 };
 
 pub const Simulator = struct {
-    root_node: *Node,
+    graph_buffers: GraphBuffers,
+    graph: Graph,
+    // Agents start at the warehouse, which is always node 0
+    root_node: Location,
     all_parcels: std.ArrayList(Parcel),
     sub_simulators: std.ArrayList(SubSimulator),
+    mode: SubSimulator.Mode,
+    routes: RouteCache,
 
     main_arena: std.heap.ArenaAllocator,
     sub_arena: std.heap.ArenaAllocator,
+    // One arena per worker thread, since arenas are not thread safe
+    worker_arenas: []std.heap.ArenaAllocator,
+    is_simulating: bool,
 
     const Self = @This();
 
-    pub fn init(py_root_node: PyObject, py_parcels: PyObject) !*Self {
-        var temp_arena = std.heap.ArenaAllocator.init(std.heap.page_allocator);
-        defer temp_arena.deinit();
-        errdefer temp_arena.deinit();
+    pub const Mode = SubSimulator.Mode;
 
+    // py_graph is a Graph or the root Node of a map. num_threads of 0 uses one worker thread per cpu
+    pub fn init(py_graph: PyObject, py_parcels: PyObject, num_threads: usize, mode: Mode) !*Self {
         var main_arena = std.heap.ArenaAllocator.init(std.heap.page_allocator);
         errdefer main_arena.deinit();
 
@@ -484,24 +865,52 @@ pub const Simulator = struct {
         const self: *Self = try main_arena.allocator().create(Self);
         self.main_arena = main_arena;
         self.sub_arena = sub_arena;
+        self.mode = mode;
+        self.is_simulating = false;
+        self.sub_simulators = std.ArrayList(SubSimulator).init(self.sub_arena.allocator());
 
-        var visited = std.AutoHashMap(Id, *Node).init(temp_arena.allocator());
-        self.root_node = try Node.init(
-            py_root_node,
-            self.main_arena.allocator(),
-            &visited,
-        );
+        self.graph_buffers = try GraphBuffers.init(py_graph);
+        errdefer self.graph_buffers.deinit();
+        self.graph = self.graph_buffers.get_graph();
+        self.root_node = 0;
+        self.routes = RouteCache.init(&self.graph, self.main_arena.allocator());
 
         try self.set_parcels(py_parcels);
+
+        const num_workers = if (num_threads == 0) std.Thread.getCpuCount() catch 1 else num_threads;
+        self.worker_arenas = try self.main_arena.allocator().alloc(std.heap.ArenaAllocator, num_workers);
+        for (self.worker_arenas) |*arena| {
+            arena.* = std.heap.ArenaAllocator.init(std.heap.page_allocator);
+        }
         return self;
     }
 
     pub fn deinit(self: *Self) void {
+        for (self.worker_arenas) |*arena| {
+            arena.deinit();
+        }
+        self.routes.deinit();
+        self.graph_buffers.deinit();
         self.sub_arena.deinit();
         self.main_arena.deinit();
     }
 
+    // The GIL is released while simulating, so another Python thread could call into the same simulator
+    pub fn ensure_idle(self: *const Self) !void {
+        if (self.is_simulating) {
+            py.PyErr_SetString(py.PyExc_RuntimeError, "Simulator is already simulating");
+            return error.SimulatorBusy;
+        }
+    }
+
+    // Parcels are a list of objects with id and location attributes, or a ParcelSet whose ids and
+    // locations columns are read in place
     pub fn set_parcels(self: *Self, py_parcels: PyObject) !void {
+        try self.ensure_idle();
+        if (py.PyList_Check(py_parcels) == 0) {
+            return self.set_parcel_columns(py_parcels);
+        }
+
         const len = py.PyList_Size(py_parcels);
         self.all_parcels = try std.ArrayList(Parcel).initCapacity(self.main_arena.allocator(), @intCast(len));
         var i: i32 = 0;
@@ -530,35 +939,302 @@ pub const Simulator = struct {
         }
     }
 
-    pub fn simulate(self: *Self, list_of_agent_allocations: PyObject) !std.ArrayList(SubSimulator.Performance) {
-        _ = self.sub_arena.reset(.free_all);
+    fn set_parcel_columns(self: *Self, py_parcels: PyObject) !void {
+        var ids = try get_attr_buffer(i64, py_parcels, "ids");
+        defer ids.deinit();
+        var locations = try get_attr_buffer(i64, py_parcels, "locations");
+        defer locations.deinit();
 
-        const len = py.PyList_Size(list_of_agent_allocations);
-        var i: i32 = 0;
+        if (ids.items().len != locations.items().len) {
+            py.PyErr_SetString(py.PyExc_ValueError, "ids and locations should have the same length");
+            return error.NodeInitFailed;
+        }
 
-        self.sub_simulators = try std.ArrayList(SubSimulator).initCapacity(self.sub_arena.allocator(), @intCast(len));
-        var results = try std.ArrayList(SubSimulator.Performance).initCapacity(self.sub_arena.allocator(), @intCast(len));
-        while (i < len) : (i += 1) {
-            const agent_allocation = py.PyList_GetItem(list_of_agent_allocations, i);
-            if (py.PyDict_Check(agent_allocation) == 0) {
-                py.PyErr_SetString(py.PyExc_TypeError, "Agent allocation should be a Dict");
-            }
+        self.all_parcels = try std.ArrayList(Parcel).initCapacity(self.main_arena.allocator(), ids.items().len);
+        for (ids.items(), locations.items()) |id, location| {
+            self.all_parcels.appendAssumeCapacity(.{
+                .id = @intCast(id),
+                .location = @intCast(location),
+            });
+        }
+    }
 
-            var sub_simulator = try SubSimulator.init(
-                self.root_node,
-                self.all_parcels,
-                self.sub_arena.allocator(),
+    pub fn simulate(self: *Self, list_of_agent_allocations: PyObject) !std.ArrayList(SubSimulator.Performance) {
+        try self.reset();
+
+        const len: usize = @intCast(py.PyList_Size(list_of_agent_allocations));
+
+        // Convert all the allocations while holding the GIL
+        var agent_allocations = try std.ArrayList([]const AgentAllocation).initCapacity(self.sub_arena.allocator(), len);
+        for (0..len) |i| {
+            const agent_allocation = py.PyList_GetItem(list_of_agent_allocations, @intCast(i));
+            const allocation = try AgentAllocation.from_python(
                 agent_allocation,
+                self.sub_arena.allocator(),
             );
+            agent_allocations.appendAssumeCapacity(allocation.items);
+        }
+
+        return self.run_batch(agent_allocations.items);
+    }
 
-            try self.sub_simulators.append(sub_simulator);
-            try results.append(try sub_simulator.simulate());
+    // Simulates a whole population packed into arrays, reading them in place through the buffer protocol.
+    // genes: int32 genes of every agent of every individual, concatenated.
+    // offsets: int32 array of length num_individuals * num_agents + 1. Genes of agent j of individual i are
+    //     genes[offsets[i * num_agents + j]..offsets[i * num_agents + j + 1]].
+    // agent_table: float64 array of shape (num_agents, 3) with the id, max_capacity and max_dist of each agent.
+    pub fn simulate_array(self: *Self, py_genes: PyObject, py_offsets: PyObject, py_agent_table: PyObject) !std.ArrayList(SubSimulator.Performance) {
+        try self.reset();
+
+        var genes_buffer = try Buffer(Gene).init(py_genes, "genes");
+        defer genes_buffer.deinit();
+        var offsets_buffer = try Buffer(i32).init(py_offsets, "offsets");
+        defer offsets_buffer.deinit();
+        var agent_table_buffer = try Buffer(f64).init(py_agent_table, "agent_table");
+        defer agent_table_buffer.deinit();
+
+        const genes = genes_buffer.items();
+        const offsets = offsets_buffer.items();
+        const agent_table = agent_table_buffer.items();
+
+        if (agent_table.len % 3 != 0) {
+            py.PyErr_SetString(py.PyExc_ValueError, "agent_table should have 3 columns: id, max_capacity and max_dist");
+            return error.InvalidArray;
+        }
+        const num_agents = agent_table.len / 3;
+
+        if (offsets.len == 0 or (num_agents == 0 and offsets.len != 1) or (num_agents != 0 and (offsets.len - 1) % num_agents != 0)) {
+            py.PyErr_SetString(py.PyExc_ValueError, "offsets should have num_individuals * num_agents + 1 elements");
+            return error.InvalidArray;
+        }
+        for (offsets[0 .. offsets.len - 1], offsets[1..]) |start, end| {
+            if (start < 0 or end < start or end > genes.len) {
+                py.PyErr_SetString(py.PyExc_ValueError, "offsets should be increasing and within genes");
+                return error.InvalidArray;
+            }
+        }
+
+        var infos = try std.ArrayList(AgentInfo).initCapacity(self.sub_arena.allocator(), num_agents);
+        for (0..num_agents) |j| {
+            const row = agent_table[j * 3 .. j * 3 + 3];
+            infos.appendAssumeCapacity(.{
+                .id = @intFromFloat(row[0]),
+                .max_capacity = @intFromFloat(row[1]),
+                .max_distance = @floatCast(row[2]),
+            });
+        }
+
+        const num_individuals = if (num_agents == 0) 0 else (offsets.len - 1) / num_agents;
+        const allocations = try self.sub_arena.allocator().alloc(AgentAllocation, num_individuals * num_agents);
+        var agent_allocations = try std.ArrayList([]const AgentAllocation).initCapacity(self.sub_arena.allocator(), num_individuals);
+        for (0..num_individuals) |i| {
+            for (0..num_agents) |j| {
+                const k = i * num_agents + j;
+                allocations[k] = .{
+                    .info = infos.items[j],
+                    .parcels = genes[@intCast(offsets[k])..@intCast(offsets[k + 1])],
+                };
+            }
+            agent_allocations.appendAssumeCapacity(allocations[i * num_agents .. (i + 1) * num_agents]);
+        }
+
+        return self.run_batch(agent_allocations.items);
+    }
+
+    fn reset(self: *Self) !void {
+        try self.ensure_idle();
+        _ = self.sub_arena.reset(.free_all);
+        // The results of the last simulation are freed with the arena
+        self.sub_simulators = std.ArrayList(SubSimulator).init(self.sub_arena.allocator());
+        for (self.worker_arenas) |*arena| {
+            _ = arena.reset(.free_all);
+        }
+    }
+
+    fn run_batch(self: *Self, agent_allocations: []const []const AgentAllocation) !std.ArrayList(SubSimulator.Performance) {
+        const len = agent_allocations.len;
+
+        self.sub_simulators = std.ArrayList(SubSimulator).init(self.sub_arena.allocator());
+        try self.sub_simulators.resize(len);
+        var results = std.ArrayList(SubSimulator.Performance).init(self.sub_arena.allocator());
+        try results.resize(len);
+
+        var batch: Batch = .{
+            .simulator = self,
+            .agent_allocations = agent_allocations,
+            .results = results.items,
+        };
+
+        // The sub simulators are independent, so they are run on the worker threads
+        try self.run_parallel(len, &batch);
+
+        if (batch.failed.load(.monotonic)) {
+            // Some of the sub simulators were never initialized, so none of the results are kept
+            self.sub_simulators.clearRetainingCapacity();
+            _ = py.PyErr_NoMemory();
+            return error.SimulationFailed;
         }
 
         return results;
     }
 
-    pub fn get_agents(self: *const Self, simulator_index: u32) []SubSimulator.Agent {
-        return self.sub_simulators.items[simulator_index].agents.items;
+    // Calls job.run(thread) on up to num_jobs worker threads without the GIL, where thread is the
+    // index of the worker. The calling thread is worker 0. Returns after every worker is done.
+    fn run_parallel(self: *Self, num_jobs: usize, job: anytype) !void {
+        const num_threads = @min(self.worker_arenas.len, num_jobs);
+        var threads = try std.ArrayList(std.Thread).initCapacity(std.heap.page_allocator, num_threads);
+        defer threads.deinit();
+
+        self.is_simulating = true;
+        const thread_state = PyEval_SaveThread();
+        var t: usize = 1;
+        while (t < num_threads) : (t += 1) {
+            const thread = std.Thread.spawn(.{}, @TypeOf(job.*).run, .{ job, t }) catch break;
+            threads.appendAssumeCapacity(thread);
+        }
+        job.run(0);
+
+        for (threads.items) |thread| {
+            thread.join();
+        }
+        PyEval_RestoreThread(thread_state);
+        self.is_simulating = false;
+    }
+
+    // Finds the shortest paths from every location to every node, one location per job.
+    // locations: int32 node ids.
+    // distances: float32 array of shape (len(locations), len(locations)) that is filled with the
+    //     distance from locations[i] to locations[j].
+    // next_hops: int32 array of shape (len(locations), num_nodes) that is filled with the next node on the
+    //     shortest path from each node to locations[i], -1 for locations[i] itself and unreachable nodes.
+    pub fn shortest_paths(self: *Self, py_locations: PyObject, py_distances: PyObject, py_next_hops: PyObject) !void {
+        try self.ensure_idle();
+
+        var locations_buffer = try Buffer(i32).init(py_locations, "locations");
+        defer locations_buffer.deinit();
+        var distances_buffer = try Buffer(f32).init_writable(py_distances, "distances");
+        defer distances_buffer.deinit();
+        var next_hops_buffer = try Buffer(i32).init_writable(py_next_hops, "next_hops");
+        defer next_hops_buffer.deinit();
+
+        const locations = locations_buffer.items();
+        for (locations) |location| {
+            if (!self.graph.contains(location)) {
+                py.PyErr_SetString(py.PyExc_ValueError, "locations should be node ids");
+                return error.InvalidArray;
+            }
+        }
+
+        var job: ShortestPaths = .{
+            .graph = &self.graph,
+            .locations = locations,
+            .distances = distances_buffer.items_mut(),
+            .next_hops = next_hops_buffer.items_mut(),
+        };
+
+        if (job.distances.len != locations.len * locations.len or job.next_hops.len != locations.len * self.graph.len()) {
+            py.PyErr_SetString(py.PyExc_ValueError, "distances and next_hops should have shapes (len(locations), len(locations)) and (len(locations), num_nodes)");
+            return error.InvalidArray;
+        }
+
+        try self.run_parallel(locations.len, &job);
+
+        if (job.failed.load(.monotonic)) {
+            _ = py.PyErr_NoMemory();
+            return error.ShortestPathsFailed;
+        }
+    }
+
+    const ShortestPaths = struct {
+        graph: *const Graph,
+        locations: []const i32,
+        distances: []f32,
+        next_hops: []i32,
+        next_index: std.atomic.Value(usize) = std.atomic.Value(usize).init(0),
+        failed: std.atomic.Value(bool) = std.atomic.Value(bool).init(false),
+
+        fn run(self: *ShortestPaths, thread: usize) void {
+            _ = thread;
+            const n = self.graph.len();
+            const k = self.locations.len;
+
+            const distances = std.heap.page_allocator.alloc(f32, n) catch {
+                self.failed.store(true, .monotonic);
+                return;
+            };
+            defer std.heap.page_allocator.free(distances);
+
+            // Holds the queue of one search at a time
+            var arena = std.heap.ArenaAllocator.init(std.heap.page_allocator);
+            defer arena.deinit();
+
+            while (!self.failed.load(.monotonic)) {
+                const i = self.next_index.fetchAdd(1, .monotonic);
+                if (i >= k) {
+                    return;
+                }
+
+                _ = arena.reset(.retain_capacity);
+                self.graph.shortest_path_tree(
+                    self.locations[i],
+                    distances,
+                    self.next_hops[i * n .. (i + 1) * n],
+                    arena.allocator(),
+                ) catch {
+                    self.failed.store(true, .monotonic);
+                    return;
+                };
+
+                for (self.locations, 0..) |location, j| {
+                    self.distances[i * k + j] = distances[@intCast(location)];
+                }
+            }
+        }
+    };
+
+    // Shared state of one simulate call. Each worker takes the next index until all are done,
+    // and writes to that index so the results are in the same order as the allocations.
+    const Batch = struct {
+        simulator: *Self,
+        agent_allocations: []const []const AgentAllocation,
+        results: []SubSimulator.Performance,
+        next_index: std.atomic.Value(usize) = std.atomic.Value(usize).init(0),
+        failed: std.atomic.Value(bool) = std.atomic.Value(bool).init(false),
+
+        fn run(self: *Batch, thread: usize) void {
+            const simulator = self.simulator;
+            const arena = &simulator.worker_arenas[thread];
+            while (!self.failed.load(.monotonic)) {
+                const i = self.next_index.fetchAdd(1, .monotonic);
+                if (i >= self.agent_allocations.len) {
+                    return;
+                }
+
+                const sub_simulator = &simulator.sub_simulators.items[i];
+                sub_simulator.* = SubSimulator.init(
+                    simulator.root_node,
+                    simulator.all_parcels,
+                    &simulator.routes,
+                    arena.allocator(),
+                    self.agent_allocations[i],
+                ) catch {
+                    self.failed.store(true, .monotonic);
+                    return;
+                };
+                self.results[i] = sub_simulator.simulate(simulator.mode) catch {
+                    self.failed.store(true, .monotonic);
+                    return;
+                };
+            }
+        }
+    };
+
+    // Agents of one of the allocations of the last simulate or simulate_array call
+    pub fn get_agents(self: *const Self, simulator_index: isize) ![]SubSimulator.Agent {
+        if (simulator_index < 0 or simulator_index >= self.sub_simulators.items.len) {
+            py.PyErr_SetString(py.PyExc_IndexError, "sub_simulator_index out of range");
+            return error.InvalidIndex;
+        }
+        return self.sub_simulators.items[@intCast(simulator_index)].agents.items;
     }
 };
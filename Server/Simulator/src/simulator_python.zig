@@ -15,21 +15,32 @@ const Simulator_Wrapper = extern struct {
 
 // Define the init and dealloc functions for the Python object
 fn simulator_init(self: [*c]Simulator_Wrapper, args: PyObject, kwds: PyObject) callconv(.C) c_int {
-    _ = kwds;
-
-    var root_node: PyObject = undefined;
+    var graph: PyObject = undefined;
     var all_parcels: PyObject = undefined;
+    var num_threads: c_int = 0;
+    var mode_name: [*c]const u8 = "event";
 
-    if (py.PyArg_ParseTuple(args, "OO", &root_node, &all_parcels) == 0) {
+    var kwlist = [_:null]?[*:0]const u8{ "node", "all_parcels", "num_threads", "mode", null };
+    if (py.PyArg_ParseTupleAndKeywords(args, kwds, "OO|is", @ptrCast(&kwlist), &graph, &all_parcels, &num_threads, &mode_name) == 0) {
         return -1;
     }
 
-    if (py.PyList_Check(all_parcels) == 0) {
-        py.PyErr_SetString(py.PyExc_TypeError, "Second argument must be a list of parcels");
+    if (num_threads < 0) {
+        py.PyErr_SetString(py.PyExc_ValueError, "num_threads must not be negative");
         return -1;
     }
 
-    self.*.data = simulator_impl.Simulator.init(root_node, all_parcels) catch {
+    const mode = std.meta.stringToEnum(simulator_impl.Simulator.Mode, std.mem.span(mode_name)) orelse {
+        py.PyErr_SetString(py.PyExc_ValueError, "mode must be 'tick' or 'event'");
+        return -1;
+    };
+
+    if (py.PyList_Check(all_parcels) == 0 and py.PyObject_HasAttrString(all_parcels, "locations") == 0) {
+        py.PyErr_SetString(py.PyExc_TypeError, "Second argument must be a list of parcels or a ParcelSet");
+        return -1;
+    }
+
+    self.*.data = simulator_impl.Simulator.init(graph, all_parcels, @intCast(num_threads), mode) catch {
         return -1;
     };
     return 0;
@@ -60,12 +71,52 @@ fn simulator_simulate(self: [*c]Simulator_Wrapper, args: PyObject) PyObject {
         return null;
     }
     const results = self.*.data.?.simulate(agent_allocation) catch return null;
-    const list: PyObject = py.PyList_New(@intCast(results.items.len));
+    return results_to_list(results.items);
+}
+
+fn simulator_simulate_array(self: [*c]Simulator_Wrapper, args: PyObject) PyObject {
+    if (self.*.data == null) {
+        py.PyErr_SetString(py.PyExc_TypeError, "Simulator hasn't initialized properly");
+        return null;
+    }
+
+    var genes: PyObject = undefined;
+    var offsets: PyObject = undefined;
+    var agent_table: PyObject = undefined;
+
+    if (py.PyArg_ParseTuple(args, "OOO", &genes, &offsets, &agent_table) == 0) {
+        return null;
+    }
+
+    const results = self.*.data.?.simulate_array(genes, offsets, agent_table) catch return null;
+    return results_to_list(results.items);
+}
+
+fn simulator_shortest_paths(self: [*c]Simulator_Wrapper, args: PyObject) PyObject {
+    if (self.*.data == null) {
+        py.PyErr_SetString(py.PyExc_TypeError, "Simulator hasn't initialized properly");
+        return null;
+    }
+
+    var locations: PyObject = undefined;
+    var distances: PyObject = undefined;
+    var next_hops: PyObject = undefined;
+
+    if (py.PyArg_ParseTuple(args, "OOO", &locations, &distances, &next_hops) == 0) {
+        return null;
+    }
+
+    self.*.data.?.shortest_paths(locations, distances, next_hops) catch return null;
+    return py.Py_NewRef(py.Py_None());
+}
+
+fn results_to_list(results: anytype) PyObject {
+    const list: PyObject = py.PyList_New(@intCast(results.len));
     if (list == null) {
         return py.PyErr_NoMemory();
     }
 
-    for (results.items, 0..) |result, i| {
+    for (results, 0..) |result, i| {
         const tuple: PyObject = py.PyTuple_New(3);
         if (tuple == null) {
             return py.PyErr_NoMemory();
@@ -98,8 +149,8 @@ fn simulator_set_parcels(self: [*c]Simulator_Wrapper, args: PyObject) PyObject {
     if (py.PyArg_ParseTuple(args, "O", &parcels) == 0) {
         return null;
     }
-    if (py.PyList_Check(parcels) == 0) {
-        py.PyErr_SetString(py.PyExc_TypeError, "First argument must be a list of parcels");
+    if (py.PyList_Check(parcels) == 0 and py.PyObject_HasAttrString(parcels, "locations") == 0) {
+        py.PyErr_SetString(py.PyExc_TypeError, "First argument must be a list of parcels or a ParcelSet");
         return null;
     }
     self.*.data.?.set_parcels(parcels) catch return null;
@@ -121,7 +172,13 @@ fn simulator_get_agent_results(self: [*c]Simulator_Wrapper, args: PyObject) PyOb
         return null;
     }
 
-    const agents = self.*.data.?.get_agents(@intCast(py.PyLong_AsUnsignedLong(index)));
+    const simulator_index = py.PyLong_AsSsize_t(index);
+    if (simulator_index == -1 and py.PyErr_Occurred() != null) {
+        return null;
+    }
+
+    self.*.data.?.ensure_idle() catch return null;
+    const agents = self.*.data.?.get_agents(simulator_index) catch return null;
     const list: PyObject = py.PyList_New(@intCast(agents.len));
     if (list == null) {
         return py.PyErr_NoMemory();
@@ -157,6 +214,18 @@ var simulator_methods = [_]py.PyMethodDef{
         .ml_flags = py.METH_VARARGS,
         .ml_doc = "Simulates according to the agent allocation",
     },
+    .{
+        .ml_name = "simulate_array",
+        .ml_meth = @ptrCast(&simulator_simulate_array),
+        .ml_flags = py.METH_VARARGS,
+        .ml_doc = "Simulates a population packed into genes, offsets and agent_table arrays",
+    },
+    .{
+        .ml_name = "shortest_paths",
+        .ml_meth = @ptrCast(&simulator_shortest_paths),
+        .ml_flags = py.METH_VARARGS,
+        .ml_doc = "Fills distances and next_hops with the shortest paths between locations",
+    },
     .{
         .ml_name = "set_parcels",
         .ml_meth = @ptrCast(&simulator_set_parcels),
@@ -167,7 +236,7 @@ var simulator_methods = [_]py.PyMethodDef{
         .ml_name = "get_agent_results",
         .ml_meth = @ptrCast(&simulator_get_agent_results),
         .ml_flags = py.METH_VARARGS,
-        .ml_doc = "Sets the parcels for the simulator",
+        .ml_doc = "Returns the validity, parcels delivered and distance travelled of every agent of one allocation of the last simulation",
     },
     .{},
 };
@@ -1,5 +1,5 @@
 from dataclasses import dataclass
-from typing import List
+from typing import Any, Callable, Dict, Iterator, List, overload
 
 import numpy as np
 
@@ -8,7 +8,7 @@ Location = int
 Id = int
 
 
-@dataclass
+@dataclass(slots=True)
 class DeliveryAgentInfo:
     # Id of the agent
     id: Id
@@ -21,7 +21,7 @@ class DeliveryAgentInfo:
         return hash(self.id)
 
 
-@dataclass
+@dataclass(slots=True)
 class Parcel:
     # Id of the parcel
     id: Id
@@ -29,7 +29,7 @@ class Parcel:
     location: Location
 
 
-@dataclass
+@dataclass(slots=True)
 class Route:
     route: List[Parcel | None]
 
@@ -37,18 +37,164 @@ class Route:
         return [-1 if parcel is None else parcel.id for parcel in self.route]
 
 
+class ParcelSet:
+    # Columnar parcels. Parcel i has id ids[i] and is delivered to locations[i].
+    # Indexing and iterating create Parcel objects on demand, slicing returns a view
+    def __init__(self, ids: np.ndarray, locations: np.ndarray):
+        if len(ids) != len(locations):
+            raise ValueError("ids and locations should have the same length")
+        self.ids = np.asarray(ids, np.int64)
+        self.locations = np.asarray(locations, np.int64)
+
+    @staticmethod
+    def from_parcels(parcels: List[Parcel]) -> "ParcelSet":
+        return ParcelSet(
+            np.fromiter((parcel.id for parcel in parcels), np.int64, len(parcels)),
+            np.fromiter(
+                (parcel.location for parcel in parcels), np.int64, len(parcels)
+            ),
+        )
+
+    @staticmethod
+    def random(
+        no_of_nodes: int,
+        rng: np.random.Generator,
+        min_parcels: int = 20,
+        max_parcels: int = 50,
+    ) -> "ParcelSet":
+        # Parcels are numbered from 0 and delivered to any node except the root node
+        no_of_parcels = int(rng.integers(min_parcels, max_parcels))
+        locations = rng.integers(1, no_of_nodes, no_of_parcels)
+        return ParcelSet(np.arange(no_of_parcels), locations)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def nbytes(self) -> int:
+        return self.ids.nbytes + self.locations.nbytes
+
+    @overload
+    def __getitem__(self, index: int) -> Parcel: ...
+    @overload
+    def __getitem__(self, index: slice) -> "ParcelSet": ...
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return ParcelSet(self.ids[index], self.locations[index])
+        return Parcel(int(self.ids[index]), int(self.locations[index]))
+
+    def __iter__(self) -> Iterator[Parcel]:
+        for id, location in zip(self.ids.tolist(), self.locations.tolist()):
+            yield Parcel(id, location)
+
+    def tolist(self) -> List[Parcel]:
+        return list(self)
+
+    def to_dict(self) -> Dict[str, list]:
+        return {"id": self.ids.tolist(), "location": self.locations.tolist()}
+
+
+class AgentFleet:
+    # Columnar agents. Agent i has id ids[i], carries capacities[i] parcels per trip
+    # and travels up to max_dists[i]. Indexing and iterating create agents on demand
+    def __init__(self, ids: np.ndarray, capacities: np.ndarray, max_dists: np.ndarray):
+        if not len(ids) == len(capacities) == len(max_dists):
+            raise ValueError(
+                "ids, capacities and max_dists should have the same length"
+            )
+        self.ids = np.asarray(ids, np.int64)
+        self.capacities = np.asarray(capacities, np.int64)
+        self.max_dists = np.asarray(max_dists, np.float64)
+
+    @staticmethod
+    def from_agents(agents: List[DeliveryAgentInfo]) -> "AgentFleet":
+        no_agents = len(agents)
+        return AgentFleet(
+            np.fromiter((agent.id for agent in agents), np.int64, no_agents),
+            np.fromiter((agent.max_capacity for agent in agents), np.int64, no_agents),
+            np.fromiter((agent.max_dist for agent in agents), np.float64, no_agents),
+        )
+
+    @staticmethod
+    def random(
+        rng: np.random.Generator,
+        min_agents: int = 3,
+        max_agents: int = 5,
+        min_capacity: int = 5,
+        max_capacity: int = 10,
+        min_dist: float = 500,
+        max_dist: float = 5000,
+    ) -> "AgentFleet":
+        no_agents = int(rng.integers(min_agents, max_agents))
+        capacities = rng.integers(min_capacity, max_capacity, no_agents)
+        max_dists = rng.uniform(min_dist, max_dist, no_agents)
+        return AgentFleet(np.arange(no_agents), capacities, max_dists)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def nbytes(self) -> int:
+        return self.ids.nbytes + self.capacities.nbytes + self.max_dists.nbytes
+
+    @overload
+    def __getitem__(self, index: int) -> DeliveryAgentInfo: ...
+    @overload
+    def __getitem__(self, index: slice) -> "AgentFleet": ...
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return AgentFleet(
+                self.ids[index], self.capacities[index], self.max_dists[index]
+            )
+        return DeliveryAgentInfo(
+            int(self.ids[index]),
+            int(self.capacities[index]),
+            float(self.max_dists[index]),
+        )
+
+    def __iter__(self) -> Iterator[DeliveryAgentInfo]:
+        for id, capacity, max_dist in zip(
+            self.ids.tolist(), self.capacities.tolist(), self.max_dists.tolist()
+        ):
+            yield DeliveryAgentInfo(id, capacity, max_dist)
+
+    def tolist(self) -> List[DeliveryAgentInfo]:
+        return list(self)
+
+    def table(self) -> np.ndarray:
+        # (agents, 3) table of id, capacity and max distance in the layout of Simulator.simulate_array
+        return np.column_stack([self.ids, self.capacities, self.max_dists]).astype(
+            np.float64
+        )
+
+    def to_dict(self) -> Dict[str, list]:
+        return {
+            "id": self.ids.tolist(),
+            "max_capacity": self.capacities.tolist(),
+            "max_dist": self.max_dists.tolist(),
+        }
+
+
+# Progress callback the iterative solvers accept as the progress option. It is called after every
+# generation or iteration with statistics (iteration, best_parcels, best_distance, improved and
+# solver specific values) and a function that builds the best solution so far. Returning True stops the solver
+Progress = Callable[
+    [Dict[str, Any], Callable[[], Dict[DeliveryAgentInfo, Route]]], bool | None
+]
+
+
 def create_parcels(
     no_of_nodes: int,
     seed: int = 0,
     min_parcels: int = 20,
     max_parcels: int = 50,
-):
-    np.random.seed(seed)
-    # Randomly generate number of parcels
-    no_of_parcels = np.random.randint(min_parcels, max_parcels)
-
-    # Randomly assign parcels to nodes
-    return [Parcel(i, np.random.randint(1, no_of_nodes)) for i in range(no_of_parcels)]
+    rng: np.random.Generator | None = None,
+) -> ParcelSet:
+    # All the randomness comes from rng, which is seeded with seed if it is not given
+    if rng is None:
+        rng = np.random.default_rng(seed)
+    # Randomly generate the parcels in one draw and assign them to nodes
+    return ParcelSet.random(no_of_nodes, rng, min_parcels, max_parcels)
 
 
 def create_agents(
@@ -59,17 +205,12 @@ def create_agents(
     max_capacity: int = 10,
     min_dist: float = 500,
     max_dist: float = 5000,
-):
-    np.random.seed(seed)
-    # Randomly generate number of agents
-    no_agents = np.random.randint(min_agents, max_agents)
-
-    # Randomly assign capacity and max distance to agents
-    return [
-        DeliveryAgentInfo(
-            i,
-            np.random.randint(min_capacity, max_capacity),
-            np.random.uniform(min_dist, max_dist),
-        )
-        for i in range(no_agents)
-    ]
+    rng: np.random.Generator | None = None,
+) -> AgentFleet:
+    # All the randomness comes from rng, which is seeded with seed if it is not given
+    if rng is None:
+        rng = np.random.default_rng(seed)
+    # Randomly generate the agents, with capacities and max distances drawn in one go
+    return AgentFleet.random(
+        rng, min_agents, max_agents, min_capacity, max_capacity, min_dist, max_dist
+    )
@@ -0,0 +1,71 @@
+import math
+from typing import Iterable, List, Sequence
+
+import numpy as np
+
+from common import Location, Parcel
+from node import Graph
+from Simulator import Simulator
+
+
+def step_distances(distances: np.ndarray) -> np.ndarray:
+    # The simulator moves the agents 1 unit per step and carries the rest of the last step of a leg
+    # over to the next one, so a route never costs more steps than the sum of its legs rounded up
+    return np.ceil(distances)
+
+
+def step_budget(max_dist: float) -> float:
+    # An agent stops as soon as it has travelled max_dist, so it has to arrive in fewer steps
+    return float(math.ceil(max_dist) - 1)
+
+
+class DistanceMatrix:
+    def __init__(
+        self,
+        graph: Graph,
+        parcels: List[Parcel],
+        simulator: Simulator | None = None,
+    ):
+        # The warehouse (node 0) followed by every distinct parcel location
+        self.locations = np.array(
+            [0] + sorted({parcel.location for parcel in parcels} - {0}),
+            dtype=np.int32,
+        )
+        # Maps a location to its row and column in the matrix
+        self.index = {
+            int(location): i for i, location in enumerate(self.locations.tolist())
+        }
+
+        # distances[i, j] is the shortest path distance from locations[i] to locations[j]
+        self.distances = np.empty(
+            (len(self.locations), len(self.locations)), np.float32
+        )
+        # next_hops[i, node] is the next node on the shortest path from node to locations[i]
+        self.next_hops = np.empty((len(self.locations), graph.no_of_nodes), np.int32)
+
+        # The shortest paths from each location are found in parallel by the simulator
+        if simulator is None:
+            simulator = Simulator(graph, parcels)
+        simulator.shortest_paths(self.locations, self.distances, self.next_hops)
+
+    def indices(self, locations: Iterable[Location]) -> np.ndarray:
+        return np.fromiter((self.index[location] for location in locations), np.intp)
+
+    def distance(self, start: Location, end: Location) -> float:
+        return float(self.distances[self.index[start], self.index[end]])
+
+    def route_distance(self, locations: Sequence[Location]) -> float:
+        # Total distance of visiting the locations in order
+        indices = self.indices(locations)
+        return float(np.sum(self.distances[indices[:-1], indices[1:]]))
+
+    def path(self, start: Location, end: Location) -> List[int]:
+        # Node ids on the shortest path from start to end, including both
+        next_hops = self.next_hops[self.index[end]]
+        path = [start]
+        while path[-1] != end:
+            node = int(next_hops[path[-1]])
+            if node == -1:
+                raise ValueError(f"There is no path from {start} to {end}")
+            path.append(node)
+        return path
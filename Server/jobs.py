@@ -0,0 +1,255 @@
+import itertools
+import multiprocessing
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Callable, Dict, List
+
+from common import DeliveryAgentInfo, Parcel, Route
+from node import Graph
+import Algos.GA
+
+# Number of solves that run at the same time, each in its own process
+MAX_WORKERS = max(1, (os.cpu_count() or 1) // 2)
+# Number of jobs that can wait for a worker before new jobs are rejected
+MAX_QUEUE_DEPTH = 16
+# Number of finished jobs kept for GET /jobs/{id}, the oldest are forgotten first
+MAX_FINISHED_JOBS = 100
+# Seconds between progress reports and cancellation checks
+PROGRESS_INTERVAL = 0.5
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+
+class QueueFull(Exception):
+    pass
+
+
+def run_job(
+    job_id: int,
+    graph: Graph,
+    delivery_parcels: List[Parcel],
+    delivery_agents: List[DeliveryAgentInfo],
+    options: Dict[str, Any],
+    progress: Any,
+    cancelled: Any,
+) -> Dict[DeliveryAgentInfo, Route] | None:
+    # Runs in a worker process. The GA reports the best solution so far through its progress callback,
+    # which is passed on at most every PROGRESS_INTERVAL seconds and stops the GA when the job is cancelled
+    if cancelled.get(job_id, False):
+        # Cancelled after it was handed to the worker, but before it started
+        return None
+    start = time.monotonic()
+    progress[job_id] = {"iteration": 0, "elapsed": 0.0}
+    last_report = start
+    last_stats: Dict[str, Any] = {}
+
+    def report(stats: Dict[str, Any], solution: Any) -> bool:
+        nonlocal last_report, last_stats
+        now = time.monotonic()
+        last_stats = {**stats, "elapsed": now - start}
+        if now - last_report < PROGRESS_INTERVAL:
+            return False
+        last_report = now
+        progress[job_id] = last_stats
+        return cancelled.get(job_id, False)
+
+    solution = Algos.GA.model(
+        graph, delivery_parcels, delivery_agents, progress=report, **options
+    )
+    if last_stats:
+        progress[job_id] = last_stats
+    return solution
+
+
+class Job:
+    def __init__(
+        self,
+        id: int,
+        scenario: str,
+        graph: Graph,
+        delivery_parcels: List[Parcel],
+        delivery_agents: List[DeliveryAgentInfo],
+        future: Future,
+    ):
+        # Snapshot of the scenario the job solves, used to build the result.
+        # Only requests for the same scenario can see or cancel the job
+        self.id = id
+        self.scenario = scenario
+        self.graph = graph
+        self.delivery_parcels = delivery_parcels
+        self.delivery_agents = delivery_agents
+        self.future = future
+        self.cancelled = False
+        # Whether the job has left the count of unfinished jobs of its manager
+        self.released = False
+        self.created = time.time()
+        self.result: Any = None
+
+
+class JobManager:
+    # Runs solves in a bounded pool of worker processes. Progress and cancellation are shared with
+    # the workers through a manager, both are started when the first job is submitted
+    def __init__(
+        self,
+        max_workers: int = MAX_WORKERS,
+        max_queue_depth: int = MAX_QUEUE_DEPTH,
+        max_finished_jobs: int = MAX_FINISHED_JOBS,
+    ):
+        self.max_workers = max_workers
+        self.max_queue_depth = max_queue_depth
+        self.max_finished_jobs = max_finished_jobs
+        self.jobs: OrderedDict[int, Job] = OrderedDict()
+        self.ids = itertools.count()
+        self.lock = threading.Lock()
+        # Jobs that are queued or running and not cancelled. Cancelling a queued job finishes its future
+        # right away, which can happen with lock held, so the count has its own lock
+        self.unfinished = 0
+        self.count_lock = threading.Lock()
+        self.executor: ProcessPoolExecutor | None = None
+        self.manager: Any = None
+        self.progress: Any = None
+        self.cancelled: Any = None
+
+    def start(self):
+        if self.executor is not None:
+            return
+        # Processes are spawned so that no simulator threads or locks are inherited from the server
+        context = multiprocessing.get_context("spawn")
+        self.manager = context.Manager()
+        self.progress = self.manager.dict()
+        self.cancelled = self.manager.dict()
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.max_workers, mp_context=context
+        )
+
+    def shutdown(self):
+        with self.lock:
+            if self.executor is None:
+                return
+            for job in self.jobs.values():
+                job.future.cancel()
+                self.cancelled[job.id] = True
+            self.executor.shutdown(wait=True, cancel_futures=True)
+            self.manager.shutdown()
+            self.executor = None
+            self.manager = None
+
+    def submit(
+        self,
+        scenario: str,
+        graph: Graph,
+        delivery_parcels: List[Parcel],
+        delivery_agents: List[DeliveryAgentInfo],
+        options: Dict[str, Any],
+    ) -> Job:
+        with self.lock:
+            self.start()
+            if self.queue_depth() >= self.max_queue_depth:
+                raise QueueFull(
+                    f"{self.max_queue_depth} jobs are already waiting for a worker"
+                )
+
+            id = next(self.ids)
+            # Scenarios replace their parcels and agents rather than changing them, so the job
+            # keeps the ones it was submitted with and sends their columns to the worker
+            future = self.executor.submit(  # type: ignore
+                run_job,
+                id,
+                graph,
+                delivery_parcels,
+                delivery_agents,
+                options,
+                self.progress,
+                self.cancelled,
+            )
+            job = Job(id, scenario, graph, delivery_parcels, delivery_agents, future)
+            with self.count_lock:
+                self.unfinished += 1
+            future.add_done_callback(lambda _: self.release(job))
+            self.jobs[id] = job
+            self.forget_finished()
+            return job
+
+    def release(self, job: Job):
+        # A job leaves the count once, when it is cancelled or finishes, whichever comes first
+        with self.count_lock:
+            if not job.released:
+                job.released = True
+                self.unfinished -= 1
+
+    def queue_depth(self) -> int:
+        # Jobs waiting for a worker. When a job starts is only known to the worker, so every
+        # unfinished job beyond one per worker is counted as waiting
+        with self.count_lock:
+            return max(0, self.unfinished - self.max_workers)
+
+    def forget_finished(self):
+        finished = [id for id, job in self.jobs.items() if job.future.done()]
+        for id in finished[: max(0, len(finished) - self.max_finished_jobs)]:
+            del self.jobs[id]
+            self.progress.pop(id, None)
+            self.cancelled.pop(id, None)
+
+    def get(self, id: int, scenario: str) -> Job | None:
+        # Jobs of other scenarios are not found
+        with self.lock:
+            job = self.jobs.get(id)
+            return job if job is not None and job.scenario == scenario else None
+
+    def cancel(self, id: int, scenario: str) -> Job | None:
+        # Queued jobs never run, running jobs stop at their next progress report and keep the best solution so far
+        with self.lock:
+            job = self.jobs.get(id)
+            if job is None or job.scenario != scenario:
+                return None
+            if job.future.done():
+                return job
+            job.cancelled = True
+            self.release(job)
+            if not job.future.cancel():
+                self.cancelled[id] = True
+            return job
+
+    def status(
+        self,
+        job: Job,
+        build_result: Callable[
+            [Graph, List[Parcel], Dict[DeliveryAgentInfo, Route]], Any
+        ],
+    ) -> Dict[str, Any]:
+        # The result is built once, in the shape of the /simulate response, the first time it is asked for
+        future = job.future
+        progress = self.progress.get(job.id) if self.progress is not None else None
+        error = None
+        if future.cancelled():
+            state = CANCELLED
+        elif future.done():
+            if future.exception() is not None:
+                state = FAILED
+                error = repr(future.exception())
+            else:
+                state = CANCELLED if job.cancelled else DONE
+                if job.result is None and future.result() is not None:
+                    job.result = build_result(
+                        job.graph, job.delivery_parcels, future.result()
+                    )
+        elif progress is not None:
+            state = RUNNING
+        else:
+            state = CANCELLED if job.cancelled else QUEUED
+
+        return {
+            "id": job.id,
+            "status": state,
+            "created": job.created,
+            "progress": progress,
+            "error": error,
+            "result": job.result,
+        }
@@ -1,22 +1,54 @@
-from typing import List
-from fastapi import FastAPI, HTTPException
+import asyncio
+import json
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Iterator, List, Tuple
+from fastapi import Depends, FastAPI, Header, HTTPException
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
-from Server.simulate import get_route
-from common import DeliveryAgentInfo, Parcel, Route, create_agents, create_parcels
-from node import Node, NodeOptions
+from fastapi.responses import Response, StreamingResponse
+from common import (
+    AgentFleet,
+    DeliveryAgentInfo,
+    Parcel,
+    ParcelSet,
+    Route,
+    create_agents,
+    create_parcels,
+)
+from distances import DistanceMatrix
+from jobs import JobManager, QueueFull
+from node import Graph, Node, NodeOptions
+from scenarios import DEFAULT_SCENARIO, Scenario, ScenarioStore
+from serialization import ENCODERS, TABLE_FORMATS, EncodedMap, encode_table
+from spatial import LOD_PIXELS
 import logging
 import uvicorn
 from Simulator import Simulator
 import Algos.GA
 
-user_parcels: List[Parcel] = []
-user_agents: List[DeliveryAgentInfo] = []
-root_node: None | Node = None
-no_of_nodes: int | None = None
+# The map, parcels and agents of every session, selected by the X-Scenario-Id header
+scenario_store = ScenarioStore()
+# Solves submitted through /jobs. The worker processes are started by the first job
+job_manager = JobManager()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    job_manager.shutdown()
 
-app = FastAPI()
+
+app = FastAPI(lifespan=lifespan)
 logger = logging.getLogger("uvicorn")
 
+
+def get_scenario(x_scenario_id: str = Header(DEFAULT_SCENARIO)) -> Iterator[Scenario]:
+    with scenario_store.use(x_scenario_id) as scenario:
+        yield scenario
+
+
 origins = ["*"]
 app.add_middleware(
     CORSMiddleware,
@@ -27,14 +59,46 @@ app.add_middleware(
 )
 
 
-def serialize(node: Node):
-    all_nodes = node.get_all_nodes(set())
-    nodes = []
-    for node in all_nodes:
-        n = Node(node.x, node.y, node.color, node.id)
-        n.neighbours = [n.id for n in node.neighbours]  # type: ignore
-        nodes.append(n)
-    return nodes
+# Latency ceiling of /simulate in seconds, and the number of generations without improvement before it returns early
+SOLVER_TIME_LIMIT = 30
+SOLVER_STAGNATION_LIMIT = 100
+# Seconds a client should wait before submitting again when the job queue is full
+JOB_RETRY_AFTER = 5
+# Minimum seconds between two best-so-far solutions sent by /simulate/stream
+STREAM_INTERVAL = 0.5
+
+
+def accepts_gzip(accept_encoding: str | None) -> bool:
+    return accept_encoding is not None and "gzip" in accept_encoding
+
+
+def map_response(
+    encoded: EncodedMap,
+    if_none_match: str | None = None,
+    accept_encoding: str | None = None,
+) -> Response:
+    # Clients revalidate with the ETag on every request and get a 304 while the map is unchanged.
+    # The gzip body should already be built by Scenario.get_encoded_map when it is accepted
+    use_gzip = accepts_gzip(accept_encoding)
+    etag = encoded.gzip_etag if use_gzip else encoded.etag
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if encoded.matches(if_none_match):
+        return Response(status_code=304, headers=headers)
+    if use_gzip:
+        headers["Content-Encoding"] = "gzip"
+        return Response(
+            encoded.get_gzip_body(), media_type=encoded.media_type, headers=headers
+        )
+    return Response(encoded.body, media_type=encoded.media_type, headers=headers)
+
+
+def table_response(table: ParcelSet | AgentFleet, format: str = "json") -> Response:
+    # Parcels and agents as a list of objects, or as one array per field with the columnar format
+    if format not in TABLE_FORMATS:
+        raise HTTPException(
+            400, detail=f"Unknown format, expected one of {list(TABLE_FORMATS)}"
+        )
+    return Response(encode_table(table, format), media_type="application/json")
 
 
 # TODO: Parcel Options Sidebar
@@ -45,9 +109,8 @@ def serialize(node: Node):
 
 
 @app.get("/parcels")
-def get_parcels():
-    global user_parcels
-    return user_parcels
+def get_parcels(format: str = "json", scenario: Scenario = Depends(get_scenario)):
+    return table_response(scenario.parcels, format)
 
 
 @app.post("/parcels")
@@ -55,20 +118,27 @@ def reroll_parcels(
     seed: int = 0,
     min_parcels: int = 20,
     max_parcels: int = 50,
+    scenario: Scenario = Depends(get_scenario),
 ):
-    global user_parcels, no_of_nodes
-    if no_of_nodes is None:
-        raise HTTPException(400, detail="Initialize Map First")
+    with scenario.lock:
+        if scenario.no_of_nodes is None:
+            raise HTTPException(400, detail="Initialize Map First")
 
-    user_parcels = create_parcels(no_of_nodes, seed, min_parcels, max_parcels)
-    return user_parcels
+        scenario.set_parcels(
+            create_parcels(scenario.no_of_nodes, seed, min_parcels, max_parcels)
+        )
+        return table_response(scenario.parcels)
 
 
 @app.put("/parcels")
-def update_parcel(parcels: List[Parcel]):
-    global user_parcels
-    user_parcels = [Parcel(i, parcel.location) for i, parcel in enumerate(parcels)]
-    return user_parcels
+def update_parcel(parcels: List[Parcel], scenario: Scenario = Depends(get_scenario)):
+    with scenario.lock:
+        scenario.set_parcels(
+            ParcelSet.from_parcels(
+                [Parcel(i, parcel.location) for i, parcel in enumerate(parcels)]
+            )
+        )
+        return table_response(scenario.parcels)
 
 
 # TODO: Agent Options Sidebar
@@ -78,9 +148,8 @@ def update_parcel(parcels: List[Parcel]):
 
 
 @app.get("/agents")
-def get_agents():
-    global user_agents
-    return user_agents
+def get_agents(format: str = "json", scenario: Scenario = Depends(get_scenario)):
+    return table_response(scenario.agents, format)
 
 
 @app.post("/agents")
@@ -92,9 +161,9 @@ def reroll_agents(
     max_capacity: int = 10,
     min_dist: float = 500,
     max_dist: float = 5000,
+    scenario: Scenario = Depends(get_scenario),
 ):
-    global user_agents
-    user_agents = create_agents(
+    agents = create_agents(
         seed,
         min_agents,
         max_agents,
@@ -103,17 +172,25 @@ def reroll_agents(
         min_dist,
         max_dist,
     )
-    return user_agents
+    with scenario.lock:
+        scenario.set_agents(agents)
+        return table_response(scenario.agents)
 
 
 @app.put("/agents")
-def update_agents(agents: List[DeliveryAgentInfo]):
-    global user_agents
-    user_agents = [
-        DeliveryAgentInfo(i, agent.max_capacity, agent.max_dist)
-        for i, agent in enumerate(agents)
-    ]
-    return user_agents
+def update_agents(
+    agents: List[DeliveryAgentInfo], scenario: Scenario = Depends(get_scenario)
+):
+    with scenario.lock:
+        scenario.set_agents(
+            AgentFleet.from_agents(
+                [
+                    DeliveryAgentInfo(i, agent.max_capacity, agent.max_dist)
+                    for i, agent in enumerate(agents)
+                ]
+            )
+        )
+        return table_response(scenario.agents)
 
 
 # TODO: Map Options Sidebar
@@ -122,11 +199,64 @@ def update_agents(agents: List[DeliveryAgentInfo]):
 
 
 @app.get("/map")
-def get_map():
-    global no_of_nodes, root_node
-    if root_node is None or no_of_nodes is None:
-        return {"no_of_nodes": 0, "nodes": None}
-    return {"no_of_nodes": no_of_nodes, "nodes": serialize(root_node)}
+def get_map(
+    format: str = "json",
+    if_none_match: str | None = Header(None),
+    accept_encoding: str | None = Header(None),
+    scenario: Scenario = Depends(get_scenario),
+):
+    # The map is encoded once per map and format, see serialization.ENCODERS for the formats
+    if format not in ENCODERS:
+        raise HTTPException(
+            400, detail=f"Unknown map format, expected one of {list(ENCODERS)}"
+        )
+    with scenario.lock:
+        if scenario.graph is None:
+            return {"no_of_nodes": 0, "nodes": None}
+        encoded = scenario.get_encoded_map(format, accepts_gzip(accept_encoding))
+    return map_response(encoded, if_none_match, accept_encoding)
+
+
+@app.get("/map/viewport")
+def get_viewport(
+    x0: float,
+    y0: float,
+    x1: float,
+    y1: float,
+    width: int | None = None,
+    scenario: Scenario = Depends(get_scenario),
+):
+    # Nodes and edges inside the rectangle from (x0, y0) to (x1, y1) in columnar form, the edges are
+    # pairs of node ids. width is the width of the viewport in pixels, nodes closer than LOD_PIXELS
+    # pixels are merged. Without it the full detail is returned
+    if x1 < x0 or y1 < y0:
+        raise HTTPException(400, detail="x1 and y1 should not be less than x0 and y0")
+    if width is not None and width <= 0:
+        raise HTTPException(400, detail="width should be positive")
+    with scenario.lock:
+        if scenario.graph is None:
+            raise HTTPException(400, detail="Initialize Map First")
+        index = scenario.get_spatial_index()
+
+    resolution = 0.0 if width is None else (x1 - x0) / width * LOD_PIXELS
+    return {"resolution": resolution, **index.viewport(x0, y0, x1, y1, resolution)}
+
+
+@app.get("/map/nearest")
+def get_nearest(x: float, y: float, scenario: Scenario = Depends(get_scenario)):
+    # The node closest to a point, used to pick locations on the map
+    with scenario.lock:
+        if scenario.graph is None:
+            raise HTTPException(400, detail="Initialize Map First")
+        index = scenario.get_spatial_index()
+
+    id, distance = index.nearest(x, y)
+    return {
+        "id": id,
+        "x": float(index.x[id]),
+        "y": float(index.y[id]),
+        "distance": distance,
+    }
 
 
 @app.post("/map")
@@ -144,10 +274,18 @@ def create_map(
     max_depth: int = 6,
     merge_distance: int = 30,
     return_angle_range: int = 60,
+    format: str = "json",
+    accept_encoding: str | None = Header(None),
+    scenario: Scenario = Depends(get_scenario),
 ):
-    global root_node, no_of_nodes
+    if format not in ENCODERS:
+        raise HTTPException(
+            400, detail=f"Unknown map format, expected one of {list(ENCODERS)}"
+        )
+
+    # Only the compact graph is kept, the nodes are not needed after it is built
     root_node = Node(0, 0, (0, 0, 0), 0)
-    no_of_nodes = root_node.create(
+    root_node.create(
         NodeOptions(
             seed=seed,
             root_splits=root_splits,
@@ -164,7 +302,11 @@ def create_map(
             return_angle_range=return_angle_range,
         )
     )
-    return {"no_of_nodes": no_of_nodes, "nodes": serialize(root_node)}
+    graph = root_node.to_graph()
+    with scenario.lock:
+        scenario.set_map(graph)
+        encoded = scenario.get_encoded_map(format, accepts_gzip(accept_encoding))
+    return map_response(encoded, accept_encoding=accept_encoding)
 
 
 # TODO:
@@ -194,66 +336,241 @@ def sanitize_path(ro: List[int]):
     return path
 
 
-def get_path(ro: List[Parcel | None]):
-    global root_node
-    path = []
-    if root_node is None:
-        raise HTTPException(400, detail="Initialize Map First")
-    node = root_node
+def get_path(ro: List[Parcel | None], distances: DistanceMatrix):
+    # Follow the same legs as the simulator. The route starts at the warehouse and None returns to it
+    path = [0]
+    location = 0
 
-    for r in ro:
-        if r is None:
-            continue
-        p, node = get_route(node, r.location)
-        p.reverse()
-        path.extend(p)
+    for r in ro[1:]:
+        target = 0 if r is None else r.location
+        path.extend(distances.path(location, target))
+        location = target
 
     return sanitize_path(path)
 
 
-@app.get("/simulate")
-def simulate():
-    logger.info("Simulating")
-
-    global user_agents, user_parcels, root_node
-
-    if root_node is None:
-        raise HTTPException(400, detail="Initialize Map First")
-    elif len(user_agents) == 0:
-        raise HTTPException(400, detail="Initialize User Agents First")
-    elif len(user_parcels) == 0:
-        raise HTTPException(400, detail="Initialize User Parcels First")
-    else:
-        route = test_algos.GA.model(
-            root_node,
-            user_parcels,
-            user_agents,
-        )
-        simulator = Simulator(root_node, user_parcels)
-        allocations = [{a: r.get_allocation() for a, r in route.items()}]
-        _, total_parcels, total_distance = simulator.simulate(allocations)[0]
-        agent_results = simulator.get_agent_results(0)
-
-        return {
-            "summary": {
-                "total_distance": total_distance,
-                "total_parcels": total_parcels,
-            },
-            "per_agent": [
-                {
-                    "agent": a,
-                    "route": sanitize_route(r.route),
-                    "path": get_path(r.route),
-                    "performance": {
+def simulation_result(
+    graph: Graph,
+    parcels: List[Parcel],
+    route: Dict[DeliveryAgentInfo, Route],
+    simulator: Simulator | None = None,
+    distances: DistanceMatrix | None = None,
+):
+    # Simulates the routes and returns the summary, routes and paths of every agent.
+    # The simulator and distances can be reused when the same parcels are simulated repeatedly
+    if simulator is None:
+        simulator = Simulator(graph, parcels)
+    if distances is None:
+        distances = DistanceMatrix(graph, parcels, simulator)
+    allocations = [{a: r.get_allocation() for a, r in route.items()}]
+    _, total_parcels, total_distance = simulator.simulate(allocations)[0]
+    agent_results = simulator.get_agent_results(0)
+
+    return {
+        "summary": {
+            "total_distance": total_distance,
+            "total_parcels": total_parcels,
+        },
+        "per_agent": [
+            {
+                "agent": a,
+                "route": sanitize_route(r.route),
+                "path": get_path(r.route, distances),
+                "performance": (
+                    {
                         "parcels_delivered": ar[1],
                         "distance_travelled": ar[2],
                     }
                     if ar[0]
-                    else None,
-                }
-                for (a, r), ar in zip(route.items(), agent_results)
-            ],
-        }
+                    else None
+                ),
+            }
+            for (a, r), ar in zip(route.items(), agent_results)
+        ],
+    }
+
+
+def snapshot(scenario: Scenario) -> Tuple[Graph, ParcelSet, AgentFleet]:
+    # The map, parcels and agents to solve. They are never changed in place, so the solve
+    # can run without holding the lock of the scenario
+    with scenario.lock:
+        if scenario.graph is None:
+            raise HTTPException(400, detail="Initialize Map First")
+        elif len(scenario.agents) == 0:
+            raise HTTPException(400, detail="Initialize User Agents First")
+        elif len(scenario.parcels) == 0:
+            raise HTTPException(400, detail="Initialize User Parcels First")
+        return scenario.graph, scenario.parcels, scenario.agents
+
+
+def snapshot_distances(
+    scenario: Scenario, graph: Graph, parcels: ParcelSet
+) -> DistanceMatrix:
+    # The shortest paths of a snapshot are only read, so the solver can share them with the scenario
+    with scenario.lock:
+        if scenario.is_current(graph, parcels):
+            return scenario.get_distances()
+    return DistanceMatrix(graph, parcels)
+
+
+def scenario_result(
+    scenario: Scenario,
+    graph: Graph,
+    parcels: ParcelSet,
+    route: Dict[DeliveryAgentInfo, Route],
+    distances: DistanceMatrix,
+):
+    # The simulator of the scenario keeps the results of the last simulation, so it is only used
+    # under the lock, and only if the scenario did not change during the solve
+    with scenario.lock:
+        if scenario.is_current(graph, parcels):
+            return simulation_result(
+                graph, parcels, route, scenario.get_simulator(), distances
+            )
+    return simulation_result(graph, parcels, route, distances=distances)
+
+
+@app.get("/simulate")
+def simulate(seed: int | None = None, scenario: Scenario = Depends(get_scenario)):
+    # The seed makes the solve repeatable, up to where the time limit stops it
+    logger.info("Simulating")
+
+    graph, parcels, agents = snapshot(scenario)
+    distances = snapshot_distances(scenario, graph, parcels)
+    route = Algos.GA.model(
+        graph,
+        parcels,
+        agents,
+        seed=seed,
+        time_limit=SOLVER_TIME_LIMIT,
+        stagnation_limit=SOLVER_STAGNATION_LIMIT,
+        distances=distances,
+    )
+    return scenario_result(scenario, graph, parcels, route, distances)
+
+
+@app.get("/simulate/stream")
+async def simulate_stream(
+    seed: int | None = None,
+    time_limit: float = SOLVER_TIME_LIMIT,
+    stagnation_limit: int = SOLVER_STAGNATION_LIMIT,
+    x_scenario_id: str = Header(DEFAULT_SCENARIO),
+):
+    # Server-sent events of the best solution so far, at most every STREAM_INTERVAL seconds,
+    # followed by the final result. Closing the stream stops the solve
+    with scenario_store.use(x_scenario_id) as scenario:
+        scenario_graph, parcels, agents = snapshot(scenario)
+        distances = snapshot_distances(scenario, scenario_graph, parcels)
+    logger.info("Simulating with progress")
+
+    loop = asyncio.get_running_loop()
+    events: asyncio.Queue = asyncio.Queue()
+    stop = threading.Event()
+
+    def send(event: str | None, data: Any = None):
+        loop.call_soon_threadsafe(events.put_nowait, (event, data))
+
+    def solve():
+        last_sent = 0.0
+        # An improvement that came too soon after the last one sent, it is sent on the first
+        # progress call once STREAM_INTERVAL has passed, with the best solution at that time
+        pending = False
+
+        def progress(stats: Dict[str, Any], solution: Any) -> bool:
+            nonlocal last_sent, pending
+            if stop.is_set():
+                return True
+            pending = pending or stats["improved"]
+            now = time.monotonic()
+            if pending and now - last_sent >= STREAM_INTERVAL:
+                last_sent = now
+                pending = False
+                stats = {**stats, "improved": True}
+                result = scenario_result(
+                    scenario, scenario_graph, parcels, solution(), distances
+                )
+                send("progress", {"stats": stats, **result})
+            return False
+
+        try:
+            route = Algos.GA.model(
+                scenario_graph,
+                parcels,
+                agents,
+                seed=seed,
+                time_limit=time_limit,
+                stagnation_limit=stagnation_limit,
+                progress=progress,
+                distances=distances,
+            )
+            send(
+                "result",
+                scenario_result(scenario, scenario_graph, parcels, route, distances),
+            )
+        except Exception as e:
+            logger.exception("Streaming simulation failed")
+            send("error", {"detail": repr(e)})
+        finally:
+            send(None)
+
+    async def stream():
+        try:
+            while True:
+                event, data = await events.get()
+                if event is None:
+                    break
+                yield f"event: {event}\ndata: {json.dumps(jsonable_encoder(data))}\n\n"
+        finally:
+            stop.set()
+
+    threading.Thread(target=solve, daemon=True).start()
+    return StreamingResponse(stream(), media_type="text/event-stream")
+
+
+@app.post("/jobs", status_code=202)
+def submit_job(
+    seed: int | None = None,
+    time_limit: float = SOLVER_TIME_LIMIT,
+    stagnation_limit: int = SOLVER_STAGNATION_LIMIT,
+    scenario: Scenario = Depends(get_scenario),
+):
+    # Solves a snapshot of the current map, parcels and agents in a worker process
+    graph, parcels, agents = snapshot(scenario)
+    try:
+        job = job_manager.submit(
+            scenario.id,
+            graph,
+            parcels,
+            agents,
+            {
+                "seed": seed,
+                "time_limit": time_limit,
+                "stagnation_limit": stagnation_limit,
+            },
+        )
+    except QueueFull as e:
+        raise HTTPException(
+            503, detail=str(e), headers={"Retry-After": str(JOB_RETRY_AFTER)}
+        )
+    logger.info(f"Queued job {job.id}")
+    return job_manager.status(job, simulation_result)
+
+
+@app.get("/jobs/{id}")
+def get_job(id: int, x_scenario_id: str = Header(DEFAULT_SCENARIO)):
+    # Jobs are only visible to the scenario that submitted them
+    job = job_manager.get(id, x_scenario_id)
+    if job is None:
+        raise HTTPException(404, detail="Unknown Job")
+    return job_manager.status(job, simulation_result)
+
+
+@app.delete("/jobs/{id}")
+def cancel_job(id: int, x_scenario_id: str = Header(DEFAULT_SCENARIO)):
+    job = job_manager.cancel(id, x_scenario_id)
+    if job is None:
+        raise HTTPException(404, detail="Unknown Job")
+    return job_manager.status(job, simulation_result)
 
 
 if __name__ == "__main__":
@@ -42,13 +42,15 @@ class Node:
         self.neighbours: List[Node] = []
         self.bbox = None
 
-    def create(self, opts: NodeOptions) -> int:
-        np.random.seed(opts.seed)
+    def create(self, opts: NodeOptions, rng: np.random.Generator | None = None) -> int:
+        # All the randomness comes from rng, which is seeded with opts.seed if it is not given
+        if rng is None:
+            rng = np.random.default_rng(opts.seed)
         no_of_nodes = 0
 
         for i in range(opts.root_splits):
             # Choose a random distance
-            distance = np.random.randint(opts.min_dist, opts.max_dist)
+            distance = rng.integers(opts.min_dist, opts.max_dist)
             # Equally distribute the branches around the root node
             dir = i * 360 / opts.root_splits
 
@@ -57,11 +59,7 @@ class Node:
             y = self.y + distance * np.sin(np.radians(dir))
 
             # Generate a random color
-            color = (
-                np.random.randint(0, 255),
-                np.random.randint(0, 255),
-                np.random.randint(0, 255),
-            )
+            color = tuple(rng.integers(0, 255, 3).tolist())
 
             # Create a new node
             no_of_nodes += 1
@@ -70,10 +68,10 @@ class Node:
             node.__add_neighbours(self)
 
             # Create a branch
-            no_of_nodes = node.__create_branch(dir, opts, 0, no_of_nodes, self)
+            no_of_nodes = node.__create_branch(dir, opts, no_of_nodes, self, rng)
 
         # Calculate the bounding box for the graph
-        self.bbox = self.__find_bbox(set())
+        self.bbox = self.__find_bbox()
         # Return the number of nodes created. +1 is added to include the root node
         return no_of_nodes + 1
 
@@ -88,121 +86,132 @@ class Node:
         self,
         dir: float,
         opts: NodeOptions,
-        depth: int,
         no_of_nodes: int,
         root: Self,
+        rng: np.random.Generator,
     ) -> int:
-        if depth >= opts.max_depth or np.random.rand() < opts.turn_around_chance:
-            if depth >= opts.min_depth:
-                # Return to the root node
-                current = self
-
-                # Check if the distance between the current node and the root node is greater than the maximum distance
-                while current.simple_distance(root) > opts.max_dist:  # type: ignore
-                    distance = np.random.randint(opts.min_dist, opts.max_dist)
-                    # Calculate the direction to the root node
-                    dir = np.rad2deg(
-                        np.arctan2((root.y - current.y), (root.x - current.x))
-                    )
-                    # Add some randomness to the direction
-                    dir += np.random.randint(
-                        -opts.return_angle_range, opts.return_angle_range
-                    )
-
-                    # Calculate the new position
-                    x = current.x + distance * np.cos(np.radians(dir))
-                    y = current.y + distance * np.sin(np.radians(dir))
+        # Branches are grown depth first with an explicit stack instead of recursion.
+        # Each entry is (node, dir, depth, next_split, no_of_splits). Entries with no_of_splits > 0
+        # are splits that still have to create the branch at next_split. The random numbers are drawn
+        # in the same order as growing each branch to the end before starting the next one.
+        stack: List[Tuple[Node, float, int, int, int]] = [(self, dir, 0, 0, 0)]
 
-                    # Create a new node
-                    no_of_nodes += 1
-                    new = Node(x, y, current.color, no_of_nodes)
+        while stack:
+            current, dir, depth, split, no_of_splits = stack.pop()
 
-                    # Add the new node to the neighbours of the current node
-                    new.__add_neighbours(current)
-                    current = new
-
-                # Since the current node is now within the maximum distance from the root node, connect it to the root node
-                root.__add_neighbours(current)  # type: ignore
-                return no_of_nodes
-
-        # Check if the current node should split
-        if np.random.rand() < opts.split_chance:
-            # Choose a random number of splits
-            no_of_splits = np.random.randint(opts.min_split, opts.max_split)
-            for i in range(no_of_splits):
+            if no_of_splits > 0:
                 # Choose a random distance and direction
-                distance = np.random.randint(opts.min_dist, opts.max_dist)
-                dir += np.random.randint(-opts.angle_range, opts.angle_range)
+                distance = rng.integers(opts.min_dist, opts.max_dist)
+                dir += rng.integers(-opts.angle_range, opts.angle_range)
 
                 # Calculate the new position
-                x = self.x + distance * np.cos(np.radians(dir))
-                y = self.y + distance * np.sin(np.radians(dir))
+                x = current.x + distance * np.cos(np.radians(dir))
+                y = current.y + distance * np.sin(np.radians(dir))
 
                 # Generate a random color. One of the branches will have the same color as the current node
                 color = (
-                    self.color
-                    if i == 0
-                    else (
-                        np.random.randint(0, 255),
-                        np.random.randint(0, 255),
-                        np.random.randint(0, 255),
-                    )
+                    current.color
+                    if split == 0
+                    else tuple(rng.integers(0, 255, 3).tolist())
                 )
 
                 # Create a new node
                 no_of_nodes += 1
                 node = Node(x, y, color, no_of_nodes)
-                node.__add_neighbours(self)
+                node.__add_neighbours(current)
 
-                # Create a branch
-                no_of_nodes = node.__create_branch(
-                    dir, opts, depth + 1, no_of_nodes, root
-                )
-            return no_of_nodes
+                # The remaining splits are continued after the new branch is finished
+                if split + 1 < no_of_splits:
+                    stack.append((current, dir, depth, split + 1, no_of_splits))
+                stack.append((node, dir, depth + 1, 0, 0))
+                continue
+
+            if depth >= opts.max_depth or rng.random() < opts.turn_around_chance:
+                if depth >= opts.min_depth:
+                    # Return to the root node
+                    no_of_nodes = current.__return_to_root(opts, no_of_nodes, root, rng)
+                    continue
 
-        else:
-            # Choose a random distance and direction
-            distance = np.random.randint(opts.min_dist, opts.max_dist)
-            dir += np.random.randint(-opts.angle_range, opts.angle_range)
+            # Check if the current node should split
+            if rng.random() < opts.split_chance:
+                # Choose a random number of splits
+                no_of_splits = rng.integers(opts.min_split, opts.max_split)
+                if no_of_splits > 0:
+                    stack.append((current, dir, depth, 0, no_of_splits))
+
+            else:
+                # Choose a random distance and direction
+                distance = rng.integers(opts.min_dist, opts.max_dist)
+                dir += rng.integers(-opts.angle_range, opts.angle_range)
+
+                # Calculate the new position
+                x = current.x + distance * np.cos(np.radians(dir))
+                y = current.y + distance * np.sin(np.radians(dir))
+
+                # Create a new node
+                no_of_nodes += 1
+                node = Node(x, y, current.color, no_of_nodes)
+                node.__add_neighbours(current)
+
+                stack.append((node, dir, depth + 1, 0, 0))
+
+        return no_of_nodes
+
+    def __return_to_root(
+        self,
+        opts: NodeOptions,
+        no_of_nodes: int,
+        root: Self,
+        rng: np.random.Generator,
+    ) -> int:
+        current = self
+
+        # Check if the distance between the current node and the root node is greater than the maximum distance
+        while current.simple_distance(root) > opts.max_dist:  # type: ignore
+            distance = rng.integers(opts.min_dist, opts.max_dist)
+            # Calculate the direction to the root node
+            dir = np.rad2deg(np.arctan2((root.y - current.y), (root.x - current.x)))
+            # Add some randomness to the direction
+            dir += rng.integers(-opts.return_angle_range, opts.return_angle_range)
 
             # Calculate the new position
-            x = self.x + distance * np.cos(np.radians(dir))
-            y = self.y + distance * np.sin(np.radians(dir))
+            x = current.x + distance * np.cos(np.radians(dir))
+            y = current.y + distance * np.sin(np.radians(dir))
 
             # Create a new node
             no_of_nodes += 1
-            node = Node(x, y, self.color, no_of_nodes)
-            node.__add_neighbours(self)
-
-            return node.__create_branch(dir, opts, depth + 1, no_of_nodes, root)
+            new = Node(x, y, current.color, no_of_nodes)
 
-    def __find_bbox(
-        self, visited: Set[Self], rect: List[float] = [0, 0, 0, 0]
-    ) -> List[float]:
-        visited.add(self)
-        # Find the bounding box for the graph
-        for neighbour in self.neighbours:
-            if neighbour in visited:
-                continue
-            rect = neighbour.__find_bbox(visited, rect)  # type: ignore
+            # Add the new node to the neighbours of the current node
+            new.__add_neighbours(current)
+            current = new
 
-            if neighbour.x < rect[0]:
-                rect[0] = neighbour.x
-            if neighbour.x > rect[2]:
-                rect[2] = neighbour.x
+        # Since the current node is now within the maximum distance from the root node, connect it to the root node
+        root.__add_neighbours(current)  # type: ignore
+        return no_of_nodes
 
-            if neighbour.y < rect[1]:
-                rect[1] = neighbour.y
-            if neighbour.y > rect[3]:
-                rect[3] = neighbour.y
+    def __find_bbox(self) -> List[float]:
+        # Find the bounding box for the graph. The rectangle starts at the origin
+        rect = [0.0, 0.0, 0.0, 0.0]
+        for node in self.get_all_nodes(set()):
+            if node is self:
+                continue
+            rect[0] = min(rect[0], node.x)
+            rect[1] = min(rect[1], node.y)
+            rect[2] = max(rect[2], node.x)
+            rect[3] = max(rect[3], node.y)
         return rect
 
     def get_all_nodes(self, visited: Set[Self]) -> Set[Self]:
+        stack = [self]
         visited.add(self)
-        for neighbour in self.neighbours:
-            if neighbour in visited:
-                continue
-            neighbour.get_all_nodes(visited)  # type: ignore
+        while stack:
+            node = stack.pop()
+            for neighbour in node.neighbours:
+                if neighbour in visited:
+                    continue
+                visited.add(neighbour)
+                stack.append(neighbour)
         return visited
 
     def deepcopy(self, visited: Dict[int, Self]) -> Self:
@@ -212,8 +221,18 @@ class Node:
         copy = Node(self.x, self.y, self.color, self.id)
         visited[self.id] = copy  # type: ignore
 
-        for neighbour in self.neighbours:
-            copy.neighbours.append(neighbour.deepcopy(visited))  # type: ignore
+        # Copy the nodes and their neighbours in the order they are found
+        stack: List[Node] = [self]
+        while stack:
+            node = stack.pop()
+            node_copy = visited[node.id]
+            for neighbour in node.neighbours:
+                if neighbour.id not in visited:
+                    visited[neighbour.id] = Node(  # type: ignore
+                        neighbour.x, neighbour.y, neighbour.color, neighbour.id
+                    )
+                    stack.append(neighbour)
+                node_copy.neighbours.append(visited[neighbour.id])
 
         return copy  # type: ignore
 
@@ -226,3 +245,66 @@ class Node:
 
     def simple_distance(self, end: Self) -> float:
         return np.sqrt((self.x - end.x) ** 2 + (self.y - end.y) ** 2)
+
+    def to_graph(self) -> "Graph":
+        return Graph.from_node(self)
+
+
+@dataclass
+class Graph:
+    # Compact array representation of a map. Nodes are indexed by their id.
+    # Coordinates and colors of the nodes
+    x: np.ndarray
+    y: np.ndarray
+    color: np.ndarray
+    # The neighbours of node i are neighbours[offsets[i]:offsets[i + 1]]
+    offsets: np.ndarray
+    neighbours: np.ndarray
+    # Length of each edge in neighbours
+    lengths: np.ndarray
+
+    @property
+    def no_of_nodes(self) -> int:
+        return len(self.x)
+
+    def get_neighbours(self, id: int) -> np.ndarray:
+        return self.neighbours[self.offsets[id] : self.offsets[id + 1]]
+
+    @staticmethod
+    def from_node(root: Node) -> "Graph":
+        # Collect all the nodes connected to the root node
+        nodes: Dict[int, Node] = {root.id: root}
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            for neighbour in node.neighbours:
+                if neighbour.id not in nodes:
+                    nodes[neighbour.id] = neighbour
+                    stack.append(neighbour)
+
+        no_of_nodes = len(nodes)
+        if root.id != 0 or any(id not in nodes for id in range(no_of_nodes)):
+            raise ValueError("Node ids should go from 0 to the number of nodes - 1")
+
+        ordered = [nodes[id] for id in range(no_of_nodes)]
+        x = np.fromiter((node.x for node in ordered), np.float64, no_of_nodes)
+        y = np.fromiter((node.y for node in ordered), np.float64, no_of_nodes)
+        color = np.array([node.color for node in ordered], np.uint8).reshape(-1, 3)
+
+        offsets = np.zeros(no_of_nodes + 1, np.int32)
+        np.cumsum([len(node.neighbours) for node in ordered], out=offsets[1:])
+        neighbours = np.fromiter(
+            (neighbour.id for node in ordered for neighbour in node.neighbours),
+            np.int32,
+            offsets[-1],
+        )
+
+        # Edge lengths are calculated in single precision, the same as the simulator
+        sources = np.repeat(np.arange(no_of_nodes), np.diff(offsets))
+        x32 = x.astype(np.float32)
+        y32 = y.astype(np.float32)
+        dx = x32[neighbours] - x32[sources]
+        dy = y32[neighbours] - y32[sources]
+        lengths = np.sqrt(dx * dx + dy * dy)
+
+        return Graph(x, y, color, offsets, neighbours, lengths)
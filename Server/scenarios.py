@@ -0,0 +1,190 @@
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Iterator
+
+from common import AgentFleet, ParcelSet
+from distances import DistanceMatrix
+from node import Graph
+from serialization import EncodedMap
+from spatial import SpatialIndex
+from Simulator import Simulator
+
+# Scenario used by clients that do not send a scenario id
+DEFAULT_SCENARIO = "default"
+# Approximate memory all the scenarios may use, and the number of scenarios kept.
+# The least recently used idle scenarios are evicted first when either is exceeded
+MAX_MEMORY = 1 << 30
+MAX_SCENARIOS = 256
+
+
+class Scenario:
+    # The map, parcels and agents of one session. lock guards the state and the shared simulator,
+    # which keeps the results of the last simulation. The simulator, the shortest paths between
+    # the parcel locations, the encoded map and the spatial index of the map are built when first
+    # needed and kept until the map or the parcels change. memory is measured again, under the lock,
+    # whenever one of them is built or dropped
+    def __init__(self, id: str):
+        self.id = id
+        self.lock = threading.RLock()
+        self.graph: Graph | None = None
+        self.parcels = ParcelSet.from_parcels([])
+        self.agents = AgentFleet.from_agents([])
+        self.simulator: Simulator | None = None
+        self.distances: DistanceMatrix | None = None
+        # Encodings of the map by format
+        self.encoded_maps: Dict[str, EncodedMap] = {}
+        self.spatial_index: SpatialIndex | None = None
+        # Number of requests using the scenario, scenarios in use are never evicted
+        self.users = 0
+        # Approximate bytes held by the scenario, and the part of it the store has counted
+        self.memory = 0
+        self.counted = 0
+
+    @property
+    def no_of_nodes(self) -> int | None:
+        return None if self.graph is None else self.graph.no_of_nodes
+
+    def set_map(self, graph: Graph):
+        self.graph = graph
+        self.simulator = None
+        self.distances = None
+        self.encoded_maps = {}
+        self.spatial_index = None
+        self.measure()
+
+    def set_parcels(self, parcels: ParcelSet):
+        self.parcels = parcels
+        self.simulator = None
+        self.distances = None
+        self.measure()
+
+    def set_agents(self, agents: AgentFleet):
+        self.agents = agents
+        self.measure()
+
+    def is_current(self, graph: Graph | None, parcels: ParcelSet) -> bool:
+        # The parcels and graph are replaced, never changed, so a snapshot is current while they are the same objects
+        return self.graph is graph and self.parcels is parcels
+
+    def get_simulator(self) -> Simulator:
+        if self.graph is None:
+            raise ValueError("The scenario has no map")
+        if self.simulator is None:
+            self.simulator = Simulator(self.graph, self.parcels)
+            self.measure()
+        return self.simulator
+
+    def get_distances(self) -> DistanceMatrix:
+        if self.distances is None:
+            self.distances = DistanceMatrix(
+                self.graph, self.parcels, self.get_simulator()  # type: ignore
+            )
+            self.measure()
+        return self.distances
+
+    def get_encoded_map(self, format: str, gzip: bool = False) -> EncodedMap:
+        # With gzip, the compressed body is built too so that it is counted in memory
+        if self.graph is None:
+            raise ValueError("The scenario has no map")
+        encoded = self.encoded_maps.get(format)
+        if encoded is None:
+            encoded = self.encoded_maps[format] = EncodedMap(self.graph, format)
+            self.measure()
+        if gzip and encoded.gzip_body is None:
+            encoded.get_gzip_body()
+            self.measure()
+        return encoded
+
+    def get_spatial_index(self) -> SpatialIndex:
+        if self.graph is None:
+            raise ValueError("The scenario has no map")
+        if self.spatial_index is None:
+            self.spatial_index = SpatialIndex(self.graph)
+            self.measure()
+        return self.spatial_index
+
+    def measure(self):
+        # Called with the lock held. The simulator holds about as much as the graph
+        size = self.parcels.nbytes + self.agents.nbytes
+        if self.graph is not None:
+            graph_size = sum(
+                array.nbytes
+                for array in (
+                    self.graph.x,
+                    self.graph.y,
+                    self.graph.color,
+                    self.graph.offsets,
+                    self.graph.neighbours,
+                    self.graph.lengths,
+                )
+            )
+            size += graph_size * (2 if self.simulator is not None else 1)
+        if self.distances is not None:
+            size += self.distances.distances.nbytes + self.distances.next_hops.nbytes
+        for encoded in self.encoded_maps.values():
+            size += len(encoded.body) + len(encoded.gzip_body or b"")
+        if self.spatial_index is not None:
+            size += self.spatial_index.memory()
+        self.memory = size
+
+
+class ScenarioStore:
+    def __init__(
+        self, max_memory: int = MAX_MEMORY, max_scenarios: int = MAX_SCENARIOS
+    ):
+        self.max_memory = max_memory
+        self.max_scenarios = max_scenarios
+        # Ordered from the least to the most recently used
+        self.scenarios: OrderedDict[str, Scenario] = OrderedDict()
+        # Sum of the memory of the scenarios as last counted
+        self.memory = 0
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def use(self, id: str = DEFAULT_SCENARIO) -> Iterator[Scenario]:
+        # Gets the scenario with the given id, creating it if needed. It is not evicted until the block ends
+        with self.lock:
+            scenario = self.scenarios.get(id)
+            if scenario is None:
+                scenario = Scenario(id)
+                self.scenarios[id] = scenario
+            self.scenarios.move_to_end(id)
+            scenario.users += 1
+            self.evict()
+        try:
+            yield scenario
+        finally:
+            # The scenario may have grown, so it is counted and the limits are checked again
+            with self.lock:
+                scenario.users -= 1
+                self.count(scenario)
+                self.evict()
+
+    def count(self, scenario: Scenario):
+        # Reading memory does not need the lock of the scenario, it is replaced by a single assignment
+        memory = scenario.memory
+        self.memory += memory - scenario.counted
+        scenario.counted = memory
+
+    def evict(self):
+        # Scenarios in use and the most recently used scenario are never evicted,
+        # so the limits can be exceeded while they are busy
+        if self.within_limits(self.memory, len(self.scenarios)):
+            return
+        newest = next(reversed(self.scenarios))
+        memory, count = self.memory, len(self.scenarios)
+        evicted = []
+        for id, scenario in self.scenarios.items():
+            if self.within_limits(memory, count):
+                break
+            if id == newest or scenario.users > 0:
+                continue
+            memory -= scenario.counted
+            count -= 1
+            evicted.append(id)
+        for id in evicted:
+            self.memory -= self.scenarios.pop(id).counted
+
+    def within_limits(self, memory: int, count: int) -> bool:
+        return memory <= self.max_memory and count <= self.max_scenarios
@@ -0,0 +1,135 @@
+import gzip
+import json
+import struct
+from hashlib import blake2b
+from typing import Callable, Dict, Iterator, Tuple
+
+import numpy as np
+
+from common import AgentFleet, ParcelSet
+from node import Graph
+
+# Number of nodes encoded per chunk of the JSON map
+SERIALIZE_CHUNK_SIZE = 1024
+# Compression level of the gzip encoded maps, they are compressed once per map
+GZIP_LEVEL = 6
+# Formats of the parcels and agents: one object per parcel or agent, or one array per field
+TABLE_FORMATS = ("json", "columnar")
+
+
+def serialize(graph: Graph) -> Iterator[str]:
+    # Encodes the map as JSON in chunks of nodes, straight from the graph arrays
+    yield f'{{"no_of_nodes": {graph.no_of_nodes}, "nodes": ['
+
+    xs = graph.x.tolist()
+    ys = graph.y.tolist()
+    colors = graph.color.tolist()
+    offsets = graph.offsets.tolist()
+    neighbours = graph.neighbours.tolist()
+
+    for start in range(0, graph.no_of_nodes, SERIALIZE_CHUNK_SIZE):
+        end = min(start + SERIALIZE_CHUNK_SIZE, graph.no_of_nodes)
+        chunk = ",".join(
+            json.dumps(
+                {
+                    "x": xs[i],
+                    "y": ys[i],
+                    "id": i,
+                    "color": colors[i],
+                    "neighbours": neighbours[offsets[i] : offsets[i + 1]],
+                    "bbox": None,
+                }
+            )
+            for i in range(start, end)
+        )
+        yield chunk if start == 0 else "," + chunk
+
+    yield "]}"
+
+
+def encode_json(graph: Graph) -> bytes:
+    return "".join(serialize(graph)).encode()
+
+
+def encode_columnar(graph: Graph) -> bytes:
+    # One array per field instead of one object per node.
+    # The neighbours of node i are neighbours[offsets[i]:offsets[i + 1]]
+    return json.dumps(
+        {
+            "no_of_nodes": graph.no_of_nodes,
+            "x": graph.x.tolist(),
+            "y": graph.y.tolist(),
+            "color": graph.color.reshape(-1).tolist(),
+            "offsets": graph.offsets.tolist(),
+            "neighbours": graph.neighbours.tolist(),
+        },
+        separators=(",", ":"),
+    ).encode()
+
+
+def encode_binary(graph: Graph) -> bytes:
+    # Little endian: uint32 number of nodes n, uint32 number of edges m, float64 x[n], float64 y[n],
+    # int32 offsets[n + 1], int32 neighbours[m], uint8 color[3n]. Every array is aligned to its item size
+    header = struct.pack("<II", graph.no_of_nodes, len(graph.neighbours))
+    return b"".join(
+        [
+            header,
+            graph.x.astype("<f8").tobytes(),
+            graph.y.astype("<f8").tobytes(),
+            graph.offsets.astype("<i4").tobytes(),
+            graph.neighbours.astype("<i4").tobytes(),
+            graph.color.astype(np.uint8).tobytes(),
+        ]
+    )
+
+
+def encode_table(table: ParcelSet | AgentFleet, format: str = "json") -> bytes:
+    # Parcels and agents are encoded straight from their columns, without building an object per row
+    if format not in TABLE_FORMATS:
+        raise ValueError(
+            f"Unknown table format {format!r}, expected one of {list(TABLE_FORMATS)}"
+        )
+    columns = table.to_dict()
+    if format == "json":
+        columns = [dict(zip(columns, row)) for row in zip(*columns.values())]
+    return json.dumps(columns, separators=(",", ":")).encode()
+
+
+ENCODERS: Dict[str, Tuple[str, Callable[[Graph], bytes]]] = {
+    "json": ("application/json", encode_json),
+    "columnar": ("application/json", encode_columnar),
+    "binary": ("application/octet-stream", encode_binary),
+}
+
+
+class EncodedMap:
+    # A map encoded once, with a strong ETag of its content. The gzip body is compressed when first asked for
+    def __init__(self, graph: Graph, format: str):
+        if format not in ENCODERS:
+            raise ValueError(
+                f"Unknown map format {format!r}, expected one of {list(ENCODERS)}"
+            )
+        self.media_type, encoder = ENCODERS[format]
+        self.body = encoder(graph)
+        self.etag = f'"{blake2b(self.body, digest_size=16).hexdigest()}"'
+        self.gzip_body: bytes | None = None
+
+    def get_gzip_body(self) -> bytes:
+        if self.gzip_body is None:
+            self.gzip_body = gzip.compress(self.body, GZIP_LEVEL, mtime=0)
+        return self.gzip_body
+
+    def matches(self, if_none_match: str | None) -> bool:
+        # If-None-Match is "*" or a list of ETags, weak ETags compare equal to strong ones
+        if if_none_match is None:
+            return False
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return any(
+            tag == "*" or tag.removeprefix("W/") in (self.etag, self.gzip_etag)
+            for tag in tags
+        )
+
+    @property
+    def gzip_etag(self) -> str:
+        # The compressed body is a different representation, so it has its own ETag
+        return self.etag[:-1] + '-gzip"'
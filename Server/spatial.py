@@ -0,0 +1,212 @@
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from node import Graph
+
+# Average number of nodes per cell of the grid
+NODES_PER_CELL = 8
+# Nodes closer than this many pixels are merged into one when a viewport is simplified
+LOD_PIXELS = 2.0
+
+
+class SpatialIndex:
+    # Uniform grid over the nodes and edges of a map. Cell c = cy * columns + cx holds the nodes
+    # node_ids[node_offsets[c]:node_offsets[c + 1]] and the edges whose bounding box overlaps it
+    # edge_ids[edge_offsets[c]:edge_offsets[c + 1]]. Each undirected edge is stored once as edges[e] = (a, b)
+    def __init__(self, graph: Graph, nodes_per_cell: int = NODES_PER_CELL):
+        self.graph = graph
+        self.x = graph.x
+        self.y = graph.y
+
+        # Undirected edges with a < b
+        sources = np.repeat(
+            np.arange(graph.no_of_nodes, dtype=np.int32), np.diff(graph.offsets)
+        )
+        forward = sources < graph.neighbours
+        self.edges = np.stack([sources[forward], graph.neighbours[forward]], axis=1)
+
+        # Square cells sized so the cells hold nodes_per_cell nodes on average
+        self.min_x = float(self.x.min())
+        self.min_y = float(self.y.min())
+        width = max(float(self.x.max()) - self.min_x, 1e-9)
+        height = max(float(self.y.max()) - self.min_y, 1e-9)
+        num_cells = max(1, graph.no_of_nodes // nodes_per_cell)
+        self.cell_size = max(np.sqrt(width * height / num_cells), 1e-9)
+        self.columns = int(width // self.cell_size) + 1
+        self.rows = int(height // self.cell_size) + 1
+
+        cx, cy = self.cell_of(self.x, self.y)
+        self.node_ids, self.node_offsets = self.bucket(cy * self.columns + cx)
+
+        # Every edge is added to all the cells its bounding box overlaps
+        a, b = self.edges[:, 0], self.edges[:, 1]
+        cx0, cy0 = self.cell_of(
+            np.minimum(self.x[a], self.x[b]), np.minimum(self.y[a], self.y[b])
+        )
+        cx1, cy1 = self.cell_of(
+            np.maximum(self.x[a], self.x[b]), np.maximum(self.y[a], self.y[b])
+        )
+        spans_x = cx1 - cx0 + 1
+        spans_y = cy1 - cy0 + 1
+        counts = spans_x * spans_y
+        edge_ids = np.repeat(np.arange(len(self.edges), dtype=np.int32), counts)
+        # Position of every copy within the bounding box of its edge
+        starts = np.repeat(np.cumsum(counts) - counts, counts)
+        local = np.arange(len(edge_ids)) - starts
+        spans = np.repeat(spans_x, counts)
+        cells = (np.repeat(cy0, counts) + local // spans) * self.columns + (
+            np.repeat(cx0, counts) + local % spans
+        )
+        order = np.argsort(cells, kind="stable")
+        self.edge_ids = edge_ids[order]
+        self.edge_offsets = np.searchsorted(
+            cells[order], np.arange(self.columns * self.rows + 1)
+        )
+
+    def cell_of(self, x: np.ndarray, y: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        # Column and row of the cells of the points, points outside the grid are clamped to it
+        cx = ((x - self.min_x) // self.cell_size).astype(np.int64)
+        cy = ((y - self.min_y) // self.cell_size).astype(np.int64)
+        return np.clip(cx, 0, self.columns - 1), np.clip(cy, 0, self.rows - 1)
+
+    def bucket(self, cells: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        order = np.argsort(cells, kind="stable").astype(np.int32)
+        offsets = np.searchsorted(cells[order], np.arange(self.columns * self.rows + 1))
+        return order, offsets
+
+    def cells_in(self, x0: float, y0: float, x1: float, y1: float) -> np.ndarray:
+        (cx0, cx1), (cy0, cy1) = self.cell_of(np.array([x0, x1]), np.array([y0, y1]))
+        return self.cell_range(cx0, cy0, cx1, cy1)
+
+    def cell_range(self, cx0: int, cy0: int, cx1: int, cy1: int) -> np.ndarray:
+        # Ids of the cells from column cx0 to cx1 and row cy0 to cy1, clamped to the grid
+        columns = np.arange(max(cx0, 0), min(cx1, self.columns - 1) + 1)
+        rows = np.arange(max(cy0, 0), min(cy1, self.rows - 1) + 1)
+        return (rows[:, None] * self.columns + columns[None, :]).reshape(-1)
+
+    def gather(
+        self, ids: np.ndarray, offsets: np.ndarray, cells: np.ndarray
+    ) -> np.ndarray:
+        # Concatenates the ids stored in the cells
+        starts = offsets[cells]
+        counts = offsets[cells + 1] - starts
+        shifts = np.repeat(starts - (np.cumsum(counts) - counts), counts)
+        return ids[shifts + np.arange(counts.sum())]
+
+    def query(
+        self, x0: float, y0: float, x1: float, y1: float
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        # Ids of the nodes inside the rectangle and of the edges that cross it
+        cells = self.cells_in(x0, y0, x1, y1)
+
+        nodes = self.gather(self.node_ids, self.node_offsets, cells)
+        x, y = self.x[nodes], self.y[nodes]
+        nodes = np.sort(nodes[(x >= x0) & (x <= x1) & (y >= y0) & (y <= y1)])
+
+        edges = np.unique(self.gather(self.edge_ids, self.edge_offsets, cells))
+        a, b = self.edges[edges, 0], self.edges[edges, 1]
+        inside = self.segments_intersect(
+            self.x[a], self.y[a], self.x[b], self.y[b], x0, y0, x1, y1
+        )
+        return nodes, edges[inside]
+
+    @staticmethod
+    def segments_intersect(
+        ax: np.ndarray,
+        ay: np.ndarray,
+        bx: np.ndarray,
+        by: np.ndarray,
+        x0: float,
+        y0: float,
+        x1: float,
+        y1: float,
+    ) -> np.ndarray:
+        # Liang-Barsky clipping of the segments from a to b against the rectangle
+        dx = bx - ax
+        dy = by - ay
+        enter = np.zeros(len(ax))
+        leave = np.ones(len(ax))
+        inside = np.ones(len(ax), dtype=bool)
+        for p, q in ((-dx, ax - x0), (dx, x1 - ax), (-dy, ay - y0), (dy, y1 - ay)):
+            parallel = p == 0
+            inside &= ~(parallel & (q < 0))
+            with np.errstate(divide="ignore", invalid="ignore"):
+                t = np.where(parallel, 0.0, q / np.where(parallel, 1.0, p))
+            enter = np.where(~parallel & (p < 0), np.maximum(enter, t), enter)
+            leave = np.where(~parallel & (p > 0), np.minimum(leave, t), leave)
+        return inside & (enter <= leave)
+
+    def viewport(
+        self, x0: float, y0: float, x1: float, y1: float, resolution: float = 0.0
+    ) -> Dict[str, List]:
+        # Nodes and edges of the rectangle. Edges leaving the rectangle keep their outside node so they can be drawn.
+        # With a resolution, nodes in the same resolution sized cell are merged into the node with the lowest id,
+        # which keeps the root node, and the edges between merged nodes are dropped
+        nodes, edges = self.query(x0, y0, x1, y1)
+        ends = self.edges[edges]
+        nodes = np.union1d(nodes, ends.reshape(-1)).astype(np.int32)
+
+        if resolution > 0 and len(nodes) > 0:
+            cx = np.floor((self.x[nodes] - x0) / resolution).astype(np.int64)
+            cy = np.floor((self.y[nodes] - y0) / resolution).astype(np.int64)
+            cx -= cx.min()
+            cy -= cy.min()
+            clusters = cy * (int(cx.max()) + 1) + cx
+            # nodes is sorted, so the first node of every cluster has the lowest id
+            _, first, inverse = np.unique(
+                clusters, return_index=True, return_inverse=True
+            )
+            representative = nodes[first][inverse]
+            ends = representative[np.searchsorted(nodes, ends)]
+            ends = np.unique(np.sort(ends, axis=1), axis=0).reshape(-1, 2)
+            ends = ends[ends[:, 0] != ends[:, 1]]
+            nodes = nodes[first]
+
+        return {
+            "id": nodes.tolist(),
+            "x": self.x[nodes].tolist(),
+            "y": self.y[nodes].tolist(),
+            "color": self.graph.color[nodes].reshape(-1).tolist(),
+            "edges": ends.reshape(-1).tolist(),
+        }
+
+    def nearest(self, x: float, y: float) -> Tuple[int, float]:
+        # Searches rings of cells around the cell of the point. Nodes in ring k + 1 and further are
+        # at least k cells away, so the search stops when the nearest node found is closer than that
+        cx, cy = (int(c[0]) for c in self.cell_of(np.array([x]), np.array([y])))
+        # Distance from the point to the grid, no node is closer than it
+        outside = np.hypot(
+            max(self.min_x - x, 0.0, x - (self.min_x + self.columns * self.cell_size)),
+            max(self.min_y - y, 0.0, y - (self.min_y + self.rows * self.cell_size)),
+        )
+        best, best_distance = -1, np.inf
+        for ring in range(max(self.columns, self.rows)):
+            cells = self.cell_range(cx - ring, cy - ring, cx + ring, cy + ring)
+            if ring > 0:
+                column, row = cells % self.columns, cells // self.columns
+                cells = cells[
+                    (np.abs(column - cx) == ring) | (np.abs(row - cy) == ring)
+                ]
+            nodes = self.gather(self.node_ids, self.node_offsets, cells)
+            if len(nodes) > 0:
+                distances = np.hypot(self.x[nodes] - x, self.y[nodes] - y)
+                closest = int(np.argmin(distances))
+                if distances[closest] < best_distance:
+                    best = int(nodes[closest])
+                    best_distance = float(distances[closest])
+            if best_distance <= max(outside, ring * self.cell_size):
+                break
+        return best, best_distance
+
+    def memory(self) -> int:
+        return sum(
+            array.nbytes
+            for array in (
+                self.edges,
+                self.node_ids,
+                self.node_offsets,
+                self.edge_ids,
+                self.edge_offsets,
+            )
+        )
@@ -1,5 +1,4 @@
 from typing import Dict
-import numpy as np
 import importlib
 import pkgutil
 
@@ -63,7 +62,6 @@ if __name__ == "__main__":
     no_of_nodes = root.create(NodeOptions())
 
     # Create parcels and agents
-    np.random.seed(0)
     parcels = create_parcels(no_of_nodes)
     agents = create_agents()
     simulator = Simulator(root, parcels)
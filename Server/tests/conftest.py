@@ -0,0 +1,21 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from jobs import JobManager
+from scenarios import ScenarioStore
+
+
+@pytest.fixture
+def client(monkeypatch):
+    # Every test gets its own scenarios and jobs, with one worker and room for one waiting job
+    monkeypatch.setattr(main, "scenario_store", ScenarioStore())
+    monkeypatch.setattr(main, "job_manager", JobManager(1, 1))
+    with TestClient(main.app) as client:
+        yield client
+
+
+def create_scenario(client, seed=0, headers=None):
+    client.post("/map", params={"seed": seed}, headers=headers)
+    client.post("/parcels", params={"seed": seed}, headers=headers)
+    client.post("/agents", params={"seed": seed}, headers=headers)
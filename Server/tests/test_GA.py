@@ -0,0 +1,250 @@
+import time
+
+import numpy as np
+import pytest
+
+from Algos.GA import (
+    SELECTION_STRATEGIES,
+    TOURNAMENT_SIZE,
+    FitnessCache,
+    Population,
+    PopulationDNA,
+    roulette_selection,
+    island_model,
+    stochastic_universal_selection,
+    tournament_selection,
+)
+from common import create_agents, create_parcels
+from node import Node, NodeOptions
+
+
+def random_population(seed, size=50, num_parcels=40):
+    rng = np.random.default_rng(seed)
+    return rng, PopulationDNA.random(rng, size, np.array([12, 8, 16]), num_parcels)
+
+
+def parcels_of(dna, individual):
+    return [
+        gene
+        for agent in range(dna.lengths.shape[1])
+        for gene in dna.get_genes(individual, agent)
+        if gene != -1
+    ]
+
+
+def check_invariants(dna):
+    assert (dna.lengths >= 1).all()
+    assert (dna.genes[:, :, 0] == -1).all()
+    assert (
+        dna.genes[np.arange(dna.genes.shape[2]) >= dna.lengths[..., None]] == -1
+    ).all()
+    for i in range(len(dna)):
+        parcels = parcels_of(dna, i)
+        assert len(parcels) == len(set(parcels))
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_crossover_and_mutate_keep_parcels_unique(seed):
+    rng, dna = random_population(seed)
+    check_invariants(dna)
+    for _ in range(20):
+        other = dna.take(rng.permutation(len(dna)))
+        dna.crossover(other, 0.5, rng)
+        check_invariants(dna)
+        dna.mutate(0.2, 40, rng)
+        check_invariants(dna)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_operators_without_changes_keep_every_parcel(seed):
+    rng, dna = random_population(seed)
+    before = [parcels_of(dna, i) for i in range(len(dna))]
+    dna.crossover(dna.take(np.arange(len(dna))[::-1]), 0.0, rng)
+    dna.mutate(0.0, 40, rng)
+    assert [parcels_of(dna, i) for i in range(len(dna))] == before
+
+
+def test_pack_keeps_every_gene_once():
+    _, dna = random_population(0)
+    genes, offsets = dna.pack()
+    num_agents = dna.lengths.shape[1]
+    assert offsets[-1] == len(genes) == dna.lengths.sum()
+    for i in range(len(dna)):
+        for agent in range(num_agents):
+            row = i * num_agents + agent
+            assert genes[offsets[row] : offsets[row + 1]].tolist() == dna.get_genes(
+                i, agent
+            )
+
+
+def test_roulette_selects_in_proportion_to_fitness():
+    rng = np.random.default_rng(0)
+    fitness = np.array([1.0, 2.0, 3.0, 4.0])
+    counts = np.bincount(roulette_selection(rng, fitness, 100_000), minlength=4)
+    assert counts / counts.sum() == pytest.approx(fitness / fitness.sum(), abs=0.01)
+
+
+def test_tournament_selects_the_fittest_of_each_tournament():
+    rng = np.random.default_rng(0)
+    fitness = np.array([1.0, 2.0, 3.0, 4.0])
+    counts = np.bincount(tournament_selection(rng, fitness, 100_000), minlength=4)
+    # The individual of rank r (from 1) wins when it is drawn and no fitter one is
+    expected = [
+        ((r / 4) ** TOURNAMENT_SIZE - ((r - 1) / 4) ** TOURNAMENT_SIZE)
+        for r in range(1, 5)
+    ]
+    assert counts / counts.sum() == pytest.approx(expected, abs=0.01)
+
+
+def test_stochastic_universal_selection_is_close_to_expected_counts():
+    rng = np.random.default_rng(0)
+    fitness = np.array([1.0, 2.0, 3.0, 4.0, 0.0])
+    for num_parents in (10, 37, 100):
+        counts = np.bincount(
+            stochastic_universal_selection(rng, fitness, num_parents), minlength=5
+        )
+        expected = num_parents * fitness / fitness.sum()
+        assert (counts >= np.floor(expected)).all()
+        assert (counts <= np.ceil(expected)).all()
+
+
+def test_selection_is_uniform_without_fitness():
+    rng = np.random.default_rng(0)
+    for select in SELECTION_STRATEGIES.values():
+        counts = np.bincount(select(rng, np.zeros(4), 40_000), minlength=4)
+        assert counts / counts.sum() == pytest.approx([0.25] * 4, abs=0.02)
+
+
+class CountingSimulator:
+    # Counts the chromosomes sent to the simulator
+    def __init__(self, simulator):
+        self.simulator = simulator
+        self.simulated = 0
+
+    def simulate_array(self, genes, offsets, agent_table):
+        results = self.simulator.simulate_array(genes, offsets, agent_table)
+        self.simulated += len(results)
+        return results
+
+
+def test_fitness_cache_hits_skip_the_simulation():
+    root = Node(0, 0, (0, 0, 0), 0)
+    root.create(NodeOptions(seed=0))
+    graph = root.to_graph()
+    parcels = create_parcels(graph.no_of_nodes, 0)
+    agents = create_agents(0)
+    population = Population(parcels, agents, graph, populations_size=30, seed=0)
+    simulator = population.simulator = CountingSimulator(population.simulator)
+
+    first = population._Population__calculate_fitness()
+    assert 0 < simulator.simulated <= 30
+    assert population.evaluations == simulator.simulated
+
+    # The same population again is served from the cache with the same fitness
+    simulated = simulator.simulated
+    second = population._Population__calculate_fitness()
+    assert simulator.simulated == simulated
+    assert population.fitness_cache.hits >= 30
+    assert np.array_equal(first, second)
+
+
+def test_fitness_cache_evicts_the_least_recently_used():
+    cache = FitnessCache(2)
+    cache.put(b"a", (1, 10.0))
+    cache.put(b"b", (2, 20.0))
+    assert cache.get(b"a") == (1, 10.0)
+    cache.put(b"c", (3, 30.0))
+    assert cache.get(b"b") is None
+    assert cache.get(b"a") == (1, 10.0)
+    assert cache.get(b"c") == (3, 30.0)
+    assert (cache.hits, cache.misses) == (3, 1)
+
+
+def test_island_model_with_a_fixed_seed_is_deterministic():
+    root = Node(0, 0, (0, 0, 0), 0)
+    root.create(NodeOptions(seed=0))
+    graph = root.to_graph()
+    parcels = create_parcels(graph.no_of_nodes, 0)
+    agents = create_agents(0)
+
+    # Migrants are exchanged in lock step, so they cannot depend on the timing of the
+    # islands
+    runs = [
+        island_model(
+            graph,
+            parcels,
+            agents,
+            num_islands=3,
+            num_generations=12,
+            migration_interval=3,
+            num_migrants=2,
+            seed=0,
+        )
+        for _ in range(2)
+    ]
+    first, second = (
+        {agent: route.get_allocation() for agent, route in routes.items()}
+        for routes in runs
+    )
+    assert first == second
+
+
+def stopping_population(**options):
+    root = Node(0, 0, (0, 0, 0), 0)
+    root.create(NodeOptions(seed=0))
+    graph = root.to_graph()
+    parcels = create_parcels(graph.no_of_nodes, 0)
+    agents = create_agents(0)
+
+    # Only the policy under test can stop the population before num_generations
+    history = []
+    population = Population(
+        parcels,
+        agents,
+        graph,
+        populations_size=30,
+        num_generations=100_000,
+        seed=0,
+        progress=lambda stats, solution: history.append(stats) and False,
+        **{
+            "time_limit": None,
+            "max_evaluations": None,
+            "stagnation_limit": None,
+            **options,
+        },
+    )
+    return population, history
+
+
+def test_time_limit_stops_the_population():
+    # The time limit counts from the creation of the population
+    start = time.monotonic()
+    population, _ = stopping_population(time_limit=0.3)
+    assert population.evolve(100_000)
+    assert 0.3 <= time.monotonic() - start < 5
+    assert 0 < population.generation_num < 100_000
+
+
+def test_max_evaluations_stops_the_population():
+    population, history = stopping_population(max_evaluations=200)
+    assert population.evolve(100_000)
+    # The population stops after the first generation that reaches the limit
+    assert population.evaluations >= 200
+    assert all(stats["evaluations"] < 200 for stats in history[:-1])
+    assert population.generation_num == len(history)
+
+
+def test_stagnation_limit_stops_the_population():
+    population, history = stopping_population(stagnation_limit=5)
+    assert population.evolve(100_000)
+    # The population stops after the first 5 generations in a row without improvement
+    improved = [stats["improved"] for stats in history]
+    assert improved[-5:] == [False] * 5
+    assert not any(improved[i : i + 5] == [False] * 5 for i in range(len(improved) - 5))
+
+
+def test_progress_stops_the_population():
+    population, history = stopping_population()
+    population.progress = lambda stats, solution: stats["iteration"] >= 3
+    assert population.evolve(100_000)
+    assert population.generation_num == 3
@@ -0,0 +1,97 @@
+import numpy as np
+import pytest
+
+from Algos.alns import ALNS
+from common import create_agents, create_parcels
+from node import Node, NodeOptions
+from Simulator import Simulator
+
+
+def state(solution):
+    return (
+        [(list(trip.parcels), trip.load, trip.cost) for trip in solution.trips],
+        list(solution.agents),
+        solution.trip_of.tolist(),
+        solution.agent_costs.tolist(),
+        solution.distance,
+    )
+
+
+def check_state(solution, expected):
+    trips, agents, trip_of, agent_costs, distance = state(solution)
+    (
+        expected_trips,
+        expected_agents,
+        expected_trip_of,
+        expected_costs,
+        expected_distance,
+    ) = expected
+    assert [trip[:2] for trip in trips] == [trip[:2] for trip in expected_trips]
+    assert [trip[2] for trip in trips] == [trip[2] for trip in expected_trips]
+    assert agents == expected_agents
+    assert trip_of == expected_trip_of
+    assert agent_costs == pytest.approx(expected_costs)
+    assert distance == pytest.approx(expected_distance)
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_alns(seed):
+    root = Node(0, 0, (0, 0, 0), 0)
+    root.create(NodeOptions(seed=seed))
+    graph = root.to_graph()
+    parcels = create_parcels(graph.no_of_nodes, seed)
+    agents = create_agents(seed)
+    alns = ALNS(parcels, agents, graph, time_limit=0.5, num_iterations=300, seed=seed)
+
+    # The state of the current solution before each candidate is made from it
+    before = {}
+
+    def snapshot(destroy):
+        def wrapped(solution, count):
+            before["state"] = state(solution)
+            return destroy(solution, count)
+
+        return wrapped
+
+    alns.destroy_operators = [snapshot(destroy) for destroy in alns.destroy_operators]
+
+    # A rejected candidate is undone back to the exact state it was made from
+    undo = alns.undo
+    undone = []
+
+    def checked_undo(solution):
+        undo(solution)
+        check_state(solution, before["state"])
+        undone.append(True)
+
+    alns.undo = checked_undo
+
+    # The cached insertion costs are the costs computed from the trips as they are now
+    cached_insertion_costs = alns.cached_insertion_costs
+
+    def checked_insertion_costs(solution, pending):
+        deltas, positions = cached_insertion_costs(solution, pending)
+        for t, trip in enumerate(solution.trips):
+            expected_deltas, expected_positions = alns.insertion_costs(trip, pending)
+            assert deltas[:, t] == pytest.approx(expected_deltas)
+            assert np.array_equal(positions[:, t], expected_positions)
+        return deltas, positions
+
+    alns.cached_insertion_costs = checked_insertion_costs
+
+    routes = alns.solution()
+    assert undone
+
+    # Every parcel given to an agent is delivered by the simulator, within its budget
+    assigned = [p.id for route in routes.values() for p in route.route if p is not None]
+    assert len(set(assigned)) == len(assigned)
+    simulator = Simulator(graph, parcels)
+    allocation = {agent: route.get_allocation() for agent, route in routes.items()}
+    _, delivered, _ = simulator.simulate([allocation])[0]
+    assert delivered == len(assigned)
+    for agent, (is_valid, agent_delivered, distance) in zip(
+        routes, simulator.get_agent_results(0)
+    ):
+        assert is_valid
+        assert agent_delivered == sum(p is not None for p in routes[agent].route)
+        assert distance < agent.max_dist
@@ -0,0 +1,71 @@
+import json
+
+import numpy as np
+import pytest
+
+from common import AgentFleet, ParcelSet, create_agents, create_parcels
+from node import Node, NodeOptions
+from serialization import encode_table
+from Simulator import Simulator
+
+
+def test_parcel_set_round_trip():
+    rng = np.random.default_rng(0)
+    parcels = ParcelSet.random(10_000, rng, 100_000, 100_001)
+
+    # Parcel views, the list of parcels and both JSON formats give back the same columns
+    copy = ParcelSet.from_parcels(parcels.tolist())
+    assert np.array_equal(copy.ids, parcels.ids)
+    assert np.array_equal(copy.locations, parcels.locations)
+
+    columns = json.loads(encode_table(parcels, "columnar"))
+    decoded = ParcelSet(columns["id"], columns["location"])
+    assert np.array_equal(decoded.ids, parcels.ids)
+    assert np.array_equal(decoded.locations, parcels.locations)
+
+    rows = json.loads(encode_table(parcels))
+    assert rows[12345] == {"id": 12345, "location": int(parcels.locations[12345])}
+    assert parcels[12345].location == rows[12345]["location"]
+
+    # Slices are views of the columns
+    part = parcels[1000:2000]
+    assert len(part) == 1000
+    assert np.shares_memory(part.locations, parcels.locations)
+    assert part[0] == parcels[1000]
+
+
+def test_agent_fleet_round_trip():
+    rng = np.random.default_rng(0)
+    agents = AgentFleet.random(rng, 10_000, 10_001)
+
+    copy = AgentFleet.from_agents(agents.tolist())
+    assert np.array_equal(copy.ids, agents.ids)
+    assert np.array_equal(copy.capacities, agents.capacities)
+    assert np.array_equal(copy.max_dists, agents.max_dists)
+
+    rows = json.loads(encode_table(agents))
+    assert [row["max_dist"] for row in rows] == agents.max_dists.tolist()
+    columns = json.loads(encode_table(agents, "columnar"))
+    assert columns["max_capacity"] == agents.capacities.tolist()
+
+    table = agents.table()
+    assert table.shape == (10_000, 3)
+    assert table[42].tolist() == [42, agents[42].max_capacity, agents[42].max_dist]
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_simulator_reads_parcel_columns(seed):
+    root = Node(0, 0, (0, 0, 0), 0)
+    root.create(NodeOptions(seed=seed))
+    graph = root.to_graph()
+    parcels = create_parcels(graph.no_of_nodes, seed)
+    agents = create_agents(seed)
+
+    # Every agent delivers a share of the parcels in one trip each
+    allocation = {
+        agent: [-1] + parcels.ids[agent.id :: len(agents)].tolist() + [-1]
+        for agent in agents
+    }
+    from_columns = Simulator(graph, parcels).simulate([allocation])
+    from_list = Simulator(graph, parcels.tolist()).simulate([allocation])
+    assert from_columns == from_list
@@ -0,0 +1,43 @@
+import pytest
+
+import Algos.decomposition
+from common import create_agents, create_parcels
+from node import Node, NodeOptions
+from Simulator import Simulator
+
+SOLVERS = [
+    ("GA", {"islands": 2, "num_generations": 10, "migration_interval": 5}),
+    ("alns", {"time_limit": 0.2}),
+    ("savings", {}),
+]
+
+
+@pytest.mark.parametrize("solver, options", SOLVERS)
+def test_decomposition_solvers(solver, options):
+    root = Node(0, 0, (0, 0, 0), 0)
+    root.create(NodeOptions(seed=0))
+    graph = root.to_graph()
+    parcels = create_parcels(graph.no_of_nodes, 0)
+    agents = create_agents(0)
+
+    # The sectors and the repair are given spawned seed sequences
+    routes = Algos.decomposition.model(
+        graph,
+        parcels,
+        agents,
+        solver=solver,
+        num_sectors=2,
+        num_workers=1,
+        seed=0,
+        **options,
+    )
+    assert set(routes) == set(agents)
+
+    # Every parcel is given to at most one agent, with its original id and location
+    assigned = [p for route in routes.values() for p in route.route if p is not None]
+    assert len({parcel.id for parcel in assigned}) == len(assigned)
+    assert all(parcel == parcels[parcel.id] for parcel in assigned)
+
+    allocation = {agent: route.get_allocation() for agent, route in routes.items()}
+    _, delivered, _ = Simulator(graph, parcels).simulate([allocation])[0]
+    assert delivered > 0
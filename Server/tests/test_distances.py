@@ -0,0 +1,52 @@
+import heapq
+
+import numpy as np
+import pytest
+
+from common import create_parcels
+from distances import DistanceMatrix
+from node import Node, NodeOptions
+
+
+def dijkstra(graph, start):
+    # Reference shortest path distances from start to every node
+    distances = np.full(graph.no_of_nodes, np.inf)
+    distances[start] = 0.0
+    heap = [(0.0, start)]
+    while heap:
+        distance, node = heapq.heappop(heap)
+        if distance > distances[node]:
+            continue
+        for edge in range(graph.offsets[node], graph.offsets[node + 1]):
+            neighbour = int(graph.neighbours[edge])
+            candidate = distance + float(graph.lengths[edge])
+            if candidate < distances[neighbour]:
+                distances[neighbour] = candidate
+                heapq.heappush(heap, (candidate, neighbour))
+    return distances
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_shortest_paths_match_dijkstra(seed):
+    root = Node(0, 0, (0, 0, 0), 0)
+    root.create(NodeOptions(seed=seed))
+    graph = root.to_graph()
+    parcels = create_parcels(graph.no_of_nodes, seed)
+    matrix = DistanceMatrix(graph, parcels)
+
+    locations = matrix.locations.tolist()
+    for i, start in enumerate(locations):
+        expected = dijkstra(graph, start)[locations]
+        np.testing.assert_allclose(matrix.distances[i], expected, rtol=1e-5)
+
+    # The paths follow the edges of the map and are as long as the distances
+    for start in locations:
+        for end in locations:
+            path = matrix.path(start, end)
+            assert path[0] == start and path[-1] == end
+            length = 0.0
+            for a, b in zip(path, path[1:]):
+                edges = np.flatnonzero(graph.get_neighbours(a) == b)
+                assert len(edges) > 0
+                length += float(graph.lengths[graph.offsets[a] + edges].min())
+            assert length == pytest.approx(matrix.distance(start, end), rel=1e-5)
@@ -0,0 +1,50 @@
+import time
+
+from conftest import create_scenario
+
+
+def wait_for(client, id, statuses, timeout=60):
+    deadline = time.monotonic() + timeout
+    while True:
+        job = client.get(f"/jobs/{id}").json()
+        if job["status"] in statuses or time.monotonic() > deadline:
+            return job
+        time.sleep(0.1)
+
+
+def test_jobs_need_a_scenario(client):
+    assert client.post("/jobs").status_code == 400
+
+
+def test_job_is_solved(client):
+    create_scenario(client)
+    response = client.post("/jobs", params={"seed": 0, "time_limit": 1})
+    assert response.status_code == 202
+    assert response.json()["status"] == "queued"
+
+    job = wait_for(client, response.json()["id"], ("done", "failed"))
+    assert job["status"] == "done"
+    assert job["progress"]["iteration"] > 0
+    assert job["result"]["summary"]["total_parcels"] > 0
+    assert client.get("/jobs/999").status_code == 404
+
+
+def test_jobs_are_cancelled_and_rejected_when_the_queue_is_full(client):
+    create_scenario(client)
+    # One job runs on the only worker and one waits, so the queue is full
+    running = client.post("/jobs", params={"time_limit": 60}).json()
+    queued = client.post("/jobs", params={"time_limit": 60}).json()
+    response = client.post("/jobs", params={"time_limit": 60})
+    assert response.status_code == 503
+    assert response.headers["Retry-After"]
+
+    # The queued job never runs, the running one stops with its best solution so far
+    assert client.delete(f"/jobs/{queued['id']}").json()["status"] == "cancelled"
+    wait_for(client, running["id"], ("running",))
+    client.delete(f"/jobs/{running['id']}")
+    job = wait_for(client, running["id"], ("cancelled", "done", "failed"), timeout=10)
+    assert job["status"] == "cancelled"
+    assert job["result"]["summary"]["total_parcels"] > 0
+
+    # Cancelled jobs leave the queue
+    assert client.post("/jobs", params={"time_limit": 1}).status_code == 202
@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+from Algos.local_search import OR_OPT, RELOCATE, SWAP, TWO_OPT, LocalSearch
+from common import create_agents, create_parcels
+from distances import DistanceMatrix
+from node import Node, NodeOptions
+from Simulator import Simulator
+
+
+def random_individual(rng, parcels, agents):
+    # Two thirds of the parcels split between the agents in full trips, the rest unassigned
+    chosen = rng.permutation(len(parcels))[: 2 * len(parcels) // 3]
+    individual = []
+    for agent, part in zip(agents, np.array_split(chosen, len(agents))):
+        genes = [-1]
+        for i, parcel in enumerate(part.tolist()):
+            if i > 0 and i % agent.max_capacity == 0:
+                genes.append(-1)
+            genes.append(parcels[parcel].id)
+        individual.append(genes)
+    return individual
+
+
+def score(simulator, agents, individual):
+    _, delivered, distance = simulator.simulate(
+        [{agent: genes for agent, genes in zip(agents, individual)}]
+    )[0]
+    return delivered, -distance
+
+
+@pytest.mark.parametrize("move", [TWO_OPT, OR_OPT, RELOCATE, SWAP])
+@pytest.mark.parametrize("seed", range(8))
+def test_local_search_never_worsens(move, seed):
+    root = Node(0, 0, (0, 0, 0), 0)
+    root.create(NodeOptions(seed=seed))
+    graph = root.to_graph()
+    parcels = create_parcels(graph.no_of_nodes, seed)
+    agents = create_agents(seed)
+    simulator = Simulator(graph, parcels)
+    distances = DistanceMatrix(graph, parcels, simulator)
+
+    rng = np.random.default_rng(seed)
+    search = LocalSearch(parcels, agents, distances, rng, moves=(move,))
+    for _ in range(5):
+        individual = random_individual(rng, parcels, agents)
+        before = score(simulator, agents, individual)
+        improved = search.improve(individual, num_moves=50)
+        assert search.is_valid(improved)
+        assert score(simulator, agents, improved) >= before
+
+        # The routes are scored like the simulator scores them
+        simulator.simulate([{agent: genes for agent, genes in zip(agents, improved)}])
+        for agent, genes, (_, delivered, distance) in zip(
+            agents, improved, simulator.get_agent_results(0)
+        ):
+            expected = search.route_score(agent, genes)
+            assert expected[0] == delivered
+            assert expected[1] == pytest.approx(distance)
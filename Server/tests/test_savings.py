@@ -0,0 +1,31 @@
+import pytest
+
+import Algos.savings
+from common import create_agents, create_parcels
+from node import Node, NodeOptions
+from Simulator import Simulator
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_savings_routes_are_delivered(seed):
+    root = Node(0, 0, (0, 0, 0), 0)
+    root.create(NodeOptions(seed=seed))
+    graph = root.to_graph()
+    parcels = create_parcels(graph.no_of_nodes, seed)
+    agents = create_agents(seed)
+
+    routes = Algos.savings.model(graph, parcels, agents)
+    assigned = [p.id for route in routes.values() for p in route.route if p is not None]
+    assert len(set(assigned)) == len(assigned)
+
+    # Every parcel the agents are given is delivered by the simulator, within each agent's budget
+    simulator = Simulator(graph, parcels)
+    allocation = {agent: route.get_allocation() for agent, route in routes.items()}
+    _, delivered, _ = simulator.simulate([allocation])[0]
+    assert delivered == len(assigned)
+    for agent, (is_valid, agent_delivered, distance) in zip(
+        routes, simulator.get_agent_results(0)
+    ):
+        assert is_valid
+        assert agent_delivered == sum(p is not None for p in routes[agent].route)
+        assert distance < agent.max_dist
@@ -0,0 +1,58 @@
+from conftest import create_scenario
+from node import Node, NodeOptions
+from scenarios import ScenarioStore
+
+
+def test_scenarios_are_isolated(client):
+    a, b = {"X-Scenario-Id": "a"}, {"X-Scenario-Id": "b"}
+    create_scenario(client, 0, a)
+    create_scenario(client, 1, b)
+    parcels = client.get("/parcels", headers=a).json()
+    map = client.get("/map", params={"format": "columnar"}, headers=a).content
+
+    # Changing one scenario leaves the other as it was
+    client.post("/map", params={"seed": 2}, headers=b)
+    client.post("/parcels", params={"seed": 2}, headers=b)
+    assert client.get("/parcels", headers=a).json() == parcels
+    assert client.get("/parcels", headers=b).json() != parcels
+    assert client.get("/map", params={"format": "columnar"}, headers=a).content == map
+    assert client.get("/map", params={"format": "columnar"}, headers=b).content != map
+
+    # A new scenario starts empty, and the jobs of a scenario are hidden from the others
+    assert client.get("/map", headers={"X-Scenario-Id": "c"}).json()["nodes"] is None
+    job = client.post("/jobs", params={"time_limit": 1}, headers=a).json()
+    assert client.get(f"/jobs/{job['id']}", headers=b).status_code == 404
+    assert client.delete(f"/jobs/{job['id']}", headers=b).status_code == 404
+    assert client.get(f"/jobs/{job['id']}", headers=a).status_code == 200
+
+
+def test_least_recently_used_idle_scenario_is_evicted():
+    store = ScenarioStore(max_scenarios=2)
+    with store.use("a") as a:
+        with store.use("b"):
+            pass
+        # a is in use, so b is evicted although a was used before it
+        with store.use("c"):
+            pass
+        assert list(store.scenarios) == ["a", "c"]
+        assert store.scenarios["a"] is a
+    with store.use("d"):
+        pass
+    assert list(store.scenarios) == ["c", "d"]
+
+
+def test_scenarios_are_evicted_by_memory():
+    root = Node(0, 0, (0, 0, 0), 0)
+    root.create(NodeOptions(seed=0))
+    graph = root.to_graph()
+    store = ScenarioStore(max_memory=1)
+    with store.use("a") as a:
+        a.set_map(graph)
+        a.get_encoded_map("json", gzip=True)
+    # The newest scenario is kept even when it is over the limit on its own
+    assert store.memory == a.memory > 0
+    assert list(store.scenarios) == ["a"]
+
+    with store.use("b"):
+        assert list(store.scenarios) == ["b"]
+    assert store.memory == 0
@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+
+from Algos.seeding import SEEDERS
+from common import create_agents, create_parcels
+from distances import DistanceMatrix
+from node import Node, NodeOptions
+from Simulator import Simulator
+
+
+@pytest.mark.parametrize("seeder", list(SEEDERS))
+@pytest.mark.parametrize("seed", range(25))
+def test_seeded_parcels_are_delivered(seeder, seed):
+    root = Node(0, 0, (0, 0, 0), 0)
+    root.create(NodeOptions(seed=seed))
+    graph = root.to_graph()
+    parcels = create_parcels(graph.no_of_nodes, seed)
+    agents = create_agents(seed)
+    simulator = Simulator(graph, parcels)
+    distances = DistanceMatrix(graph, parcels, simulator)
+
+    for rng_seed in range(3):
+        genes = SEEDERS[seeder](
+            np.random.default_rng(rng_seed), parcels, agents, distances, graph
+        )
+        assigned = [gene for agent_genes in genes for gene in agent_genes if gene != -1]
+        assert len(set(assigned)) == len(assigned)
+
+        # Everything the seeder assigns is delivered by the simulator
+        allocation = {agent: agent_genes for agent, agent_genes in zip(agents, genes)}
+        _, delivered, _ = simulator.simulate([allocation])[0]
+        assert delivered == len(assigned)
@@ -0,0 +1,78 @@
+import gzip
+import struct
+
+import numpy as np
+
+import main
+
+
+def decode_binary(body):
+    # The inverse of serialization.encode_binary
+    n, m = struct.unpack_from("<II", body)
+    arrays = {}
+    offset = 8
+    for name, dtype, count in (
+        ("x", "<f8", n),
+        ("y", "<f8", n),
+        ("offsets", "<i4", n + 1),
+        ("neighbours", "<i4", m),
+        ("color", np.uint8, 3 * n),
+    ):
+        arrays[name] = np.frombuffer(body, dtype, count, offset)
+        offset += arrays[name].nbytes
+    assert offset == len(body)
+    return arrays
+
+
+def test_unchanged_map_is_not_modified(client):
+    etag = client.post("/map", params={"seed": 0}).headers["ETag"]
+    response = client.get("/map")
+    assert response.status_code == 200
+    assert response.headers["ETag"] == etag
+
+    response = client.get("/map", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["ETag"] == etag
+    # Weak and listed ETags match too
+    response = client.get("/map", headers={"If-None-Match": f'"other", W/{etag}'})
+    assert response.status_code == 304
+
+    # A new map has a new ETag
+    client.post("/map", params={"seed": 1})
+    response = client.get("/map", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+
+def test_gzip_map_decodes_to_the_binary_map(client):
+    client.post("/map", params={"seed": 0})
+    params = {"format": "binary"}
+    plain = client.get("/map", params=params, headers={"Accept-Encoding": "identity"})
+    assert "Content-Encoding" not in plain.headers
+
+    with client.stream(
+        "GET", "/map", params=params, headers={"Accept-Encoding": "gzip"}
+    ) as response:
+        assert response.headers["Content-Encoding"] == "gzip"
+        assert response.headers["ETag"] != plain.headers["ETag"]
+        body = gzip.decompress(b"".join(response.iter_raw()))
+    assert body == plain.content
+
+    # Both ETags revalidate the map
+    for etag in (plain.headers["ETag"], response.headers["ETag"]):
+        assert (
+            client.get(
+                "/map", params=params, headers={"If-None-Match": etag}
+            ).status_code
+            == 304
+        )
+
+    # The binary map holds the graph of the scenario
+    graph = main.scenario_store.scenarios["default"].graph
+    arrays = decode_binary(body)
+    assert np.array_equal(arrays["x"], graph.x)
+    assert np.array_equal(arrays["y"], graph.y)
+    assert np.array_equal(arrays["offsets"], graph.offsets)
+    assert np.array_equal(arrays["neighbours"], graph.neighbours)
+    assert np.array_equal(arrays["color"], graph.color.reshape(-1))
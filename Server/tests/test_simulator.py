@@ -0,0 +1,103 @@
+import numpy as np
+import pytest
+
+from common import DeliveryAgentInfo, Parcel, create_agents, create_parcels
+from node import Graph, Node, NodeOptions
+from Simulator import Simulator
+
+
+def random_allocations(rng, parcels, agents, count):
+    # Mixes valid allocations with invalid ones: repeated parcels, unknown parcels,
+    # routes that do not start at the warehouse and trips over capacity
+    allocations = []
+    for k in range(count):
+        allocation = {}
+        for agent in agents:
+            if k % 3 == 0:
+                order = rng.permutation(len(parcels))[: 2 * agent.max_capacity]
+                genes = [-1]
+                for i, parcel in enumerate(order.tolist()):
+                    if i > 0 and i % agent.max_capacity == 0:
+                        genes.append(-1)
+                    genes.append(parcel)
+                if k % 2 == 0:
+                    genes.append(-1)
+            else:
+                length = int(rng.integers(1, 2 * agent.max_capacity + 3))
+                genes = rng.integers(-1, len(parcels) + 1, length).tolist()
+                if k % 4 != 1:
+                    genes[0] = -1
+            allocation[agent] = genes
+        allocations.append(allocation)
+    return allocations
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_event_and_tick_modes_agree(seed):
+    root = Node(0, 0, (0, 0, 0), 0)
+    root.create(NodeOptions(seed=seed))
+    graph = root.to_graph()
+    parcels = create_parcels(graph.no_of_nodes, seed)
+    agents = create_agents(seed)
+    allocations = random_allocations(np.random.default_rng(seed), parcels, agents, 60)
+
+    tick = Simulator(graph, parcels, mode="tick")
+    event = Simulator(graph, parcels, mode="event")
+    assert event.simulate(allocations) == tick.simulate(allocations)
+    for i in range(len(allocations)):
+        assert event.get_agent_results(i) == tick.get_agent_results(i)
+
+
+def test_default_mode_is_event():
+    root = Node(0, 0, (0, 0, 0), 0)
+    root.create(NodeOptions(seed=0))
+    parcels = create_parcels(root.to_graph().no_of_nodes)
+    agents = create_agents()
+    allocations = random_allocations(np.random.default_rng(0), parcels, agents, 10)
+
+    assert Simulator(root, parcels).simulate(allocations) == Simulator(
+        root, parcels, mode="event"
+    ).simulate(allocations)
+
+
+def test_unknown_mode():
+    root = Node(0, 0, (0, 0, 0), 0)
+    with pytest.raises(ValueError):
+        Simulator(root, [], mode="fast")
+
+
+def test_long_edge_stops_at_max_distance():
+    # Past 2**24 adding a unit step to the f32 progress along an edge no longer changes it,
+    # so an agent on a longer edge only stops because of its max distance
+    length = 3e7
+    graph = Graph(
+        x=np.array([0.0, length]),
+        y=np.zeros(2),
+        color=np.zeros((2, 3), np.uint8),
+        offsets=np.array([0, 1, 2], np.int32),
+        neighbours=np.array([1, 0], np.int32),
+        lengths=np.full(2, length, np.float32),
+    )
+    parcels = [Parcel(0, 1)]
+    allocations = [{DeliveryAgentInfo(0, 1, 4e7): [-1, 0, -1]}]
+
+    tick = Simulator(graph, parcels, mode="tick").simulate(allocations)
+    event = Simulator(graph, parcels, mode="event").simulate(allocations)
+    assert event == tick == [(0, 0, 4e7)]
+
+
+def test_agent_results_index_out_of_range():
+    root = Node(0, 0, (0, 0, 0), 0)
+    root.create(NodeOptions(seed=0))
+    parcels = create_parcels(root.to_graph().no_of_nodes)
+    agents = create_agents()
+    simulator = Simulator(root, parcels)
+    with pytest.raises(IndexError):
+        simulator.get_agent_results(0)
+
+    allocations = random_allocations(np.random.default_rng(0), parcels, agents, 3)
+    simulator.simulate(allocations)
+    assert len(simulator.get_agent_results(2)) == len(agents)
+    for index in (3, -1):
+        with pytest.raises(IndexError):
+            simulator.get_agent_results(index)
@@ -0,0 +1,100 @@
+import numpy as np
+import pytest
+
+from node import Node, NodeOptions
+from spatial import SpatialIndex
+
+
+def make_index(seed):
+    root = Node(0, 0, (0, 0, 0), 0)
+    root.create(NodeOptions(seed=seed))
+    return SpatialIndex(root.to_graph())
+
+
+def random_rectangle(rng, index):
+    x = np.sort(rng.uniform(index.x.min() - 50, index.x.max() + 50, 2))
+    y = np.sort(rng.uniform(index.y.min() - 50, index.y.max() + 50, 2))
+    return x[0], y[0], x[1], y[1]
+
+
+def crosses(ax, ay, bx, by, x0, y0, x1, y1):
+    # Reference test of a segment against a rectangle: an end inside or a crossed side
+    def inside(x, y):
+        return x0 <= x <= x1 and y0 <= y <= y1
+
+    def orientation(px, py, qx, qy, rx, ry):
+        return np.sign((qx - px) * (ry - py) - (qy - py) * (rx - px))
+
+    def intersect(px, py, qx, qy, rx, ry, sx, sy):
+        d1 = orientation(px, py, qx, qy, rx, ry)
+        d2 = orientation(px, py, qx, qy, sx, sy)
+        d3 = orientation(rx, ry, sx, sy, px, py)
+        d4 = orientation(rx, ry, sx, sy, qx, qy)
+        return d1 * d2 <= 0 and d3 * d4 <= 0
+
+    if inside(ax, ay) or inside(bx, by):
+        return True
+    corners = [(x0, y0), (x1, y0), (x1, y1), (x0, y1)]
+    return any(
+        intersect(ax, ay, bx, by, *corners[i], *corners[(i + 1) % 4]) for i in range(4)
+    )
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_query_matches_brute_force(seed):
+    index = make_index(seed)
+    rng = np.random.default_rng(seed)
+    for _ in range(20):
+        x0, y0, x1, y1 = random_rectangle(rng, index)
+        nodes, edges = index.query(x0, y0, x1, y1)
+
+        inside = (index.x >= x0) & (index.x <= x1) & (index.y >= y0) & (index.y <= y1)
+        assert nodes.tolist() == np.flatnonzero(inside).tolist()
+        expected = [
+            e
+            for e, (a, b) in enumerate(index.edges.tolist())
+            if crosses(index.x[a], index.y[a], index.x[b], index.y[b], x0, y0, x1, y1)
+        ]
+        assert sorted(edges.tolist()) == expected
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_viewport(seed):
+    index = make_index(seed)
+    rng = np.random.default_rng(seed)
+    for _ in range(10):
+        rectangle = random_rectangle(rng, index)
+        nodes, edges = index.query(*rectangle)
+        view = index.viewport(*rectangle)
+
+        # Every node inside and both ends of every edge crossing the rectangle
+        ends = index.edges[edges]
+        assert view["id"] == np.union1d(nodes, ends.reshape(-1)).tolist()
+        assert sorted(
+            map(tuple, np.reshape(view["edges"], (-1, 2)).tolist())
+        ) == sorted(map(tuple, ends.tolist()))
+        assert view["x"] == index.x[view["id"]].tolist()
+
+        # Simplified views keep only representatives and the edges between them
+        simplified = index.viewport(*rectangle, resolution=100.0)
+        kept = set(simplified["id"])
+        assert kept <= set(view["id"])
+        pairs = np.reshape(simplified["edges"], (-1, 2)).tolist()
+        assert all(a != b and a in kept and b in kept for a, b in pairs)
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_nearest_matches_brute_force(seed):
+    index = make_index(seed)
+    rng = np.random.default_rng(seed)
+    points = np.column_stack(
+        [
+            rng.uniform(index.x.min() - 500, index.x.max() + 500, 100),
+            rng.uniform(index.y.min() - 500, index.y.max() + 500, 100),
+        ]
+    )
+    for x, y in points.tolist():
+        node, distance = index.nearest(x, y)
+        distances = np.hypot(index.x - x, index.y - y)
+        assert distance == pytest.approx(distances.min())
+        assert distances[node] == pytest.approx(distances.min())
@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+from Algos.giant_tour import Split
+from common import create_agents, create_parcels
+from distances import DistanceMatrix
+from node import Node, NodeOptions
+from Simulator import Simulator
+
+
+def trip_cost(split, trip, last):
+    # The last trip of an agent does not return to the warehouse
+    cost = split.outbound[trip[0]] + split.legs[trip[:-1], trip[1:]].sum()
+    return cost if last else cost + split.inbound[trip[-1]]
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_split_is_feasible(seed):
+    root = Node(0, 0, (0, 0, 0), 0)
+    root.create(NodeOptions(seed=seed))
+    graph = root.to_graph()
+    parcels = create_parcels(graph.no_of_nodes, seed)
+    # Small budgets so that not every tour can be delivered
+    agents = create_agents(seed, min_dist=200, max_dist=3000)
+    simulator = Simulator(graph, parcels)
+    split = Split(parcels, agents, DistanceMatrix(graph, parcels, simulator))
+
+    rng = np.random.default_rng(seed)
+    tours = np.array([rng.permutation(len(parcels)) for _ in range(20)])
+    batch_delivered, batch_travelled = split.evaluate(tours)
+    for tour, expected_delivered, expected_travelled in zip(
+        tours, batch_delivered, batch_travelled
+    ):
+        delivered, travelled, trips = split(tour, track=True)
+        assert delivered == expected_delivered
+        assert travelled == pytest.approx(expected_travelled)
+
+        # The agents deliver the prefix of the tour in order
+        assert [p for agent_trips in trips for t in agent_trips for p in t] == (
+            tour[:delivered].tolist()
+        )
+        total = 0.0
+        for agent, agent_trips in zip(agents, trips):
+            costs = [
+                trip_cost(split, np.array(t), i == len(agent_trips) - 1)
+                for i, t in enumerate(agent_trips)
+            ]
+            assert all(0 < len(t) <= agent.max_capacity for t in agent_trips)
+            assert sum(costs) <= agent.max_dist + 1e-6
+            total += sum(costs)
+        assert total == pytest.approx(travelled)
+
+        # The simulator accepts every route
+        allocation = {
+            agent: [g for t in agent_trips for g in [-1, *t]] or [-1]
+            for agent, agent_trips in zip(agents, trips)
+        }
+        (result,) = simulator.simulate([allocation])
+        assert result[:2] == (0, delivered)
+
+
+def test_split_delivers_whole_tour_when_budgets_allow():
+    root = Node(0, 0, (0, 0, 0), 0)
+    root.create(NodeOptions(seed=0))
+    graph = root.to_graph()
+    parcels = create_parcels(graph.no_of_nodes)
+    agents = create_agents(min_dist=1e9, max_dist=2e9)
+    split = Split(
+        parcels, agents, DistanceMatrix(graph, parcels, Simulator(graph, parcels))
+    )
+
+    delivered, _, _ = split(np.arange(len(parcels)))
+    assert delivered == len(parcels)
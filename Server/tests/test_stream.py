@@ -0,0 +1,74 @@
+import json
+import time
+
+import Algos.GA
+import main
+from conftest import create_scenario
+
+
+def read_events(client, **params):
+    events = []
+    with client.stream("GET", "/simulate/stream", params=params) as response:
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        event = None
+        for line in response.iter_lines():
+            if line.startswith("event: "):
+                event = line.removeprefix("event: ")
+            elif line.startswith("data: "):
+                events.append((event, json.loads(line.removeprefix("data: "))))
+    return events
+
+
+def test_stream_is_throttled_and_in_order(client, monkeypatch):
+    create_scenario(client)
+    monkeypatch.setattr(main, "STREAM_INTERVAL", 0.2)
+
+    # Every generation is reported as an improvement, so that there is one to send at every
+    # progress call and only the throttle holds them back
+    model = Algos.GA.model
+
+    def improving_model(*args, progress, **options):
+        return model(
+            *args,
+            progress=lambda stats, solution: progress(
+                {**stats, "improved": True}, solution
+            ),
+            **options,
+        )
+
+    monkeypatch.setattr(Algos.GA, "model", improving_model)
+
+    # Times at which the results of the solutions sent are built
+    built = []
+    scenario_result = main.scenario_result
+
+    def timed_result(*args):
+        built.append(time.monotonic())
+        return scenario_result(*args)
+
+    monkeypatch.setattr(main, "scenario_result", timed_result)
+
+    events = read_events(client, seed=0, time_limit=1.5, stagnation_limit=100_000)
+    kinds = [event for event, _ in events]
+    assert kinds[-1] == "result"
+    assert set(kinds[:-1]) == {"progress"}
+
+    # The solutions are sent at most every STREAM_INTERVAL, not at every generation
+    progress = [data for event, data in events if event == "progress"]
+    iterations = [data["stats"]["iteration"] for data in progress]
+    assert 1 < len(progress) <= 1.5 / 0.2 + 1
+    assert iterations[-1] > len(progress)
+    assert all(b - a >= 0.2 for a, b in zip(built[:-2], built[1:-1]))
+
+    # Each solution sent is at least as good as the one before, and the result is the best
+    assert iterations == sorted(set(iterations))
+    scores = [
+        (data["summary"]["total_parcels"], -data["summary"]["total_distance"])
+        for data in progress + [events[-1][1]]
+    ]
+    assert scores == sorted(scores)
+
+
+def test_stream_needs_a_scenario(client):
+    assert client.get("/simulate/stream").status_code == 400